@@ -0,0 +1,127 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from big_query_converter import BigQueryConverterInteractor
+from converter_registry import converter_registry
+from exceptions import InvalidBatchItem, get_error_details
+from tenant_registry import get_converter_for_tenant
+
+# Batches smaller than this are converted in the calling process, the IPC
+# round trips would cost more than they save
+MIN_PARALLEL_QUERIES = int(os.environ.get("BATCH_CONVERSION_MIN_PARALLEL_QUERIES", 8))
+MAX_WORKERS = int(os.environ.get("BATCH_CONVERSION_MAX_WORKERS", os.cpu_count() or 1))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def convert_batch(
+        queries: List[Dict],
+        rewrite_mode: str = BigQueryConverterInteractor.STRING_REWRITE_MODE,
+        tenant_id: Optional[str] = None,
+) -> List[Dict]:
+    # queries -> [{"id": ..., "sql_query": ..., "rewrite_mode": (optional)}]
+    # Identical queries are converted once, results keep the request order.
+    # A malformed item gets an error result, the other items still convert.
+    conversion_keys: List[Optional[Tuple[str, str, Optional[str]]]] = []
+    item_errors: Dict[int, Dict] = {}
+    for index, item in enumerate(queries):
+        try:
+            conversion_keys.append(_get_conversion_key(index, item, rewrite_mode, tenant_id))
+        except InvalidBatchItem as e:
+            conversion_keys.append(None)
+            item_errors[index] = {"error": get_error_details(e)}
+
+    unique_conversion_keys = list(
+        dict.fromkeys(key for key in conversion_keys if key is not None)
+    )
+    converted = dict(
+        zip(unique_conversion_keys, _convert_all(unique_conversion_keys))
+    )
+    return [
+        {
+            "id": item.get("id") if isinstance(item, dict) else None,
+            **(item_errors[index] if conversion_key is None else converted[conversion_key]),
+        }
+        for index, (item, conversion_key) in enumerate(zip(queries, conversion_keys))
+    ]
+
+
+def _get_conversion_key(
+        index: int, item: Dict, rewrite_mode: str, tenant_id: Optional[str]
+) -> Tuple[str, str, Optional[str]]:
+    if not isinstance(item, dict):
+        raise InvalidBatchItem(index=index, reason="Item must be an object")
+    if not isinstance(item.get("sql_query"), str):
+        raise InvalidBatchItem(index=index, reason="Missing or non-string sql_query")
+
+    item_rewrite_mode = item.get("rewrite_mode", rewrite_mode)
+    # Part of the conversion key, so it must be hashable
+    if not isinstance(item_rewrite_mode, str):
+        raise InvalidBatchItem(index=index, reason="Non-string rewrite_mode")
+    return item["sql_query"], item_rewrite_mode, tenant_id
+
+
+def _convert_all(conversion_keys: List[Tuple[str, str, Optional[str]]]) -> List[Dict]:
+    if len(conversion_keys) < MIN_PARALLEL_QUERIES or MAX_WORKERS < 2:
+        return [_convert_one(conversion_key) for conversion_key in conversion_keys]
+
+    executor = _get_executor()
+    if executor is None:
+        return [_convert_one(conversion_key) for conversion_key in conversion_keys]
+
+    chunk_size = max(1, len(conversion_keys) // (MAX_WORKERS * 4))
+    try:
+        return list(executor.map(_convert_one, conversion_keys, chunksize=chunk_size))
+    except (BrokenProcessPool, OSError):
+        _shutdown_executor()
+        return [_convert_one(conversion_key) for conversion_key in conversion_keys]
+
+
+def _convert_one(conversion_key: Tuple[str, str, Optional[str]]) -> Dict:
+    sql_query, rewrite_mode, tenant_id = conversion_key
+    try:
+        converter = get_converter_for_tenant(BigQueryConverterInteractor, tenant_id)
+        return {
+            "updated_query": converter.get_converted_sql_query(
+                sql_query=sql_query, rewrite_mode=rewrite_mode
+            )
+        }
+    except Exception as e:
+        return {"error": get_error_details(e)}
+
+
+def _init_worker():
+    # Build the mappings once per worker, not once per query
+    converter_registry.get_converter(BigQueryConverterInteractor)
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+
+    if _executor is not None:
+        return _executor
+
+    with _executor_lock:
+        if _executor is None:
+            try:
+                _executor = ProcessPoolExecutor(
+                    max_workers=MAX_WORKERS, initializer=_init_worker
+                )
+            except (OSError, NotImplementedError):
+                # AWS Lambda has no /dev/shm, process pools can not be
+                # created there; the batch is converted in process instead
+                return None
+    return _executor
+
+
+def _shutdown_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
@@ -0,0 +1,351 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from copy import deepcopy
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import sqlglot
+
+import mapping_compiler
+from conversion_logging import LOGGER_NAME
+from conversion_metrics import LatencyHistogram, conversion_metrics
+
+BENCHMARK_FORMAT_VERSION = 1
+
+DEFAULT_QUERY_SIZES = (1, 10, 50)
+DEFAULT_SCHEMA_SIZES = (12, 120, 1200)
+DEFAULT_ITERATIONS = 20
+
+# Template the corpus queries read from, the one with the most fields
+CORPUS_TABLE_NAME = "leads"
+
+
+def _get_field_names(table_dict: Dict, count: int, field_types: Optional[List[str]] = None) -> List[str]:
+    # count field names of the template, cycled when the template has less
+    field_names = [
+        field_dict["field_name"]
+        for field_dict in table_dict["fields"]
+        if field_types is None or field_dict["field_type"] in field_types
+    ] or [field_dict["field_name"] for field_dict in table_dict["fields"]]
+    return [field_names[index % len(field_names)] for index in range(count)]
+
+
+def _get_field_value(table_dict: Dict, field_name: str, index: int) -> str:
+    for field_dict in table_dict["fields"]:
+        if field_dict["field_name"] == field_name and field_dict.get("options"):
+            options = field_dict["options"]
+            return "'{}'".format(options[index % len(options)].replace("'", "''"))
+    return f"'value_{index}'"
+
+
+def build_simple_select(table_dict: Dict, size: int) -> str:
+    field_name = _get_field_names(table_dict, 1)[0]
+    return f"SELECT {field_name} FROM {table_dict['Table Name']} LIMIT {size}"
+
+
+def build_wide_projection(table_dict: Dict, size: int) -> str:
+    columns = ", ".join(
+        f"{field_name} AS column_{index}"
+        for index, field_name in enumerate(_get_field_names(table_dict, size))
+    )
+    return f"SELECT {columns} FROM {table_dict['Table Name']}"
+
+
+def build_deep_where(table_dict: Dict, size: int) -> str:
+    # size AND-ed groups of OR-ed comparisons, a left deep condition tree
+    field_names = _get_field_names(table_dict, size * 2)
+    groups = []
+    for index in range(size):
+        first_field, second_field = field_names[index * 2], field_names[index * 2 + 1]
+        groups.append(
+            f"({first_field} = {_get_field_value(table_dict, first_field, index)}"
+            f" OR {second_field} <> {_get_field_value(table_dict, second_field, index)})"
+        )
+    field_name = field_names[0]
+    return f"SELECT {field_name} FROM {table_dict['Table Name']} WHERE {' AND '.join(groups)}"
+
+
+def build_or_chain(table_dict: Dict, size: int) -> str:
+    # One flat chain of size * 60 OR-ed comparisons; at the larger sizes it is
+    # deeper than recursive tree walks can go, which must not fail the query
+    field_name = _get_field_names(table_dict, 1)[0]
+    conditions = " OR ".join(
+        f"{field_name} = {_get_field_value(table_dict, field_name, index)}"
+        for index in range(size * 60)
+    )
+    return f"SELECT {field_name} FROM {table_dict['Table Name']} WHERE {conditions}"
+
+
+def build_subquery(table_dict: Dict, size: int) -> str:
+    field_names = _get_field_names(table_dict, size)
+    inner_query = (
+        f"SELECT {', '.join(dict.fromkeys(field_names))} FROM {table_dict['Table Name']}"
+    )
+    return (
+        f"SELECT {field_names[0]} FROM {table_dict['Table Name']} WHERE {field_names[0]} IN "
+        f"(SELECT {field_names[0]} FROM ({inner_query}) AS inner_{size})"
+    )
+
+
+def build_union(table_dict: Dict, size: int) -> str:
+    return " UNION ALL ".join(
+        f"SELECT {field_name} FROM {table_dict['Table Name']}"
+        for field_name in _get_field_names(table_dict, size)
+    )
+
+
+def build_case(table_dict: Dict, size: int) -> str:
+    field_name = _get_field_names(table_dict, 1, field_types=["DROPDOWN"])[0]
+    branches = " ".join(
+        f"WHEN {field_name} = {_get_field_value(table_dict, field_name, index)} THEN {index}"
+        for index in range(size)
+    )
+    return f"SELECT CASE {branches} ELSE -1 END AS bucket FROM {table_dict['Table Name']}"
+
+
+def build_date_functions(table_dict: Dict, size: int) -> str:
+    functions = ("MONTH({})", "WEEK({})", "DATE({})", "DATE_TRUNC('month', {})")
+    field_names = _get_field_names(table_dict, size, field_types=["DATE", "DATE_TIME"])
+    columns = ", ".join(
+        f"{functions[index % len(functions)].format(field_name)} AS date_{index}"
+        for index, field_name in enumerate(field_names)
+    )
+    return (
+        f"SELECT {columns}, COUNT(*) AS total FROM {table_dict['Table Name']}"
+        f" WHERE {field_names[0]} >= DATE_SUB(CURRENT_DATE(), INTERVAL {size} DAY)"
+        f" GROUP BY date_0"
+    )
+
+
+# Corpus family -> builder of its query of a given size for a template
+CORPUS_FAMILIES: Dict[str, Callable[[Dict, int], str]] = {
+    "simple_select": build_simple_select,
+    "wide_projection": build_wide_projection,
+    "deep_where": build_deep_where,
+    "or_chain": build_or_chain,
+    "subquery": build_subquery,
+    "union": build_union,
+    "case": build_case,
+    "date_functions": build_date_functions,
+}
+
+
+def synthesize_tables(tables: List[Dict], template_count: int) -> List[Dict]:
+    # The original templates, padded up to template_count with renamed copies
+    # of them; field names are renamed too so every copy adds new mappings.
+    # The original templates are always kept, the corpus reads from them.
+    synthesized = deepcopy(tables)
+    for index in range(template_count - len(tables)):
+        table_dict = deepcopy(tables[index % len(tables)])
+        suffix = f"_{index}"
+        for key in ("Table Name", "sales_template_name", "big_query_table_name", "sales_template_id"):
+            if table_dict.get(key):
+                table_dict[key] += suffix
+        for field_dict in table_dict["fields"]:
+            for key in ("field_name", "field_id", "bigquery_column_name"):
+                field_dict[key] += suffix
+        synthesized.append(table_dict)
+    return synthesized
+
+
+@contextmanager
+def _schema_directory(tables: List[Dict]) -> Iterator[str]:
+    # The converters read tables.json from the working directory
+    previous_directory = os.getcwd()
+    directory = tempfile.mkdtemp(prefix="bigQueryConverter-benchmark-")
+    try:
+        with open(os.path.join(directory, mapping_compiler.TABLES_JSON_PATH), "w") as json_file:
+            json.dump(tables, json_file)
+        os.chdir(directory)
+        yield directory
+    finally:
+        os.chdir(previous_directory)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _get_converters() -> Dict[str, Callable[[], Callable[[str], Any]]]:
+    from big_query_converter import BigQueryConverterInteractor
+    from big_query_sql_script import SQLQueryConversion
+
+    def _big_query_converter(rewrite_mode):
+        def _build():
+            converter = BigQueryConverterInteractor()
+            return lambda sql_query: converter.get_converted_sql_query(
+                sql_query=sql_query, rewrite_mode=rewrite_mode, use_cache=False
+            )
+        return _build
+
+    def _sql_query_conversion():
+        converter = SQLQueryConversion()
+        return lambda sql_query: converter.get_converted_sql_query(
+            sql_query=sql_query, use_cache=False
+        )
+
+    return {
+        "big_query_converter:string": _big_query_converter(
+            BigQueryConverterInteractor.STRING_REWRITE_MODE
+        ),
+        "big_query_converter:ast": _big_query_converter(
+            BigQueryConverterInteractor.AST_REWRITE_MODE
+        ),
+        "sql_query_conversion": _sql_query_conversion,
+    }
+
+
+def _run_case(convert: Callable[[str], Any], sql_query: str, iterations: int) -> Dict[str, Any]:
+    latency = LatencyHistogram()
+    errors = 0
+    error = None
+
+    conversion_metrics.reset()
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        try:
+            convert(sql_query)
+        except Exception as e:
+            errors += 1
+            error = f"{type(e).__name__}: {e}"[:200]
+        latency.record(time.perf_counter() - started_at)
+
+    return {
+        "iterations": iterations,
+        "errors": errors,
+        "error": error,
+        "latency_ms": latency.summary(),
+        "stages": conversion_metrics.snapshot()["stages"],
+    }
+
+
+def run_benchmark(
+        query_sizes=DEFAULT_QUERY_SIZES,
+        schema_sizes=DEFAULT_SCHEMA_SIZES,
+        iterations: int = DEFAULT_ITERATIONS,
+        families: Optional[List[str]] = None,
+        converters: Optional[List[str]] = None,
+        source_path: str = mapping_compiler.TABLES_JSON_PATH,
+) -> Dict[str, Any]:
+    tables = mapping_compiler.load_tables_json(source_path)
+    corpus_table = next(
+        table_dict for table_dict in tables if table_dict["Table Name"] == CORPUS_TABLE_NAME
+    )
+    converter_builders = _get_converters()
+
+    results = []
+    for template_count in schema_sizes:
+        schema_tables = synthesize_tables(tables, template_count)
+        schema_size = len(schema_tables)
+        with _schema_directory(schema_tables):
+            for converter_name, build_converter in converter_builders.items():
+                if converters and converter_name not in converters:
+                    continue
+
+                started_at = time.perf_counter()
+                convert = build_converter()
+                mapping_load_ms = (time.perf_counter() - started_at) * 1000
+
+                for family, build_query in CORPUS_FAMILIES.items():
+                    if families and family not in families:
+                        continue
+                    for query_size in query_sizes:
+                        sql_query = build_query(corpus_table, query_size)
+                        results.append(
+                            {
+                                "converter": converter_name,
+                                "family": family,
+                                "query_size": query_size,
+                                "schema_size": schema_size,
+                                "query_length": len(sql_query),
+                                "mapping_load_ms": round(mapping_load_ms, 3),
+                                **_run_case(convert, sql_query, iterations),
+                            }
+                        )
+
+    return {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlglot": sqlglot.__version__,
+        },
+        "mapping_version": mapping_compiler.get_source_checksum(source_path),
+        "results": results,
+    }
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # p50 / p95 of every case of current against the same case of baseline,
+    # ratio > 1 -> slower than the baseline
+    def _case_key(result):
+        return result["converter"], result["family"], result["query_size"], result["schema_size"]
+
+    baseline_results = {_case_key(result): result for result in baseline["results"]}
+
+    comparisons = []
+    for result in current["results"]:
+        baseline_result = baseline_results.get(_case_key(result))
+        if baseline_result is None:
+            continue
+
+        comparison = dict(zip(("converter", "family", "query_size", "schema_size"), _case_key(result)))
+        # A case that started failing is a regression, whatever its latency
+        comparison["errors"] = {"baseline": baseline_result["errors"], "current": result["errors"]}
+        for percentile in ("p50_ms", "p95_ms"):
+            baseline_ms = baseline_result["latency_ms"][percentile]
+            current_ms = result["latency_ms"][percentile]
+            comparison[percentile] = {
+                "baseline": baseline_ms,
+                "current": current_ms,
+                "ratio": round(current_ms / baseline_ms, 3) if baseline_ms else None,
+            }
+        comparisons.append(comparison)
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the converters over a fixed corpus, stage by stage"
+    )
+    parser.add_argument("--source", default=mapping_compiler.TABLES_JSON_PATH)
+    parser.add_argument("--output", help="Write the results JSON here instead of stdout")
+    parser.add_argument("--compare", help="Results JSON of a previous run to compare against")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--query-sizes", type=int, nargs="+", default=list(DEFAULT_QUERY_SIZES))
+    parser.add_argument("--schema-sizes", type=int, nargs="+", default=list(DEFAULT_SCHEMA_SIZES))
+    parser.add_argument("--families", nargs="+", choices=list(CORPUS_FAMILIES))
+    parser.add_argument("--converters", nargs="+")
+    args = parser.parse_args()
+
+    # The "not handled" notes of every converted query would drown the run
+    logging.getLogger(LOGGER_NAME).setLevel(logging.WARNING)
+
+    report = run_benchmark(
+        query_sizes=args.query_sizes,
+        schema_sizes=args.schema_sizes,
+        iterations=args.iterations,
+        families=args.families,
+        converters=args.converters,
+        source_path=os.path.abspath(args.source),
+    )
+
+    if args.compare:
+        with open(args.compare, "r") as baseline_file:
+            report["comparison"] = compare_results(json.load(baseline_file), report)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,370 @@
-import json
-import re
-from typing import Tuple, Dict, List
+import copy
+from typing import Any, Tuple, Dict, Iterable, List, Optional, Set, Union
 
 import sqlglot
+from sqlglot.optimizer.scope import Scope, traverse_scope
+
+import exceptions
+import mapping_compiler
+import mapping_delta
+from conversion_metrics import conversion_metrics
+from mapping_delta import MappingDelta, MappingDeltaImpact
+from multi_pattern_replacer import MultiPatternReplacer
+from query_shape_cache import get_or_convert_cached
 
 
 class BigQueryConverterInteractor:
+    MAPPINGS_ARTIFACT_KEY = "big_query_converter"
+
+    # "string" rewrites the raw query text, "ast" rewrites the identifiers on
+    # the parsed tree and generates the query back with the BigQuery dialect
+    STRING_REWRITE_MODE = "string"
+    AST_REWRITE_MODE = "ast"
 
-    def __init__(self):
-        table_mapping, field_mapping = type(self)._fetch_required_data_mappings()
+    def __init__(self, source: Optional[mapping_compiler.MappingSource] = None):
+        with conversion_metrics.time_stage("mapping_load"):
+            source = source or mapping_compiler.load_source()
+            table_mapping, field_mapping = type(self)._fetch_required_data_mappings(source)
+            self.mapping_version = source.version
+        self.cache_namespace = source.get_cache_namespace(self.MAPPINGS_ARTIFACT_KEY)
 
         self.table_mapping = table_mapping
         # field mapping key format -> "{Template Name}#{Field Name}"
         self.field_mapping = field_mapping
+        # Used for columns whose table can not be resolved from the query
+        # scopes; on a field name shared by several tables the last one wins
+        self.field_mapping_by_name = {
+            field_dict["field_name"]: field_dict for field_dict in field_mapping.values()
+        }
+        self.field_name_replacer = MultiPatternReplacer.for_whole_words(
+            self.field_mapping_by_name.keys(), qualified=True
+        )
 
-    def get_converted_sql_query(self, sql_query: str) -> str:
-        select_expression = sqlglot.parse_one(self.format_sql_query(sql_query))
-        table_names = self._get_table_names_from_select_expression(select_expression)
-        field_names = [
-            expression.this.name
-            for expression in list(select_expression.find_all(sqlglot.expressions.Column))
-        ]
-
-        no_mapping_field_names = [
-            f_name for f_name in field_names
-            if not self.field_mapping.get(self._prep_field_mapping_key(field_name=f_name))
-        ]
-        if no_mapping_field_names:
-            field_names = [f_name for f_name in field_names if f_name not in no_mapping_field_names]
-            # raise exceptions.NoMappingFoundForFieldNames(field_names=field_names)
-
-        updated_query = self._replace_field_names(
-            sql_query=sql_query,
-            field_names=field_names
+    @classmethod
+    def from_source(cls, source: mapping_compiler.MappingSource) -> "BigQueryConverterInteractor":
+        return cls(source=source)
+
+    def apply_deltas(
+            self,
+            deltas: List[MappingDelta],
+            mapping_version: str,
+            impact: Optional[MappingDeltaImpact] = None,
+    ) -> "BigQueryConverterInteractor":
+        # Copy of this converter with the deltas applied. Only the changed
+        # tables / fields are built, everything else is shared with this
+        # converter, whose mappings stay as they are for the conversions
+        # still running on it.
+        impact = impact or MappingDeltaImpact()
+        table_mapping = dict(self.table_mapping)
+        field_mapping = dict(self.field_mapping)
+        changed_field_names: Set[str] = set()
+
+        for delta in deltas:
+            impact.add_names([delta.table_name, delta.new_name])
+
+            if delta.operation == mapping_delta.ADD_TABLE:
+                if delta.table_name in table_mapping:
+                    raise delta.get_error("Table already exists")
+                added_table_mapping, added_field_mapping = self._build_required_data_mappings(
+                    [copy.deepcopy(delta.definition)]
+                )
+                table_mapping.update(added_table_mapping)
+                field_mapping.update(added_field_mapping)
+                changed_field_names.update(
+                    field_dict["field_name"] for field_dict in added_field_mapping.values()
+                )
+                continue
+
+            if delta.table_name not in table_mapping:
+                raise delta.get_error("Unknown table")
+
+            if delta.operation in mapping_delta.TABLE_OPERATIONS:
+                if delta.operation == mapping_delta.RENAME_TABLE and delta.new_name in table_mapping:
+                    raise delta.get_error("Table already exists")
+
+                field_key_prefix = self._prep_field_mapping_key(table_name=delta.table_name, field_name="")
+                table_fields = {
+                    field_key: field_dict
+                    for field_key, field_dict in field_mapping.items()
+                    if field_key.startswith(field_key_prefix)
+                }
+                changed_field_names.update(field_dict["field_name"] for field_dict in table_fields.values())
+
+                if delta.operation == mapping_delta.RENAME_TABLE:
+                    table_mapping = self._replace_items(table_mapping, {
+                        delta.table_name: (delta.new_name, table_mapping[delta.table_name])
+                    })
+                    field_mapping = self._replace_items(field_mapping, {
+                        field_key: (self._prep_field_mapping_key(
+                            table_name=delta.new_name, field_name=field_dict["field_name"]
+                        ), field_dict)
+                        for field_key, field_dict in table_fields.items()
+                    })
+                else:
+                    del table_mapping[delta.table_name]
+                    for field_key in table_fields:
+                        del field_mapping[field_key]
+                continue
+
+            field_key = self._prep_field_mapping_key(table_name=delta.table_name, field_name=delta.field_name)
+            if delta.operation == mapping_delta.ADD_FIELD:
+                if field_key in field_mapping:
+                    raise delta.get_error("Field already exists")
+                field_mapping = self._insert_after_table_fields(
+                    field_mapping,
+                    table_name=delta.table_name,
+                    field_key=field_key,
+                    field_dict=self._build_field_mapping(copy.deepcopy(delta.definition)),
+                )
+            else:
+                field_dict = field_mapping.get(field_key)
+                if field_dict is None:
+                    raise delta.get_error("Unknown field")
+                if delta.operation == mapping_delta.RENAME_FIELD:
+                    new_field_key = self._prep_field_mapping_key(
+                        table_name=delta.table_name, field_name=delta.new_name
+                    )
+                    if new_field_key in field_mapping:
+                        raise delta.get_error("Field already exists")
+                    field_mapping = self._replace_items(field_mapping, {
+                        field_key: (new_field_key, {**field_dict, "field_name": delta.new_name})
+                    })
+                else:
+                    del field_mapping[field_key]
+            changed_field_names.update(filter(None, (delta.field_name, delta.new_name)))
+
+        impact.add_names(changed_field_names)
+
+        converter = copy.copy(self)
+        converter.mapping_version = mapping_version
+        converter.table_mapping = table_mapping
+        converter.field_mapping = field_mapping
+        converter.field_mapping_by_name = self._update_field_mapping_by_name(
+            field_mapping, changed_field_names
         )
+        converter.field_name_replacer = self.field_name_replacer.with_changes(
+            added=converter.field_mapping_by_name.keys() & changed_field_names
+            - self.field_mapping_by_name.keys(),
+            removed=self.field_mapping_by_name.keys() & changed_field_names
+            - converter.field_mapping_by_name.keys(),
+        )
+        return converter
+
+    def get_converted_sql_query(
+            self, sql_query: str, rewrite_mode: str = STRING_REWRITE_MODE, use_cache: bool = True
+    ) -> str:
+        if rewrite_mode == self.AST_REWRITE_MODE:
+            convert = self._get_converted_sql_query_from_ast_or_string
+        elif rewrite_mode == self.STRING_REWRITE_MODE:
+            convert = self._get_converted_sql_query_from_string
+        else:
+            raise exceptions.UnsupportedRewriteMode(rewrite_mode=rewrite_mode)
 
-        updated_query = self._replace_table_names(
-            table_names=table_names,
-            sql_query=updated_query
+        if not use_cache:
+            return convert(sql_query=sql_query)
+        return get_or_convert_cached(
+            namespace=f"{self.cache_namespace}:{rewrite_mode}",
+            mapping_version=self.mapping_version,
+            sql_query=sql_query,
+            convert=lambda query: convert(sql_query=query),
         )
+
+    def _get_converted_sql_query_from_string(self, sql_query: str) -> str:
+        with conversion_metrics.time_stage("parse"):
+            select_expression = sqlglot.parse_one(self.format_sql_query(sql_query))
+        table_names = self._get_table_names_from_select_expression(select_expression)
+
+        column_mappings = self._get_column_mappings(select_expression)
+
+        with conversion_metrics.time_stage("string_rewrite"):
+            replacements = {}
+            updated_query = None
+            for column, field_dict in column_mappings:
+                column_text = f"{column.table}.{column.name}" if column.table else column.name
+                if field_dict is None:
+                    # e.g. an alias exposed by a CTE, it keeps its name
+                    bq_field_name = column_text
+                elif column.table:
+                    bq_field_name = f"{column.table}.{field_dict['bigquery_column_name']}"
+                else:
+                    bq_field_name = field_dict["bigquery_column_name"]
+
+                if replacements.setdefault(column_text, bq_field_name) != bq_field_name:
+                    break
+            else:
+                replacements = {
+                    column_text: bq_field_name
+                    for column_text, bq_field_name in replacements.items()
+                    if column_text != bq_field_name
+                }
+                updated_query = self.field_name_replacer.replace(sql_query, replacements)
+
+                updated_query = self._replace_table_names(
+                    table_names=table_names,
+                    sql_query=updated_query
+                )
+
+        if updated_query is None:
+            # The same column text maps to different fields in different
+            # scopes, only the tree rewrite can tell them apart
+            return self._get_converted_sql_query_from_ast(sql_query=sql_query)
         return updated_query
 
-    def _replace_field_names(
-            self, sql_query: str,  field_names: List[str]
-    ) -> str:
-        for f_name in field_names:
-            field_mapping_key = self._prep_field_mapping_key(field_name=f_name)
-            bq_field_name = self.field_mapping[field_mapping_key]["bigquery_column_name"]
-            sql_query = BigQueryConverterInteractor._replace_whole_word(sql_query, f_name, bq_field_name)
-        return sql_query
+    def _get_converted_sql_query_from_ast_or_string(self, sql_query: str) -> str:
+        try:
+            return self._get_converted_sql_query_from_ast(sql_query=sql_query)
+        except exceptions.QueryTooDeeplyNested:
+            # The string rewrite does not recurse through the tree; it only
+            # comes back to the tree rewrite, and fails, for ambiguous columns
+            return self._get_converted_sql_query_from_string(sql_query=sql_query)
+
+    def _get_converted_sql_query_from_ast(self, sql_query: str) -> str:
+        try:
+            return self._rewrite_sql_query_ast(sql_query=sql_query)
+        except RecursionError:
+            # e.g. hundreds of ORed conditions, deeper than sqlglot can parse /
+            # copy / generate recursively
+            raise exceptions.QueryTooDeeplyNested(rewrite_mode=self.AST_REWRITE_MODE)
+
+    def _rewrite_sql_query_ast(self, sql_query: str) -> str:
+        with conversion_metrics.time_stage("parse"):
+            select_expression = sqlglot.parse_one(sql_query, read="bigquery")
+
+        # Collect first, the identifiers are swapped after the walk so the
+        # tree is not mutated while it is being traversed
+        column_mappings = self._get_column_mappings(select_expression)
+        tables = list(select_expression.find_all(sqlglot.expressions.Table))
+
+        with conversion_metrics.time_stage("ast_rewrite"):
+            for column, field_dict in column_mappings:
+                if field_dict is not None:
+                    self._set_identifier(column, field_dict["bigquery_column_name"])
+            for table in tables:
+                self._set_identifier(table, self.table_mapping.get(table.name))
+
+            return select_expression.sql(dialect="bigquery")
+
+    def _get_column_mappings(
+            self, select_expression: sqlglot.expressions.Expression
+    ) -> List[Tuple[sqlglot.expressions.Column, Optional[Dict]]]:
+        # -> every mapped column, and the columns of CTEs / derived tables
+        # that keep their name (field_dict None)
+        with conversion_metrics.time_stage("column_collection"):
+            try:
+                scopes = traverse_scope(select_expression)
+            except (sqlglot.errors.SqlglotError, RecursionError):
+                # e.g. a chain of thousands of ORed conditions, deeper than
+                # the scope walk can recurse; columns fall back to the
+                # lookup by name
+                scopes = []
+
+            # Scope source name (table name or alias) -> table name, or the
+            # scope of a CTE / derived table, per column. Inner scopes come
+            # first, so a column keeps the closest scope.
+            scope_sources_by_column = {}
+            for scope in scopes:
+                scope_sources = self._get_scope_sources(scope)
+                for column in scope.columns:
+                    scope_sources_by_column.setdefault(id(column), scope_sources)
+
+            columns = list(select_expression.find_all(sqlglot.expressions.Column))
+
+        with conversion_metrics.time_stage("field_mapping"):
+            column_mappings = []
+            for column in columns:
+                is_resolved, field_dict = self._resolve_column_mapping(
+                    column_name=column.name,
+                    source_name=column.table,
+                    scope_sources=scope_sources_by_column.get(id(column), {}),
+                )
+                if not is_resolved:
+                    field_dict = self.field_mapping_by_name.get(column.name)
+                if field_dict or is_resolved:
+                    column_mappings.append((column, field_dict))
+        return column_mappings
 
     @staticmethod
-    def _replace_whole_word(query, old_word, new_word):
-        pattern = r'\b' + re.escape(old_word) + r'\b(?![a-zA-Z0-9_])'
-        modified_text = re.sub(pattern, new_word, query)
-        return modified_text
+    def _get_scope_sources(scope: Scope) -> Dict[str, Union[str, Scope]]:
+        return {
+            source_name: source.name if isinstance(source, sqlglot.expressions.Table) else source
+            for source_name, source in scope.sources.items()
+            if isinstance(source, (sqlglot.expressions.Table, Scope))
+        }
+
+    def _resolve_column_mapping(
+            self, column_name: str, source_name: str, scope_sources: Dict[str, Union[str, Scope]]
+    ) -> Tuple[bool, Optional[Dict]]:
+        # -> (whether a source of the scope has the column, its mapping);
+        # columns no source has are left to the lookup by name
+        if source_name:
+            source = scope_sources.get(source_name, source_name)
+            if isinstance(source, Scope):
+                return self._resolve_projection_mapping(column_name, source)
+            field_dict = self.field_mapping.get(
+                self._prep_field_mapping_key(table_name=source, field_name=column_name)
+            )
+            return bool(field_dict), field_dict
+
+        # An unqualified column belongs to the first source of its scope, in
+        # FROM / JOIN order, that has a column with that name
+        for source in scope_sources.values():
+            if isinstance(source, Scope):
+                is_resolved, field_dict = self._resolve_projection_mapping(column_name, source)
+                if is_resolved:
+                    return is_resolved, field_dict
+                continue
+            field_dict = self.field_mapping.get(
+                self._prep_field_mapping_key(table_name=source, field_name=column_name)
+            )
+            if field_dict:
+                return True, field_dict
+        return False, None
+
+    def _resolve_projection_mapping(
+            self, column_name: str, scope: Scope
+    ) -> Tuple[bool, Optional[Dict]]:
+        # A column of a CTE / derived table is renamed together with the
+        # select column it comes from; an aliased projection keeps its alias
+        while scope.union_scopes:
+            # A union takes the column names of its first select
+            scope = scope.union_scopes[0]
+
+        scope_sources = self._get_scope_sources(scope)
+        for projection in scope.expression.selects:
+            if isinstance(projection, sqlglot.expressions.Star):
+                is_resolved, field_dict = self._resolve_column_mapping(
+                    column_name=column_name, source_name="", scope_sources=scope_sources
+                )
+            elif isinstance(projection, sqlglot.expressions.Column) and isinstance(
+                    projection.this, sqlglot.expressions.Star
+            ):
+                is_resolved, field_dict = self._resolve_column_mapping(
+                    column_name=column_name, source_name=projection.table, scope_sources=scope_sources
+                )
+            elif projection.alias_or_name != column_name:
+                continue
+            elif isinstance(projection, sqlglot.expressions.Column):
+                is_resolved, field_dict = self._resolve_column_mapping(
+                    column_name=projection.name, source_name=projection.table, scope_sources=scope_sources
+                )
+                if not is_resolved:
+                    field_dict = self.field_mapping_by_name.get(projection.name)
+                return True, field_dict
+            else:
+                return True, None
+
+            if is_resolved:
+                return is_resolved, field_dict
+        return False, None
+
+    def _set_identifier(self, node: sqlglot.expressions.Expression, bq_name: Optional[str]):
+        bq_name = self._unquote_identifier(bq_name) if bq_name else None
+        if bq_name:
+            node.set("this", sqlglot.expressions.to_identifier(bq_name, quoted=True))
+
+    @staticmethod
+    def _unquote_identifier(identifier: str) -> str:
+        return identifier.strip("`")
 
     def _replace_table_names(self, table_names: List[str], sql_query: str) -> str:
         for table_name in table_names:
@@ -78,24 +388,75 @@ class BigQueryConverterInteractor:
         return [table.this.name for table in list(select_expression.find_all(sqlglot.expressions.Table))]
 
     @classmethod
-    def _fetch_required_data_mappings(cls) -> Tuple[Dict[str, str], Dict[str, Dict]]:
-        file_path = "tables.json"
-        with open(file_path, "r") as json_file:
-            data = json.load(json_file)
+    def _fetch_required_data_mappings(
+            cls, source: mapping_compiler.MappingSource
+    ) -> Tuple[Dict[str, str], Dict[str, Dict]]:
+        compiled_mappings = mapping_compiler.load_compiled_mappings(
+            mappings_key=cls.MAPPINGS_ARTIFACT_KEY,
+            artifact_path=mapping_compiler.get_artifact_path(source.path),
+            checksum=source.checksum,
+        )
+        if compiled_mappings:
+            return compiled_mappings
+        return cls._build_required_data_mappings(source.load_tables())
 
+    @classmethod
+    def _build_required_data_mappings(
+            cls, data: List[Dict]
+    ) -> Tuple[Dict[str, str], Dict[str, Dict]]:
         table_mapping, field_mapping = {}, {}
         for table_dict in data:
             table_name = table_dict["Table Name"]
             table_mapping[table_name] = f"`{table_dict['big_query_table_name']}`"
             for field_dict in table_dict["fields"]:
-                field_dict["bigquery_column_name"] = f"`{field_dict['bigquery_column_name']}`"
-                field_key_ = cls._prep_field_mapping_key(field_name=field_dict["field_name"])
-                field_mapping[field_key_] = field_dict
+                field_key_ = cls._prep_field_mapping_key(
+                    table_name=table_name, field_name=field_dict["field_name"]
+                )
+                field_mapping[field_key_] = cls._build_field_mapping(field_dict)
         return table_mapping, field_mapping
 
     @staticmethod
-    def _prep_field_mapping_key(field_name: str) -> str:
-        return field_name
+    def _build_field_mapping(field_dict: Dict) -> Dict:
+        field_dict["bigquery_column_name"] = f"`{field_dict['bigquery_column_name']}`"
+        return field_dict
+
+    def _update_field_mapping_by_name(
+            self, field_mapping: Dict[str, Dict], field_names: Iterable[str]
+    ) -> Dict[str, Dict]:
+        field_names = set(field_names)
+        field_mapping_by_name = {
+            field_name: field_dict
+            for field_name, field_dict in self.field_mapping_by_name.items()
+            if field_name not in field_names
+        }
+        for field_dict in field_mapping.values():
+            if field_dict["field_name"] in field_names:
+                field_mapping_by_name[field_dict["field_name"]] = field_dict
+        return field_mapping_by_name
+
+    @staticmethod
+    def _replace_items(mapping: Dict[str, Any], items: Dict[str, Tuple[str, Any]]) -> Dict[str, Any]:
+        # Replaced items keep their position: on a field name shared by
+        # several tables the last one wins, as in mappings built from
+        # tables.json
+        return dict(items.get(key, (key, value)) for key, value in mapping.items())
+
+    @classmethod
+    def _insert_after_table_fields(
+            cls, field_mapping: Dict[str, Dict], table_name: str, field_key: str, field_dict: Dict
+    ) -> Dict[str, Dict]:
+        field_key_prefix = cls._prep_field_mapping_key(table_name=table_name, field_name="")
+        items = list(field_mapping.items())
+        index = max(
+            (index + 1 for index, (key, _) in enumerate(items) if key.startswith(field_key_prefix)),
+            default=len(items),
+        )
+        items.insert(index, (field_key, field_dict))
+        return dict(items)
+
+    @staticmethod
+    def _prep_field_mapping_key(table_name: str, field_name: str) -> str:
+        return f"{table_name}#{field_name}"
 
     @staticmethod
     def format_sql_query(query: str):
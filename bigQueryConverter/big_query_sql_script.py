@@ -1,11 +1,153 @@
-import json
 import re
-from copy import deepcopy
-from typing import Dict, List, Tuple
+from types import GeneratorType
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
 
 from sqlglot import exp, parse_one
 
 import exceptions
+import mapping_compiler
+import mapping_delta
+from conversion_logging import TruncatedText, get_logger
+from conversion_metrics import conversion_metrics
+from mapping_delta import MappingDelta, MappingDeltaImpact
+from multi_pattern_replacer import MultiPatternReplacer
+from query_ir import (
+    AliasAggregationNode,
+    AliasColumnNode,
+    AliasNode,
+    ColumnNode,
+    ComparisonNode,
+    ConditionalNode,
+    InConditionNode,
+    LiteralNode,
+    Node,
+    NodeKind,
+    QueryNode,
+    get_node_type,
+    to_query_data,
+)
+from query_shape_cache import get_or_convert_cached
+from template_prefix_index import TemplatePrefixIndex
+
+logger = get_logger(__name__)
+
+# A field name either wrapped in a matching pair of quotes / backticks (the
+# quotes are dropped on replacement) or a bare whole word outside backticks
+FIELD_NAME_PATTERN = re.compile(
+    r"(?P<quote>[`\"'])?"
+    r"(?P<name>(?(quote)[^`\"']+|(?<!`)\b\w+\b(?!`)))"
+    r"(?(quote)(?P=quote))"
+)
+
+
+# Aliased expression type -> aggregation type of its alias
+ALIAS_AGGREGATION_TYPES = {
+    "count_method": "COUNT",
+    "avg_method": "AVG",
+    "methods": "METHOD",
+    "sum_method": "SUM",
+    "multiplication_operation": "MULTIPLY",
+    "division_operation": "DIVISION",
+    "month_method": "MONTH",
+    "week_method": "WEEK",
+    "datetrunc_method": "DATE_TRUNC",
+    "date_method": "DATE",
+    "parenthesis": "PARENTHESIS",
+}
+
+# Select expression types collected as aggregations as they are
+SELECT_AGGREGATION_TYPES = frozenset(
+    (
+        "count_method",
+        "datetrunc_method",
+        "date_method",
+        "year_method",
+        "month_method",
+        "week_method",
+    )
+)
+
+
+class ChildExpression(NamedTuple):
+    # Yielded by the expression result handlers, the query data of the child
+    # expression is sent back into the handler
+    expression: exp.Expression
+    parent_key: Optional[str] = None
+    parent_field: Optional[str] = None
+    source: Optional[str] = None
+
+
+class ConversionSchema(NamedTuple):
+    # Mappings of a SQLQueryConversion; built once and only read afterwards,
+    # so one schema is shared by every conversion, thread and converter
+    mapping_version: str
+    table_mappings: Dict[str, str]
+    field_mappings: Dict[str, Dict]
+    template_prefix_index: TemplatePrefixIndex
+    cache_namespace: str
+
+
+class ConversionContext:
+    # State of a single conversion, never shared between conversions
+    __slots__ = ("mapped_fields_dict",)
+
+    def __init__(self):
+        self.mapped_fields_dict: Dict[str, str] = {}
+
+
+class ConversionResult:
+    # Updated sql query of a SQLQueryConversion.get_conversion; its query IR
+    # and query_data are built when first accessed
+    __slots__ = (
+        "sql_query",
+        "mapped_fields_dict",
+        "_conversion",
+        "_source_sql_query",
+        "_select_expression",
+        "_query_ir",
+        "_query_data",
+    )
+
+    def __init__(
+        self,
+        conversion: "SQLQueryConversion",
+        source_sql_query: str,
+        sql_query: str,
+        mapped_fields_dict: Dict,
+        select_expression: Optional[exp.Expression] = None,
+    ):
+        self.sql_query = sql_query
+        self.mapped_fields_dict = mapped_fields_dict
+        self._conversion = conversion
+        self._source_sql_query = source_sql_query
+        # None when the sql query came from the cache, parsed again if the
+        # query IR is asked for
+        self._select_expression = select_expression
+        self._query_ir = None
+        self._query_data = None
+
+    @property
+    def query_ir(self) -> Node:
+        if self._query_ir is None:
+            select_expression = self._select_expression
+            if select_expression is None:
+                with conversion_metrics.time_stage("parse"):
+                    select_expression = parse_one(
+                        format_sql_query(self._source_sql_query)
+                    )
+            self._query_ir = self._conversion._prepare_query_ir(
+                select_expression
+            )
+            self._select_expression = None
+        return self._query_ir
+
+    @property
+    def query_data(self) -> Dict:
+        if self._query_data is None:
+            query_ir = self.query_ir
+            with conversion_metrics.time_stage("query_data_serialization"):
+                self._query_data = to_query_data(query_ir)
+        return self._query_data
 
 
 def format_sql_query(sql_query: str):
@@ -14,81 +156,309 @@ def format_sql_query(sql_query: str):
 
 
 class SQLQueryConversion:
-    def __init__(self):
-        table_mappings, field_mappings = type(self)._fetch_required_data_mappings()
+    MAPPINGS_ARTIFACT_KEY = "sql_query_conversion"
 
-        self.table_mappings = table_mappings
-        self.field_mappings = self._update_template_mappings(
-            field_mappings=deepcopy(field_mappings)
+    # Every conversion keeps its own state in a ConversionContext, a single
+    # converter can be used from many threads / asyncio tasks at once
+
+    def __init__(self, schema: Optional[ConversionSchema] = None):
+        self.schema = schema or type(self).load_schema()
+        self.field_name_replacer = MultiPatternReplacer(FIELD_NAME_PATTERN)
+
+    @classmethod
+    def from_source(
+        cls, source: mapping_compiler.MappingSource
+    ) -> "SQLQueryConversion":
+        return cls(schema=cls.load_schema(source))
+
+    @classmethod
+    def load_schema(
+        cls, source: Optional[mapping_compiler.MappingSource] = None
+    ) -> ConversionSchema:
+        with conversion_metrics.time_stage("mapping_load"):
+            source = source or mapping_compiler.load_source()
+            table_mappings, field_mappings = cls._fetch_required_data_mappings(
+                source
+            )
+
+        return ConversionSchema(
+            mapping_version=source.version,
+            table_mappings=table_mappings,
+            field_mappings=field_mappings,
+            template_prefix_index=TemplatePrefixIndex(
+                template_names=field_mappings.keys()
+            ),
+            cache_namespace=source.get_cache_namespace(
+                cls.MAPPINGS_ARTIFACT_KEY
+            ),
         )
-        self.mapped_fields_dict = {}
-        self.aliases = []
 
-    def get_converted_sql_query(self, sql_query: str) -> Tuple[str, Dict]:
-        sql_query_updated = self._get_sql_query_with_replacing_field_names(
-            sql_query=sql_query
+    def apply_deltas(
+        self,
+        deltas: List[MappingDelta],
+        mapping_version: str,
+        impact: Optional[MappingDeltaImpact] = None,
+    ) -> "SQLQueryConversion":
+        # Converter on a new schema with the deltas applied; only the changed
+        # templates are copied, the others are shared with this schema
+        impact = impact or MappingDeltaImpact()
+        table_mappings = dict(self.table_mappings)
+        field_mappings = dict(self.field_mappings)
+        added_template_names: Set[str] = set()
+        removed_template_names: Set[str] = set()
+
+        for delta in deltas:
+            template_name = delta.table_name
+            impact.add_prefixes([template_name, delta.new_name])
+
+            if delta.operation == mapping_delta.ADD_TABLE:
+                if template_name in field_mappings:
+                    raise delta.get_error("Table already exists")
+                (
+                    added_table_mappings,
+                    added_field_mappings,
+                ) = self._build_required_data_mappings([delta.definition])
+                table_mappings.update(added_table_mappings)
+                field_mappings.update(added_field_mappings)
+                added_template_names.add(template_name)
+                removed_template_names.discard(template_name)
+                impact.add_names(added_field_mappings[template_name]["fields"])
+                continue
+
+            template_mapping = field_mappings.get(template_name)
+            if template_mapping is None:
+                raise delta.get_error("Unknown table")
+
+            if delta.operation in mapping_delta.TABLE_OPERATIONS:
+                del field_mappings[template_name]
+                table_mappings.pop(template_name, None)
+                removed_template_names.add(template_name)
+                added_template_names.discard(template_name)
+                if delta.operation == mapping_delta.RENAME_TABLE:
+                    if delta.new_name in field_mappings:
+                        raise delta.get_error("Table already exists")
+                    field_mappings[delta.new_name] = {
+                        **template_mapping,
+                        "sales_template_name": delta.new_name,
+                        "normalized_name": delta.new_name,
+                    }
+                    table_mappings[delta.new_name] = delta.new_name
+                    added_template_names.add(delta.new_name)
+                    removed_template_names.discard(delta.new_name)
+                # Fields of the "lead" template are also matched by their
+                # bare name
+                impact.add_names(template_mapping["fields"])
+                continue
+
+            fields = dict(template_mapping["fields"])
+            if delta.operation == mapping_delta.ADD_FIELD:
+                field = self._prep_field_mapping_json(delta.definition)
+                field["field_id"] = f"`{field['field_id']}`"
+                if field["normalized_name"] in fields:
+                    raise delta.get_error("Field already exists")
+                fields[field["normalized_name"]] = field
+            else:
+                field = next(
+                    (
+                        field
+                        for field in fields.values()
+                        if field["field_name"] == delta.field_name
+                    ),
+                    None,
+                )
+                if field is None:
+                    raise delta.get_error("Unknown field")
+                if delta.operation == mapping_delta.REMOVE_FIELD:
+                    del fields[field["normalized_name"]]
+                else:
+                    fields[field["normalized_name"]] = {
+                        **field,
+                        "field_name": delta.new_name,
+                    }
+            field_mappings[template_name] = {**template_mapping, "fields": fields}
+            impact.add_names([field["normalized_name"]])
+
+        return type(self)(
+            schema=ConversionSchema(
+                mapping_version=mapping_version,
+                table_mappings=table_mappings,
+                field_mappings=field_mappings,
+                template_prefix_index=self.template_prefix_index.with_changes(
+                    added=added_template_names, removed=removed_template_names
+                ),
+                cache_namespace=self.cache_namespace,
+            )
         )
 
-        query_data = self._parse_sql_query(sql_query)
+    @property
+    def mapping_version(self) -> str:
+        return self.schema.mapping_version
+
+    @property
+    def table_mappings(self) -> Dict[str, str]:
+        return self.schema.table_mappings
+
+    @property
+    def field_mappings(self) -> Dict[str, Dict]:
+        return self.schema.field_mappings
+
+    @property
+    def template_prefix_index(self) -> TemplatePrefixIndex:
+        return self.schema.template_prefix_index
+
+    @property
+    def cache_namespace(self) -> str:
+        return self.schema.cache_namespace
+
+    def get_converted_sql_query(
+        self, sql_query: str, use_cache: bool = True
+    ) -> Tuple[str, Dict, Dict]:
+        # -> (updated sql query, query_data, mapped_fields_dict)
+        if use_cache:
+            return get_or_convert_cached(
+                namespace=self.cache_namespace,
+                mapping_version=self.mapping_version,
+                sql_query=sql_query,
+                convert=self._convert_sql_query,
+            )
+        return self._convert_sql_query(sql_query)
+
+    def get_conversion(
+        self, sql_query: str, use_cache: bool = True
+    ) -> "ConversionResult":
+        # Only the updated sql query is converted right away, the query IR /
+        # query_data are built on first access of the result
+        if use_cache:
+            sql_query_updated, mapped_fields_dict = get_or_convert_cached(
+                namespace=f"{self.cache_namespace}:sql",
+                mapping_version=self.mapping_version,
+                sql_query=sql_query,
+                convert=self._convert_sql_query_only,
+            )
+            select_expression = None
+        else:
+            with conversion_metrics.time_stage("parse"):
+                select_expression = parse_one(format_sql_query(sql_query))
+            sql_query_updated, mapped_fields_dict = self._rewrite_sql_query(
+                sql_query=sql_query,
+                select_expression=select_expression,
+                context=ConversionContext(),
+            )
 
-        table_name = query_data["table_name"]
+        return ConversionResult(
+            conversion=self,
+            source_sql_query=sql_query,
+            sql_query=sql_query_updated,
+            mapped_fields_dict=mapped_fields_dict,
+            select_expression=select_expression,
+        )
 
-        mapped_table_name = self.table_mappings.get(table_name)
-        if not mapped_table_name:
-            raise exceptions.TableNamesMappingNotFound(table_name=table_name)
+    def _convert_sql_query(self, sql_query: str) -> Tuple[str, Dict, Dict]:
+        # The query is parsed once, the same tree is shared by the field
+        # names replacement and the query_data building
+        with conversion_metrics.time_stage("parse"):
+            select_expression = parse_one(format_sql_query(sql_query))
 
-        sql_query_updated = sql_query_updated.replace("\n", " ")
+        query_ir = self._prepare_query_ir(select_expression)
 
-        sql_query_updated = sql_query_updated.replace('"', "'")
+        sql_query_updated, mapped_fields_dict = self._rewrite_sql_query(
+            sql_query=sql_query,
+            select_expression=select_expression,
+            context=ConversionContext(),
+            query_ir=query_ir,
+        )
 
-        # Replace Table Name (We can update this at the Parse Script,
-        # if we do that but we can't get parsed query without replacing
-        # fields, or table_name with their respective mapped field)
-        sql_query_updated = (
-            sql_query_updated.replace(f'"{table_name}"', mapped_table_name)
-            .replace(f"`{table_name}`", mapped_table_name)
-            .replace(f"'{table_name}'", mapped_table_name)
-            .replace(f" {table_name} ", f" {mapped_table_name} ")
-            .replace(f" {table_name}", f" {mapped_table_name}")
-            .replace(f" {table_name};", f" {mapped_table_name};")
+        with conversion_metrics.time_stage("query_data_serialization"):
+            query_data = to_query_data(query_ir)
+        return sql_query_updated, query_data, mapped_fields_dict
+
+    def _convert_sql_query_only(self, sql_query: str) -> Tuple[str, Dict]:
+        with conversion_metrics.time_stage("parse"):
+            select_expression = parse_one(format_sql_query(sql_query))
+        return self._rewrite_sql_query(
+            sql_query=sql_query,
+            select_expression=select_expression,
+            context=ConversionContext(),
         )
-        print("Original sql query(json):", json.dumps(sql_query))
-        print("Updated sql query:", sql_query_updated)
-        return sql_query_updated, query_data
 
-    @staticmethod
-    def _prepare_expression_result_for_alias_expression(expression_response):
-        alias_expression = expression_response["alias_expression"]
+    def _rewrite_sql_query(
+        self,
+        sql_query: str,
+        select_expression: exp.Expression,
+        context: ConversionContext,
+        query_ir: Optional[Node] = None,
+    ) -> Tuple[str, Dict]:
+        sql_query_updated = self._get_sql_query_with_replacing_field_names(
+            sql_query=sql_query,
+            select_expression=select_expression,
+            context=context,
+        )
+
+        table_name = self._get_table_name(
+            select_expression=select_expression, query_ir=query_ir
+        )
 
-        alias_expression_type = alias_expression.get("type")
-        alias = expression_response["alias"]
+        mapped_table_name = self.table_mappings.get(table_name)
+        if not mapped_table_name:
+            raise exceptions.TableNamesMappingNotFound(table_name=table_name)
 
-        result = {}
+        with conversion_metrics.time_stage("table_rewrite"):
+            sql_query_updated = sql_query_updated.replace("\n", " ")
+
+            sql_query_updated = sql_query_updated.replace('"', "'")
+
+            # Replace Table Name (We can update this at the Parse Script,
+            # if we do that but we can't get parsed query without replacing
+            # fields, or table_name with their respective mapped field)
+            sql_query_updated = (
+                sql_query_updated.replace(f'"{table_name}"', mapped_table_name)
+                .replace(f"`{table_name}`", mapped_table_name)
+                .replace(f"'{table_name}'", mapped_table_name)
+                .replace(f" {table_name} ", f" {mapped_table_name} ")
+                .replace(f" {table_name}", f" {mapped_table_name}")
+                .replace(f" {table_name};", f" {mapped_table_name};")
+            )
+        logger.debug("Original sql query: %s", TruncatedText(sql_query))
+        logger.debug("Updated sql query: %s", TruncatedText(sql_query_updated))
+        return sql_query_updated, context.mapped_fields_dict
 
-        if alias_expression_type == "count_method":
-            aggregation_dict = expression_response["alias_expression"]
+    def _get_table_name(
+        self, select_expression: exp.Expression, query_ir: Optional[Node] = None
+    ):
+        if query_ir is None:
+            # Read straight from the FROM table of the (first) select, the
+            # query IR is only built for the FROMs that are not a table
+            select = select_expression
+            while select.key == "union":
+                select = select.this
+
+            from_expression = (
+                select.args.get("from") if select.key == "select" else None
+            )
+            if (
+                from_expression
+                and isinstance(from_expression.this, exp.Table)
+                and isinstance(from_expression.this.this, exp.Identifier)
+            ):
+                return from_expression.this.this.output_name
 
-            aggregation_dict.update({"alias": alias})
+            query_ir = self._prepare_query_ir(select_expression)
 
-            alias_response = {
-                "aggregation": aggregation_dict,
-                "aggregation_type": "COUNT",
-                "alias": alias,
-                "type": "alias_aggregation",
-            }
-        elif alias_expression_type == "avg_method":
-            aggregation_dict = expression_response["alias_expression"]
+        if isinstance(query_ir, QueryNode) and query_ir.table_name is not None:
+            return query_ir.table_name
+        return to_query_data(query_ir)["table_name"]
 
-            aggregation_dict.update({"alias": alias})
+    @staticmethod
+    def _prepare_expression_result_for_alias_expression(
+        expression_response: AliasNode,
+    ) -> Node:
+        alias_expression = expression_response.alias_expression
+
+        alias_expression_type = get_node_type(alias_expression)
+        alias = expression_response.alias
 
-            alias_response = {
-                "aggregation": aggregation_dict,
-                "aggregation_type": "AVG",
-                "alias": alias,
-                "type": "alias_aggregation",
-            }
-        elif alias_expression_type == "column":
-            alias_field = alias_expression["field"]
+        if isinstance(alias_expression, ColumnNode):
+            alias_field = alias_expression.field
 
             # mapping_field, mapping_field_type =
             # self.get_field_mapping_if_exists(field_name=alias_field)
@@ -96,181 +466,81 @@ class SQLQueryConversion:
             # if not mapping_field:
             #     mapping_field = alias_field
 
-            alias_response = {
-                "type": "alias_column",
-                "alias": alias,
-                "field": alias_field,
-            }
-        elif alias_expression_type == "methods":
-            aggregation_dict = expression_response["alias_expression"]
-
-            aggregation_dict.update({"alias": alias})
-
-            alias_response = {
-                "aggregation": aggregation_dict,
-                "aggregation_type": "METHOD",
-                "alias": alias,
-                "type": "alias_aggregation",
-            }
-        elif alias_expression_type == "sum_method":
-            aggregation_dict = expression_response["alias_expression"]
-            aggregation_dict.update({"alias": alias})
-
-            alias_response = {
-                "alias": alias,
-                "aggregation": aggregation_dict,
-                "aggregation_type": "SUM",
-                "type": "alias_aggregation",
-            }
-        elif alias_expression_type == "multiplication_operation":
-            aggregation_dict = expression_response["alias_expression"]
-            aggregation_dict.update({"alias": alias})
-
-            alias_response = {
-                "alias": alias,
-                "aggregation": aggregation_dict,
-                "aggregation_type": "MULTIPLY",
-                "type": "alias_aggregation",
-            }
-        elif alias_expression_type == "division_operation":
-            aggregation_dict = expression_response["alias_expression"]
-            aggregation_dict.update({"alias": alias})
-
-            alias_response = {
-                "alias": alias,
-                "aggregation": aggregation_dict,
-                "aggregation_type": "DIVISION",
-                "type": "alias_aggregation",
-            }
-        elif alias_expression_type == "month_method":
-            aggregation_dict = expression_response["alias_expression"]
-
-            aggregation_dict.update({"alias": alias})
-
-            alias_response = {
-                "aggregation": aggregation_dict,
-                "aggregation_type": "MONTH",
-                "alias": alias,
-                "type": "alias_aggregation",
-            }
-        elif alias_expression_type == "week_method":
-            aggregation_dict = expression_response["alias_expression"]
-
-            aggregation_dict.update({"alias": alias})
-
-            alias_response = {
-                "aggregation": aggregation_dict,
-                "aggregation_type": "WEEK",
-                "alias": alias,
-                "type": "alias_aggregation",
-            }
-        elif alias_expression_type == "datetrunc_method":
-            aggregation_dict = expression_response["alias_expression"]
-
-            aggregation_dict.update({"alias": alias})
-
-            alias_response = {
-                "aggregation": aggregation_dict,
-                "aggregation_type": "DATE_TRUNC",
-                "alias": alias,
-                "type": "alias_aggregation",
-            }
-        elif alias_expression_type == "date_method":
-            aggregation_dict = expression_response["alias_expression"]
+            alias_response = AliasColumnNode(alias=alias, field=alias_field)
+        elif alias_expression_type in ALIAS_AGGREGATION_TYPES:
+            aggregation_dict = alias_expression
 
             aggregation_dict.update({"alias": alias})
 
-            alias_response = {
-                "aggregation": aggregation_dict,
-                "aggregation_type": "DATE",
-                "alias": alias,
-                "type": "alias_aggregation",
-            }
-        elif alias_expression_type == "parenthesis":
-            aggregation_dict = expression_response["alias_expression"]
-
-            aggregation_dict.update({"alias": alias})
-
-            alias_response = {
-                "aggregation": aggregation_dict,
-                "aggregation_type": "PARENTHESIS",
-                "alias": alias,
-                "type": "alias_aggregation",
-            }
+            alias_response = AliasAggregationNode(
+                alias=alias,
+                aggregation=aggregation_dict,
+                aggregation_type=ALIAS_AGGREGATION_TYPES[alias_expression_type],
+            )
         else:
-            print(
-                f"Alias Response type '{alias_expression_type}' supported in "
-                f"Generic Case",
-                alias_expression,
+            logger.debug(
+                "Alias Response type '%s' supported in Generic Case %s",
+                alias_expression_type,
+                TruncatedText(alias_expression),
             )
-            aggregation_dict = expression_response.get("alias_expression", {})
+            # The aggregation carries the alias, typed nodes are turned into
+            # their query data first
+            aggregation_dict = to_query_data(alias_expression)
             aggregation_dict.update({"alias": alias})
-            alias_response = {
-                "aggregation": aggregation_dict,
-                "alias": alias,
-                "type": "alias_aggregation",
-            }
+            alias_response = AliasAggregationNode(
+                alias=alias, aggregation=aggregation_dict
+            )
 
-        result.update(alias_response)
         # print(f"Alias expression response: {alias_response}")
-        return result
+        return alias_response
 
     def _prepare_expression_result_for_select_expression_response(
         self,
+        query: QueryNode,
         select_expression_responses: List,
     ):
-        result = {}
-
         columns = []
         aliases = []
         aggregations = []
 
         for expression_response in select_expression_responses:
-            expression_response_type = expression_response.get("type")
+            expression_response_type = get_node_type(expression_response)
 
-            if expression_response_type == "column":
-                column_name = expression_response["field"]
+            if isinstance(expression_response, ColumnNode):
+                column_name = expression_response.field
                 columns.append(column_name)
 
-            elif expression_response_type == "count_method":
-                aggregations.append(expression_response)
-            elif expression_response_type == "datetrunc_method":
-                aggregations.append(expression_response)
-            elif expression_response_type == "date_method":
+            elif expression_response_type in SELECT_AGGREGATION_TYPES:
                 aggregations.append(expression_response)
-            elif expression_response_type == "year_method":
-                aggregations.append(expression_response)
-            elif expression_response_type == "month_method":
-                aggregations.append(expression_response)
-            elif expression_response_type == "week_method":
-                aggregations.append(expression_response)
-            elif expression_response_type == "alias_column":
+            elif isinstance(expression_response, AliasNode):
                 alias_response = (
                     self._prepare_expression_result_for_alias_expression(
                         expression_response
                     )
                 )
 
-                if alias_response.get("aggregation"):
-                    aggregations.append(alias_response["aggregation"])
-
-                if alias_response:
-                    aliases.append(alias_response)
+                aliases.append(alias_response)
 
-                if alias_response.get("field"):
-                    columns.append(alias_response["field"])  # TODO Update
+                if isinstance(alias_response, AliasAggregationNode):
+                    if alias_response.aggregation:
+                        aggregations.append(alias_response.aggregation)
+                elif alias_response.field:
+                    columns.append(alias_response.field)  # TODO Update
             elif expression_response_type == "methods":
                 methods = expression_response.get("methods")
 
                 if len(methods.keys()) > 1:
-                    print(
-                        "Expression result not supported for multiple methods",
+                    logger.debug(
+                        "Expression result not supported for multiple methods "
+                        "%s",
                         methods,
                     )
-                    return result
+                    return
                 elif not len(methods.keys()):
-                    print("Expression result not supported with 0 methods")
-                    return result
+                    logger.debug(
+                        "Expression result not supported with 0 methods"
+                    )
+                    return
 
                 method_type = list(methods.keys())[0]
 
@@ -278,11 +548,13 @@ class SQLQueryConversion:
                     method_params = methods[method_type]
 
                     if not method_params or len(method_params) > 1:
-                        print(
-                            f"Expression result with '{method_type}' must "
-                            f"only have 1 param, got {len(method_params)}"
+                        logger.debug(
+                            "Expression result with '%s' must only have 1 "
+                            "param, got %s",
+                            method_type,
+                            len(method_params),
                         )
-                        return result
+                        return
 
                     custom_expression_response = {
                         "field": method_params[0],
@@ -291,1085 +563,1483 @@ class SQLQueryConversion:
 
                     aggregations.append(custom_expression_response)
                 else:
-                    print(
-                        f"Select Expression result not supported for '"
-                        f"{method_type}'"
+                    logger.debug(
+                        "Select Expression result not supported for '%s'",
+                        method_type,
                     )
             else:
-                print(
-                    f"Expression Response type '{expression_response_type}' "
-                    f"not supported",
-                    select_expression_responses,
-                )
-
-        result.update(
-            {
-                "columns": columns,
-                "aliases": aliases,
-                "aggregations": aggregations,
-            }
-        )
+                logger.debug(
+                    "Expression Response type '%s' not supported %s",
+                    expression_response_type,
+                    TruncatedText(select_expression_responses),
+                )
 
-        return result
+        # Left unset when the select can not be handled
+        query.columns = columns
+        query.aliases = []
+        for alias_response in aliases:
+            query.add_alias(alias_response)
+        query.aggregations = aggregations
 
     def _prepare_expression_result(
         self, expression, parent_key=None, parent_field=None, source=None
     ):
-        expression_type = expression.key
-        #     print(expression, "Expression", expression_type)
+        # Handlers yield a ChildExpression for every child node they need the
+        # query data of; the children are built on an explicit stack instead
+        # of the Python call stack, so deeply nested queries (e.g. hundreds of
+        # ORed conditions) can not hit the recursion limit.
+        stack = []
+        response = self._start_expression_result(
+            stack,
+            ChildExpression(expression, parent_key, parent_field, source),
+        )
 
-        response = {}
+        while stack:
+            expression_type, handler_result = stack[-1]
+            try:
+                child_expression = handler_result.send(response)
+            except StopIteration as stop:
+                stack.pop()
+                response = self._finish_expression_result(
+                    expression_type, stop.value
+                )
+                continue
 
-        if expression_type == "column":
-            field_name = expression.this.output_name
+            response = self._start_expression_result(stack, child_expression)
 
-            # mapping_field, mapping_field_type =
-            # self.get_field_mapping_if_exists(field_name=field_name)
-            #
-            # if not mapping_field:
-            #     mapping_field = field_name
-
-            # print(f"field: {field_name}, mapping: {mapping_field}")
-            response = {
-                "field": field_name,
-                "type": "column",
-            }  # TODO Add field Mapping here
-        elif expression_type == "literal":
-            field_val = expression.output_name
-
-            response = {"value": field_val, "type": "literal"}
-        elif expression_type == "where":
-            response = self._prepare_expression_result(
-                expression.this, parent_key=expression_type, source=source
-            )
-        elif expression_type == "select":
-            select_expression_responses = []
-            groups = []
+        return response
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print(iter_key, type(iter_key), iter_expression)
-
-                if iter_key == "from":
-                    response.update(
-                        {
-                            "table_name": self._prepare_expression_result(
-                                iter_expression, source=source
-                            )
-                        }
-                    )
-                elif iter_key == "where":
-                    response.update(
-                        {
-                            "conditions": self._prepare_expression_result(
-                                iter_expression, source=source
-                            )
-                        }
-                    )
-                elif iter_key == "limit":
-                    response.update(
-                        self._prepare_expression_result(
-                            iter_expression,
-                            parent_key=expression_type,
-                            source=source,
-                        )
-                    )
-                elif iter_key == "order":
-                    response.update(
-                        {
-                            "order_by": self._prepare_expression_result(
-                                iter_expression, source=source
-                            )
-                        }
-                    )
-                elif iter_key == "expressions":
-                    select_expression_responses.append(
-                        self._prepare_expression_result(
-                            iter_expression,
-                            parent_key=expression_type,
-                            source=source,
-                        )
-                    )
-                elif iter_key == "group":
-                    groups = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                else:
-                    print(
-                        f"'SELECT' Expression Type -> '{iter_key}' Not handled"
-                    )
+    def _start_expression_result(self, stack, child_expression):
+        # -> query data of the expression, or None when its handler is a
+        # generator which got pushed on the stack
+        expression = child_expression.expression
+        expression_type = expression.key
+        #     print(expression, "Expression", expression_type)
 
-            print(f"groups: {groups}")
-            if groups:
-                response.update({"group_by_fields": groups})
+        handler = self.EXPRESSION_RESULT_HANDLERS.get(expression_type)
+        if handler is None:
+            logger.debug("Expression type %s not handled yet", expression_type)
+            return self._finish_expression_result(expression_type, {})
+
+        handler_result = handler(
+            self,
+            expression,
+            parent_key=child_expression.parent_key,
+            parent_field=child_expression.parent_field,
+            source=child_expression.source,
+        )
+        if isinstance(handler_result, GeneratorType):
+            stack.append((expression_type, handler_result))
+            return None
 
-            select_expression_result = (
-                self._prepare_expression_result_for_select_expression_response(
-                    select_expression_responses=select_expression_responses
-                )
-            )
+        return self._finish_expression_result(expression_type, handler_result)
 
-            response.update(select_expression_result)
-        elif expression_type == "subquery":
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    sub_query_response = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )
-                    response = {
-                        "sub_query": sub_query_response,
-                        "type": "subquery",
-                    }
-                else:
-                    print(
-                        f"'SUBQUERY' Expression Type -> '{iter_key}' Not "
-                        f"handled"
-                    )
-        elif expression_type == "union":
-            response = {}
+    @staticmethod
+    def _finish_expression_result(expression_type, response):
+        if not response:
+            logger.debug("Got Empty response for %s type", expression_type)
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    left_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+        return response
 
-                    response = left_val
+    def _prepare_column_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        field_name = expression.this.output_name
 
-                elif iter_key == "expression":
-                    right_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                    response.setdefault("unions", [])
-                    response["unions"].append(right_val)
-                else:
-                    print(
-                        f"'UNION' Expression Type -> '{iter_key}' Not handled"
-                    )
+        # mapping_field, mapping_field_type =
+        # self.get_field_mapping_if_exists(field_name=field_name)
+        #
+        # if not mapping_field:
+        #     mapping_field = field_name
 
-        elif expression_type == "from":
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print(iter_key, type(iter_key), iter_expression)
-                if iter_key == "this":
-                    response = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                else:
-                    print(
-                        f"'FROM' Expression Type -> '{iter_key}' Not handled"
-                    )
-        elif expression_type == "table":
-            response = self._prepare_expression_result(
-                expression.this, source=source
-            )
-            # TODO Add Table Mapping Here
-        elif expression_type == "identifier":
-            response = expression.output_name
-        elif expression_type == "between":
-            response = {}
+        # print(f"field: {field_name}, mapping: {mapping_field}")
+        response = ColumnNode(field=field_name)  # TODO Add field Mapping here
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print(iter_key, type(iter_key), iter_expression)
+        return response
 
-                if iter_key == "this":
-                    field_info = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )
+    def _prepare_literal_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        field_val = expression.output_name
 
-                    between_field = field_info  # TODO Apply field Mapping here
+        response = LiteralNode(value=field_val)
 
-                    response = {
-                        "type": "between_condition",
-                        "field": between_field,
-                    }
+        return response
 
-                elif iter_key == "low":
-                    response.update(
-                        {
-                            "low": self._prepare_expression_result(
-                                iter_expression, source=source
-                            )
-                        }
-                    )
-                elif iter_key == "high":
-                    response.update(
-                        {
-                            "high": self._prepare_expression_result(
-                                iter_expression, source=source
-                            )
-                        }
-                    )
-                else:
-                    print(
-                        f"'BETWEEN' Expression Type -> '{iter_key}' Not "
-                        f"handled"
-                    )
-        elif expression_type == "in":
-            response = {}
-            values_list = []
+    def _prepare_where_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    field_dict = self._prepare_expression_result(
-                        expression=iter_expression, source=source
-                    )
+        response = yield ChildExpression(
+            expression.this, parent_key=expression_type, source=source
+        )
 
-                    response = {
-                        "type": "in_condition",
-                        "field": field_dict,
-                    }
-                elif iter_key == "expressions":
-                    field_value_option = self._prepare_expression_result(
-                        expression=iter_expression, source=source
-                    )
-                    values_list.append(field_value_option)
-                else:
-                    print(f"'IN' Expression Type -> '{iter_key}' Not handled")
+        return response
 
-            if values_list:
-                response.update({"values_list": values_list})
-        elif expression_type == "anonymous":
-            #         print(expression, "anonymous")
-            method_key = str(expression.this)
+    def _prepare_select_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = QueryNode()
 
-            if method_key == "GETDATE":
-                response = {"methods": {"CURDATE": []}, "type": "methods"}
-            else:
-                method_params = []
+        select_expression_responses = []
+        groups = []
 
-                for iter_key, iter_expression in expression.iter_expressions():
-                    param_resp = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print(iter_key, type(iter_key), iter_expression)
 
-                    method_params.append(param_resp) if param_resp else None
+            if iter_key == "from":
+                table_name = yield ChildExpression(
+                    iter_expression, source=source
+                )
+                response.set_part("table_name", table_name)
+            elif iter_key == "where":
+                conditions = yield ChildExpression(
+                    iter_expression, source=source
+                )
+                response.set_part("conditions", conditions)
+            elif iter_key == "limit":
+                limit = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+                response.set_part("limit", limit["limit"])
+            elif iter_key == "order":
+                order_by = yield ChildExpression(
+                    iter_expression, source=source
+                )
+                response.set_part("order_by", order_by)
+            elif iter_key == "expressions":
+                select_expression_response = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+                select_expression_responses.append(select_expression_response)
+            elif iter_key == "group":
+                groups = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+            else:
+                logger.debug(
+                    "'SELECT' Expression Type -> '%s' Not handled", iter_key
+                )
 
-                if method_key == "DATEADD":
-                    response = {
-                        "params": method_params,
-                        "type": "date_add_method",
-                    }
+        logger.debug("groups: %s", groups)
+        if groups:
+            response.group_by_fields = groups
 
-                else:
-                    response = {
-                        "methods": {method_key: method_params},
-                        "type": "methods",
-                    }
+        self._prepare_expression_result_for_select_expression_response(
+            query=response,
+            select_expression_responses=select_expression_responses,
+        )
 
-        elif expression_type == "eq":
-            where_field = ""  # TODO Add field Mapping Here
-            where_val = ""
+        # Set cols for aggregations
+        for aggregation in response.aggregations or []:
+            if aggregation.get("alias"):
+                if response.columns is None:
+                    response.columns = []
+                if aggregation["alias"] not in response.columns:
+                    response.columns.append(aggregation["alias"])
+
+        for alias_node in response.aliases or []:
+            field = getattr(alias_node, "field", None)
+            if field:
+                if response.columns is None:
+                    response.columns = []
+                if field not in response.columns:
+                    response.columns.append(field)
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    where_field_exp_result = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )
-                    where_field = where_field_exp_result
+        return response
 
-                else:
-                    where_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        parent_field=where_field,
-                        source=source,
-                    )
+    def _prepare_subquery_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        response = {}
 
-            if where_field:
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                sub_query_response = yield ChildExpression(
+                    iter_expression, source=source
+                )
                 response = {
-                    "field": where_field,
-                    "value": where_val,
-                    "type": "eq_condition",
+                    "sub_query": sub_query_response,
+                    "type": "subquery",
                 }
+            else:
+                logger.debug(
+                    "'SUBQUERY' Expression Type -> '%s' Not handled", iter_key
+                )
 
-        elif expression_type == "neq":
-            where_field = ""  # TODO Add field Mapping Here
-            where_val = ""
+        return response
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    where_field_exp_result = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )
-                    where_field = where_field_exp_result
+    def _prepare_union_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
 
-                else:
-                    where_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+        response = {}
 
-            if where_field:
-                response = {
-                    "field": where_field,
-                    "value": where_val,
-                    "type": "neq_condition",
-                }
-        elif expression_type == "gt":
-            where_field = ""  # TODO Add field Mapping Here
-            where_val = ""
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                left_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    where_field_exp_result = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )
-                    where_field = where_field_exp_result
+                response = left_val
 
+            elif iter_key == "expression":
+                right_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+                if isinstance(response, QueryNode):
+                    response.add_union(right_val)
                 else:
-                    where_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+                    response.setdefault("unions", [])
+                    response["unions"].append(right_val)
+            else:
+                logger.debug(
+                    "'UNION' Expression Type -> '%s' Not handled", iter_key
+                )
 
-            if where_field:
-                response = {
-                    "field": where_field,
-                    "value": where_val,
-                    "type": "gt_condition",
-                }
+        return response
 
-        elif expression_type == "lt":
-            where_field = ""  # TODO Add field Mapping Here
-            where_val = ""
+    def _prepare_from_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    where_field_exp_result = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )
-                    where_field = where_field_exp_result
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print(iter_key, type(iter_key), iter_expression)
+            if iter_key == "this":
+                response = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+            else:
+                logger.debug(
+                    "'FROM' Expression Type -> '%s' Not handled", iter_key
+                )
 
-                else:
-                    where_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+        return response
 
-            if where_field:
-                response = {
-                    "field": where_field,
-                    "value": where_val,
-                    "type": "lt_condition",
-                }
-        elif expression_type == "gte":
-            where_field = ""  # TODO Add field Mapping Here
-            where_val = ""
+    def _prepare_table_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        response = yield ChildExpression(
+            expression.this, source=source
+        )
+        # TODO Add Table Mapping Here
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print("GTE", iter_key, iter_expression,
-                #             type(iter_expression))
-                if iter_key == "this":
-                    where_field_exp_result = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )
-                    where_field = where_field_exp_result
-                else:
-                    where_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+        return response
 
-            if where_field:
-                response = {
-                    "field": where_field,
-                    "value": where_val,
-                    "type": "gte_condition",
-                }
-        elif expression_type == "lte":
-            where_field = ""  # TODO Add field Mapping Here
-            where_val = ""
+    def _prepare_identifier_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        response = expression.output_name
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    where_field_exp_result = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )
-                    where_field = where_field_exp_result
+        return response
 
-                else:
-                    where_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+    def _prepare_between_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        response = {}
 
-            if where_field:
-                response = {
-                    "field": where_field,
-                    "value": where_val,
-                    "type": "lte_condition",
-                }
-        elif expression_type == "and":
-            conditional_items = []
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print(iter_key, type(iter_key), iter_expression)
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print(iter_key, iter_expression)
-                expression_result = self._prepare_expression_result(
+            if iter_key == "this":
+                field_info = yield ChildExpression(
                     iter_expression, source=source
                 )
 
-                if expression_result:
-                    conditional_items.append(expression_result)
+                between_field = field_info  # TODO Apply field Mapping here
 
-            response.update(
-                {"conditional_and": conditional_items, "type": "and_condition"}
-            )
-        elif expression_type == "or":
-            conditional_items = []
+                response = {
+                    "type": "between_condition",
+                    "field": between_field,
+                }
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print(iter_key, iter_expression)
-                expression_result = self._prepare_expression_result(
+            elif iter_key == "low":
+                low = yield ChildExpression(
                     iter_expression, source=source
                 )
+                response.update({"low": low})
+            elif iter_key == "high":
+                high = yield ChildExpression(
+                    iter_expression, source=source
+                )
+                response.update({"high": high})
+            else:
+                logger.debug(
+                    "'BETWEEN' Expression Type -> '%s' Not handled", iter_key
+                )
 
-                if expression_result:
-                    conditional_items.append(expression_result)
-
-            response.update(
-                {"conditional_or": conditional_items, "type": "or_condition"}
+        return response
+
+    def _prepare_in_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        field_dict = None
+        values_list = []
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                field_dict = yield ChildExpression(
+                    expression=iter_expression, source=source
+                )
+            elif iter_key == "expressions":
+                field_value_option = yield ChildExpression(
+                    expression=iter_expression, source=source
+                )
+                values_list.append(field_value_option)
+            else:
+                logger.debug(
+                    "'IN' Expression Type -> '%s' Not handled", iter_key
+                )
+
+        response = InConditionNode(field=field_dict, values_list=values_list)
+
+        return response
+
+    def _prepare_anonymous_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        #         print(expression, "anonymous")
+        method_key = str(expression.this)
+
+        if method_key == "GETDATE":
+            response = {"methods": {"CURDATE": []}, "type": "methods"}
+        else:
+            method_params = []
+
+            for iter_key, iter_expression in expression.iter_expressions():
+                param_resp = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+
+                method_params.append(param_resp) if param_resp else None
+
+            if method_key == "DATEADD":
+                response = {
+                    "params": method_params,
+                    "type": "date_add_method",
+                }
+
+            else:
+                response = {
+                    "methods": {method_key: method_params},
+                    "type": "methods",
+                }
+
+        return response
+
+    def _prepare_eq_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        where_field = ""  # TODO Add field Mapping Here
+        where_val = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                where_field_exp_result = yield ChildExpression(
+                    iter_expression, source=source
+                )
+                where_field = where_field_exp_result
+
+            else:
+                where_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    parent_field=where_field,
+                    source=source,
+                )
+
+        if where_field:
+            response = ComparisonNode(
+                kind=NodeKind.EQ_CONDITION,
+                field=where_field,
+                value=where_val,
             )
-        elif expression_type == "not":
-            response = self._prepare_expression_result(
-                expression.this, parent_key=expression_type, source=source
+
+        return response
+
+    def _prepare_neq_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        where_field = ""  # TODO Add field Mapping Here
+        where_val = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                where_field_exp_result = yield ChildExpression(
+                    iter_expression, source=source
+                )
+                where_field = where_field_exp_result
+
+            else:
+                where_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+
+        if where_field:
+            response = ComparisonNode(
+                kind=NodeKind.NEQ_CONDITION,
+                field=where_field,
+                value=where_val,
             )
-        elif expression_type == "neg":
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    val = self._prepare_expression_result(
-                        expression.this,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                    response = {"value": val, "type": "neg_sign"}
+
+        return response
+
+    def _prepare_gt_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        where_field = ""  # TODO Add field Mapping Here
+        where_val = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                where_field_exp_result = yield ChildExpression(
+                    iter_expression, source=source
+                )
+                where_field = where_field_exp_result
+
+            else:
+                where_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+
+        if where_field:
+            response = ComparisonNode(
+                kind=NodeKind.GT_CONDITION,
+                field=where_field,
+                value=where_val,
+            )
+
+        return response
+
+    def _prepare_lt_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        where_field = ""  # TODO Add field Mapping Here
+        where_val = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                where_field_exp_result = yield ChildExpression(
+                    iter_expression, source=source
+                )
+                where_field = where_field_exp_result
+
+            else:
+                where_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+
+        if where_field:
+            response = ComparisonNode(
+                kind=NodeKind.LT_CONDITION,
+                field=where_field,
+                value=where_val,
+            )
+
+        return response
+
+    def _prepare_gte_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        where_field = ""  # TODO Add field Mapping Here
+        where_val = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print("GTE", iter_key, iter_expression,
+            #             type(iter_expression))
+            if iter_key == "this":
+                where_field_exp_result = yield ChildExpression(
+                    iter_expression, source=source
+                )
+                where_field = where_field_exp_result
+            else:
+                where_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+
+        if where_field:
+            response = ComparisonNode(
+                kind=NodeKind.GTE_CONDITION,
+                field=where_field,
+                value=where_val,
+            )
+
+        return response
+
+    def _prepare_lte_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        where_field = ""  # TODO Add field Mapping Here
+        where_val = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                where_field_exp_result = yield ChildExpression(
+                    iter_expression, source=source
+                )
+                where_field = where_field_exp_result
+
+            else:
+                where_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+
+        if where_field:
+            response = ComparisonNode(
+                kind=NodeKind.LTE_CONDITION,
+                field=where_field,
+                value=where_val,
+            )
+
+        return response
+
+    def _prepare_and_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        conditional_items = []
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print(iter_key, iter_expression)
+            expression_result = yield ChildExpression(
+                iter_expression, source=source
+            )
+
+            if expression_result:
+                conditional_items.append(expression_result)
+
+        response = ConditionalNode(
+            kind=NodeKind.AND_CONDITION, items=conditional_items
+        )
+
+        return response
+
+    def _prepare_or_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        conditional_items = []
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print(iter_key, iter_expression)
+            expression_result = yield ChildExpression(
+                iter_expression, source=source
+            )
+
+            if expression_result:
+                conditional_items.append(expression_result)
+
+        response = ConditionalNode(
+            kind=NodeKind.OR_CONDITION, items=conditional_items
+        )
+
+        return response
+
+    def _prepare_not_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+
+        response = yield ChildExpression(
+            expression.this, parent_key=expression_type, source=source
+        )
+
+        return response
+
+    def _prepare_neg_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                val = yield ChildExpression(
+                    expression.this,
+                    parent_key=expression_type,
+                    source=source,
+                )
+                response = {"value": val, "type": "neg_sign"}
+            else:
+                logger.debug(
+                    "'NEG' Expression Type -> '%s, %s' Not handled",
+                    iter_key,
+                    iter_expression.key,
+                )
+
+        return response
+
+    def _prepare_null_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        response = {"null": {}}
+
+        return response
+
+    def _prepare_ordered_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+
+        is_desc_order = expression.args.get("desc")
+
+        response = []
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            field = yield ChildExpression(
+                iter_expression, parent_key=expression_type, source=source
+            )
+            field = to_query_data(field)
+
+            if "field" not in field:
+                logger.debug(
+                    "Order by with '%s' is not supported %s",
+                    field["type"],
+                    TruncatedText(field),
+                )
+                break
+
+            response.append(
+                {
+                    "field": field["field"],
+                    "desc": is_desc_order,
+                    "type": field["type"],
+                }
+            )
+
+        return response
+
+    def _prepare_order_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        order_by_fields = []
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            order_by_field = yield ChildExpression(
+                iter_expression,
+                parent_key=expression_type,
+                source=source,
+            )
+            order_by_fields.extend(order_by_field)
+
+        response.update(
+            {"fields": order_by_fields, "type": "order_by_method"}
+        )
+
+        return response
+
+    def _prepare_group_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        group_by_items = []
+        for iter_key, iter_expression in expression.iter_expressions():
+            group_by_item = yield ChildExpression(
+                iter_expression,
+                parent_key=expression_type,
+                source=source,
+            )
+            group_by_items.append(group_by_item)
+
+        response.update(
+            {"fields": group_by_items, "type": "group_by_method"}
+        )
+
+        return response
+
+    def _prepare_limit_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        limit = yield ChildExpression(expression.expression, source=source)
+        response = {
+            "limit": limit,
+            "type": "limit",
+        }
+
+        return response
+
+    def _prepare_star_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        response = {"field": "*", "type": "star"}
+
+        return response
+
+    def _prepare_alias_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        alias_name = ""
+        alias_expression = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print("ALIAS", iter_key, type(iter_expression),
+            #             iter_expression.key, iter_expression)
+            if iter_key == "alias":
+                alias_name = yield ChildExpression(
+                    iter_expression, source=source
+                )
+            elif iter_key == "this":
+                alias_expression = yield ChildExpression(
+                    iter_expression, source=source
+                )
+            else:
+                logger.debug(
+                    "'ALIAS' Expression Type -> '%s' Not handled", iter_key
+                )
+
+        response = AliasNode(alias_expression=alias_expression, alias=alias_name)
+
+        return response
+
+    def _prepare_count_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+
+        count_fields = []
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print("COUNT", iter_key, type(iter_expression),
+            #             iter_expression.key, iter_expression)
+
+            count_field = yield ChildExpression(
+                iter_expression,
+                parent_key=expression_type,
+                source=source,
+            )
+            count_fields.append(count_field)
+
+        if len(count_fields) > 1:
+            logger.debug(
+                "Got Invalid no of Counts %s", TruncatedText(expression)
+            )
+
+        response = {"count": count_fields[0], "type": "count_method"}
+
+        return response
+
+    def _prepare_avg_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+
+        avg_fields = []
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            avg_field = yield ChildExpression(
+                iter_expression,
+                parent_key=expression_type,
+                source=source,
+            )
+            avg_fields.append(avg_field)
+
+        if len(avg_fields) > 1:
+            logger.debug(
+                "Got Invalid no of Avgs %s", TruncatedText(expression)
+            )
+
+        response = {"avg": avg_fields[0], "type": "avg_method"}
+
+        return response
+
+    def _prepare_sub_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+
+        left_val = ""
+        right_val = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                left_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+            else:
+                right_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+        response = {
+            "left_val": left_val,
+            "right_val": right_val,
+            "type": "sub_operation",
+        }
+
+        return response
+
+    def _prepare_interval_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+
+        left_val = ""
+        right_val = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print("INTERVAL", iter_key,
+            #             type(iter_expression), iter_expression.key,
+            #             iter_expression)
+            if iter_key == "this":
+                left_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+            else:
+                right_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+        response = {
+            "left_val": left_val,
+            "right_val": right_val,
+            "type": "interval_method",
+        }
+
+        return response
+
+    def _prepare_var_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        var_val = expression.this
+
+        response = {"value": var_val, "type": "var_method"}
+
+        return response
+
+    def _prepare_is_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        response = {}
+
+        field_name = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            # print(iter_key, type(iter_expression.key),
+            # iter_expression.key, iter_expression)
+            if iter_expression.key == "column":
+                field = yield ChildExpression(iter_expression, source=source)
+                field_name = field.field
+
+            elif iter_expression.key == "null":
+                if field_name:
+                    response = {
+                        "type": "is_condition",
+                        "field": field_name,
+                        "nullable": False
+                        if parent_key and parent_key == "not"
+                        else True,
+                    }
                 else:
-                    print(
-                        f"'NEG' Expression Type -> '{iter_key}, "
-                        f"{iter_expression.key}' Not handled"
+                    logger.debug(
+                        "'IS' Expression Type -> '%s' and empty Field Case "
+                        "Not handled",
+                        iter_key,
                     )
-        elif expression_type == "null":
-            response = {"null": {}}
-        elif expression_type == "ordered":
-            is_desc_order = expression.args.get("desc")
 
-            response = []
+            elif iter_expression.key == "literal":
+                field_name = iter_expression.output_name
+            else:
+                logger.debug(
+                    "'IS' Expression Type -> '%s, %s' Not handled",
+                    iter_key,
+                    iter_expression.key,
+                )
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                field = self._prepare_expression_result(
-                    iter_expression, parent_key=expression_type, source=source
+        response.update({"type": "is_condition"})
+
+        return response
+
+    def _prepare_like_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        response = {}
+
+        field_name = ""
+        field_expression = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_expression.key == "column":
+                field = yield ChildExpression(iter_expression, source=source)
+                field_name = field.field
+            elif iter_expression.key == "literal":
+                field_expression = iter_expression.output_name
+            else:
+                logger.debug(
+                    "'LIKE' Expression Type -> '%s, %s' Not handled",
+                    iter_key,
+                    iter_expression.key,
                 )
 
-                if "field" not in field:
-                    print(
-                        f"Order by with '{field['type']}' is not supported",
-                        field,
-                    )
-                    break
+        if field_name and field_expression:
+            response.update(
+                {
+                    "type": "like_operator",
+                    "field": field_name,
+                    "expression": field_expression,
+                }
+            )
+
+        return response
+
+    def _prepare_distinct_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+
+        fields = []
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print("DISTINCT", iter_key,
+            #             type(iter_expression.key), iter_expression.key,
+            #             iter_expression)
+            field = yield ChildExpression(
+                iter_expression,
+                parent_key=expression_type,
+                source=source,
+            )
+            fields.append(field)
+
+        if len(fields) > 1:
+            logger.debug(
+                "Got Invalid no of Distinct fields %s", TruncatedText(expression)
+            )
+
+        response = {"type": "distinct_method", "field": fields[0]}
 
-                response.append(
-                    {
-                        "field": field["field"],
-                        "desc": is_desc_order,
-                        "type": field["type"],
-                    }
-                )
-        elif expression_type == "order":
-            order_by_fields = []
+        return response
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                order_by_fields.extend(
-                    self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                )
+    def _prepare_sum_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
 
-            response.update(
-                {"fields": order_by_fields, "type": "order_by_method"}
+        sum_fields = []
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            sum_field = yield ChildExpression(
+                iter_expression,
+                parent_key=expression_type,
+                source=source,
             )
-        elif expression_type == "group":
-            group_by_items = []
-            for iter_key, iter_expression in expression.iter_expressions():
-                group_by_items.append(
-                    self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                )
+            sum_fields.append(sum_field)
 
-            response.update(
-                {"fields": group_by_items, "type": "group_by_method"}
+        if len(sum_fields) > 1:
+            logger.debug(
+                "Got Invalid no of SUM fields %s", TruncatedText(expression)
             )
-        elif expression_type == "limit":
-            response = {
-                "limit": self._prepare_expression_result(
-                    expression.expression, source=source
-                ),
-                "type": "limit",
-            }
-        elif expression_type == "star":
-            response = {"field": "*", "type": "star"}
-        elif expression_type == "alias":
-            alias_name = ""
-            alias_expression = ""
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print("ALIAS", iter_key, type(iter_expression),
-                #             iter_expression.key, iter_expression)
-                if iter_key == "alias":
-                    alias_name = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )
-                elif iter_key == "this":
-                    alias_expression = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )
-                else:
-                    print(
-                        f"'ALIAS' Expression Type -> '{iter_key}' Not handled"
-                    )
+        response = {"field": sum_fields[0], "type": "sum_method"}
+
+        return response
 
-            response = {
-                "alias_expression": alias_expression,
-                "alias": alias_name,
-                "type": "alias_column",
-            }
-        elif expression_type == "count":
-            count_fields = []
+    def _prepare_mul_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print("COUNT", iter_key, type(iter_expression),
-                #             iter_expression.key, iter_expression)
-
-                count_fields.append(
-                    self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+        left_val = ""
+        right_val = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print("INTERVAL", iter_key,
+            #             type(iter_expression), iter_expression.key,
+            #             iter_expression)
+            if iter_key == "this":
+                left_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+            else:
+                right_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
                 )
+        response = {
+            "left_val": left_val,
+            "right_val": right_val,
+            "type": "multiplication_operation",
+        }
 
-            if len(count_fields) > 1:
-                print("Got Invalid no of Counts", expression)
+        return response
 
-            response = {"count": count_fields[0], "type": "count_method"}
-        elif expression_type == "avg":
-            avg_fields = []
+    def _prepare_div_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                avg_fields.append(
-                    self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+        left_val = ""
+        right_val = ""
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print("INTERVAL", iter_key,
+            #             type(iter_expression), iter_expression.key,
+            #             iter_expression)
+            if iter_key == "this":
+                left_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+            else:
+                right_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
                 )
+        response = {
+            "left_val": left_val,
+            "right_val": right_val,
+            "type": "division_operation",
+        }
 
-            if len(avg_fields) > 1:
-                print("Got Invalid no of Avgs", expression)
+        return response
 
-            response = {"avg": avg_fields[0], "type": "avg_method"}
-        elif expression_type == "sub":
-            left_val = ""
-            right_val = ""
+    def _prepare_paren_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    left_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                else:
-                    right_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-            response = {
-                "left_val": left_val,
-                "right_val": right_val,
-                "type": "sub_operation",
-            }
-        elif expression_type == "interval":
-            left_val = ""
-            right_val = ""
+        fields = []
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print("INTERVAL", iter_key,
-                #             type(iter_expression), iter_expression.key,
-                #             iter_expression)
-                if iter_key == "this":
-                    left_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                else:
-                    right_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-            response = {
-                "left_val": left_val,
-                "right_val": right_val,
-                "type": "interval_method",
-            }
+        for iter_key, iter_expression in expression.iter_expressions():
+            field = yield ChildExpression(
+                iter_expression,
+                parent_key=expression_type,
+                source=source,
+            )
+            fields.append(field)
 
-        elif expression_type == "var":
-            var_val = expression.this
+        response = {
+            "fields": fields,
+            "type": "parenthesis",
+        }
 
-            response = {"value": var_val, "type": "var_method"}
-        elif expression_type == "is":
-            field_name = ""
+        return response
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                # print(iter_key, type(iter_expression.key),
-                # iter_expression.key, iter_expression)
-                if iter_expression.key == "column":
-                    field_name = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )["field"]
-
-                elif iter_expression.key == "null":
-                    if field_name:
-                        response = {
-                            "type": "is_condition",
-                            "field": field_name,
-                            "nullable": False
-                            if parent_key and parent_key == "not"
-                            else True,
-                        }
-                    else:
-                        print(
-                            f"'IS' Expression Type -> '{iter_key}' and empty "
-                            f"Field Case Not handled"
-                        )
+    def _prepare_case_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
 
-                elif iter_expression.key == "literal":
-                    field_name = iter_expression.output_name
-                else:
-                    print(
-                        f"'IS' Expression Type -> '{iter_key}, "
-                        f"{iter_expression.key}' Not handled"
-                    )
+        default = ""
+        cases = []
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            #             print("CASE", iter_key, iter_expression,
+            #             type(iter_expression))
+            if iter_key == "default":
+                default = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+            elif iter_key == "ifs":
+                case = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+                cases.append(case)
+            else:
+                logger.debug("Case : type '%s' not handled", iter_key)
 
-            response.update({"type": "is_condition"})
-        elif expression_type == "like":
-            field_name = ""
-            field_expression = ""
+        response = {
+            "cases": cases,
+            "default": default,
+            "type": "case",
+        }
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_expression.key == "column":
-                    field_name = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )["field"]
-                elif iter_expression.key == "literal":
-                    field_expression = iter_expression.output_name
-                else:
-                    print(
-                        f"'LIKE' Expression Type -> '{iter_key}, "
-                        f"{iter_expression.key}' Not handled"
-                    )
+        return response
 
-            if field_name and field_expression:
-                response.update(
-                    {
-                        "type": "like_operator",
-                        "field": field_name,
-                        "expression": field_expression,
-                    }
+    def _prepare_if_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+
+        condition = None
+        condition_value = None
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                condition = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+            elif iter_key == "true":
+                condition_value = yield ChildExpression(
+                    iter_expression, source=source
                 )
+            else:
+                logger.debug("IF Condition with '%s' not handled", iter_key)
 
-        elif expression_type == "distinct":
-            fields = []
+        response = {
+            "condition": condition,
+            "condition_value": condition_value,
+            "type": "if_condition",
+        }
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print("DISTINCT", iter_key,
-                #             type(iter_expression.key), iter_expression.key,
-                #             iter_expression)
-                fields.append(
-                    self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+        return response
+
+    def _prepare_date_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this" or iter_key == "expressions":
+                field = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+                response = {
+                    "field": field,
+                    "type": "date_method",
+                }
+            else:
+                logger.debug(
+                    "DATE: Expression type %s not handled yet", iter_key
                 )
 
-            if len(fields) > 1:
-                print("Got Invalid no of Distinct fields", expression)
+        return response
 
-            response = {"type": "distinct_method", "field": fields[0]}
-        elif expression_type == "sum":
-            sum_fields = []
+    def _prepare_month_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                sum_fields.append(
-                    self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                field = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+                response = {
+                    "field": field,
+                    "type": "month_method",
+                }
+            else:
+                logger.debug(
+                    "MONTH: Expression type %s not handled yet", iter_key
                 )
 
-            if len(sum_fields) > 1:
-                print("Got Invalid no of SUM fields", expression)
+        return response
 
-            response = {"field": sum_fields[0], "type": "sum_method"}
-        elif expression_type == "mul":
-            left_val = ""
-            right_val = ""
+    def _prepare_year_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print("INTERVAL", iter_key,
-                #             type(iter_expression), iter_expression.key,
-                #             iter_expression)
-                if iter_key == "this":
-                    left_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                else:
-                    right_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-            response = {
-                "left_val": left_val,
-                "right_val": right_val,
-                "type": "multiplication_operation",
-            }
-        elif expression_type == "div":
-            left_val = ""
-            right_val = ""
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                field = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+                response = {
+                    "field": field,
+                    "type": "year_method",
+                }
+            else:
+                logger.debug(
+                    "YEAR: Expression type %s not handled yet", iter_key
+                )
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print("INTERVAL", iter_key,
-                #             type(iter_expression), iter_expression.key,
-                #             iter_expression)
-                if iter_key == "this":
-                    left_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                else:
-                    right_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-            response = {
-                "left_val": left_val,
-                "right_val": right_val,
-                "type": "division_operation",
-            }
-        elif expression_type == "paren":
-            fields = []
+        return response
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                fields.append(
-                    self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
+    def _prepare_week_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
+        response = {}
+
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                field = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+                response = {
+                    "field": field,
+                    "type": "week_method",
+                }
+            else:
+                logger.debug(
+                    "WEEK: Expression type %s not handled yet", iter_key
                 )
 
-            response = {
-                "fields": fields,
-                "type": "parenthesis",
-            }
-        elif expression_type == "case":
-            default = ""
-            cases = []
+        return response
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                #             print("CASE", iter_key, iter_expression,
-                #             type(iter_expression))
-                if iter_key == "default":
-                    default = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                elif iter_key == "ifs":
-                    cases.append(
-                        self._prepare_expression_result(
-                            iter_expression,
-                            parent_key=expression_type,
-                            source=source,
-                        )
-                    )
-                else:
-                    print(f"Case : type '{iter_key}' not handled")
+    def _prepare_datetrunc_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
 
-            response = {
-                "cases": cases,
-                "default": default,
-                "type": "case",
-            }
-        elif expression_type == "if":
-            condition = None
-            condition_value = None
+        response = {}
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    condition = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                elif iter_key == "true":
-                    condition_value = self._prepare_expression_result(
-                        iter_expression, source=source
-                    )
-                else:
-                    print(f"IF Condition with '{iter_key}' not handled")
-
-            response = {
-                "condition": condition,
-                "condition_value": condition_value,
-                "type": "if_condition",
-            }
-        elif expression_type == "date":
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this" or iter_key == "expressions":
-                    field = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                    response = {
-                        "field": field,
-                        "type": "date_method",
-                    }
-                else:
-                    print(f"DATE: Expression type {iter_key} not handled yet")
-        elif expression_type == "month":
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    field = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                    response = {
-                        "field": field,
-                        "type": "month_method",
-                    }
-                else:
-                    print(f"MONTH: Expression type {iter_key} not handled yet")
-        elif expression_type == "year":
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    field = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                    response = {
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                field = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+                response.update(
+                    {
                         "field": field,
-                        "type": "year_method",
+                        "type": "datetrunc_method",
                     }
-                else:
-                    print(f"YEAR: Expression type {iter_key} not handled yet")
-        elif expression_type == "week":
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    field = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                    response = {
-                        "field": field,
-                        "type": "week_method",
+                )
+            elif iter_key == "unit":
+                unit = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+                response.update(
+                    {
+                        "unit": unit,
                     }
-                else:
-                    print(f"WEEK: Expression type {iter_key} not handled yet")
-        elif expression_type == "datetrunc":
-            response = {}
+                )
+            else:
+                logger.debug(
+                    "DATE_TRUNC: Expression type %s not handled yet", iter_key
+                )
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    field = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                    response.update(
-                        {
-                            "field": field,
-                            "type": "datetrunc_method",
-                        }
-                    )
-                elif iter_key == "unit":
-                    unit = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                    response.update(
-                        {
-                            "unit": unit,
-                        }
-                    )
-                else:
-                    print(
-                        f"DATE_TRUNC: Expression type {iter_key} not handled "
-                        f"yet"
-                    )
-        elif expression_type == "datesub":
-            left_val = ""
-            right_val = ""
+        return response
 
-            for iter_key, iter_expression in expression.iter_expressions():
-                if iter_key == "this":
-                    left_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-                else:
-                    right_val = self._prepare_expression_result(
-                        iter_expression,
-                        parent_key=expression_type,
-                        source=source,
-                    )
-            response = {
-                "left_val": left_val,
-                "right_val": right_val,
-                "type": "sub_operation",
-                "alias_for": "date_sub",
-            }
-        elif expression_type == "currentdate":
-            response = {"methods": {"CURDATE": []}, "type": "methods"}
-        else:
-            print(f"Expression type {expression_type} not handled yet")
+    def _prepare_datesub_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        expression_type = expression.key
 
-        if not response:
-            print(f"Got Empty response for {expression_type} type")
+        left_val = ""
+        right_val = ""
 
-        # Set cols for aggregations
-        if type(response) is dict:
-            for aggregation in response.get("aggregations", {}):
-                if aggregation.get("alias"):
-                    response.setdefault("columns", [])
-                    response["columns"].append(
-                        aggregation.get("alias")
-                    ) if aggregation["alias"] not in response[
-                        "columns"
-                    ] else None
-
-            for alias_dict in response.get("aliases", {}):
-                if alias_dict.get("field"):
-                    response.setdefault("columns", [])
-                    response["columns"].append(
-                        alias_dict["field"]
-                    ) if alias_dict["field"] not in response[
-                        "columns"
-                    ] else None
+        for iter_key, iter_expression in expression.iter_expressions():
+            if iter_key == "this":
+                left_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+            else:
+                right_val = yield ChildExpression(
+                    iter_expression,
+                    parent_key=expression_type,
+                    source=source,
+                )
+        response = {
+            "left_val": left_val,
+            "right_val": right_val,
+            "type": "sub_operation",
+            "alias_for": "date_sub",
+        }
 
         return response
 
-    @staticmethod
-    def _replace_whole_word(query, old_word, new_word):
-        pattern = r"(?<!`)\b{}\b(?!`)".format(re.escape(old_word))
-        replaced_query = re.sub(pattern, new_word, query)
-        return replaced_query
+    def _prepare_currentdate_expression_result(
+        self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        response = {"methods": {"CURDATE": []}, "type": "methods"}
 
-    def _get_sql_query_with_replacing_field_names(self, sql_query):
-        aliases = []
+        return response
 
-        for item in parse_one(format_sql_query(sql_query)).find_all(exp.Alias):
-            aliases.append(item.output_name)
+    # Node type (expression.key) -> handler building its query data
+    EXPRESSION_RESULT_HANDLERS = {
+        "column": _prepare_column_expression_result,
+        "literal": _prepare_literal_expression_result,
+        "where": _prepare_where_expression_result,
+        "select": _prepare_select_expression_result,
+        "subquery": _prepare_subquery_expression_result,
+        "union": _prepare_union_expression_result,
+        "from": _prepare_from_expression_result,
+        "table": _prepare_table_expression_result,
+        "identifier": _prepare_identifier_expression_result,
+        "between": _prepare_between_expression_result,
+        "in": _prepare_in_expression_result,
+        "anonymous": _prepare_anonymous_expression_result,
+        "eq": _prepare_eq_expression_result,
+        "neq": _prepare_neq_expression_result,
+        "gt": _prepare_gt_expression_result,
+        "lt": _prepare_lt_expression_result,
+        "gte": _prepare_gte_expression_result,
+        "lte": _prepare_lte_expression_result,
+        "and": _prepare_and_expression_result,
+        "or": _prepare_or_expression_result,
+        "not": _prepare_not_expression_result,
+        "neg": _prepare_neg_expression_result,
+        "null": _prepare_null_expression_result,
+        "ordered": _prepare_ordered_expression_result,
+        "order": _prepare_order_expression_result,
+        "group": _prepare_group_expression_result,
+        "limit": _prepare_limit_expression_result,
+        "star": _prepare_star_expression_result,
+        "alias": _prepare_alias_expression_result,
+        "count": _prepare_count_expression_result,
+        "avg": _prepare_avg_expression_result,
+        "sub": _prepare_sub_expression_result,
+        "interval": _prepare_interval_expression_result,
+        "var": _prepare_var_expression_result,
+        "is": _prepare_is_expression_result,
+        "like": _prepare_like_expression_result,
+        "distinct": _prepare_distinct_expression_result,
+        "sum": _prepare_sum_expression_result,
+        "mul": _prepare_mul_expression_result,
+        "div": _prepare_div_expression_result,
+        "paren": _prepare_paren_expression_result,
+        "case": _prepare_case_expression_result,
+        "if": _prepare_if_expression_result,
+        "date": _prepare_date_expression_result,
+        "month": _prepare_month_expression_result,
+        "year": _prepare_year_expression_result,
+        "week": _prepare_week_expression_result,
+        "datetrunc": _prepare_datetrunc_expression_result,
+        "datesub": _prepare_datesub_expression_result,
+        "currentdate": _prepare_currentdate_expression_result,
+    }
 
-        field_names = []
+    @classmethod
+    def register_expression_result_handler(cls, expression_type: str, handler):
+        # handler(self, expression, parent_key=None, parent_field=None,
+        # source=None) -> query data of the node; handlers needing the query
+        # data of child nodes are generators yielding a ChildExpression per
+        # child and returning the query data of the node
+        cls.EXPRESSION_RESULT_HANDLERS = {
+            **cls.EXPRESSION_RESULT_HANDLERS,
+            expression_type: handler,
+        }
 
-        for item in parse_one(format_sql_query(sql_query)).find_all(
-            exp.Column
-        ):
-            field_names.append(item.output_name)
+    def _get_sql_query_with_replacing_field_names(
+        self,
+        sql_query: str,
+        select_expression: exp.Expression,
+        context: ConversionContext,
+    ):
+        with conversion_metrics.time_stage("column_collection"):
+            field_names = [
+                column.output_name
+                for column in select_expression.find_all(exp.Column)
+            ]
 
         #     print("Field_names: ", field_names)
 
         mapped_fields_dict = {}
+        replacements = {}
 
-        for field_name in field_names:
-            #         if field_name in aliases:
-            #             continue
-
-            (
-                mapping_field,
-                mapping_field_type,
-            ) = self._get_field_mapping_if_exists(field_name)
+        with conversion_metrics.time_stage("field_mapping"):
+            for field_name in field_names:
+                #         if field_name in aliases:
+                #             continue
 
-            if mapping_field:
-                mapped_fields_dict.update({mapping_field: field_name})
+                if field_name in replacements:
+                    continue
 
-            if not mapping_field:
-                mapping_field = field_name
+                (
+                    mapping_field,
+                    mapping_field_type,
+                ) = self._get_field_mapping_if_exists(field_name)
 
-            sql_query = (
-                sql_query.replace(f"`{field_name}`", f"{field_name}")
-                .replace(f'"{field_name}"', f"{field_name}")
-                .replace(f"'{field_name}'", f"{field_name}")
-            )
+                if mapping_field:
+                    mapped_fields_dict.update({mapping_field: field_name})
 
-            if mapping_field == field_name:
-                print(f"Mapping field_uuid not found for '{field_name}'")
+                if not mapping_field:
+                    mapping_field = field_name
 
-            if "." in field_name:
-                sql_query = self._replace_whole_word(
-                    query=sql_query,
-                    old_word=field_name,
-                    new_word=f"`{mapping_field}`",
-                )
-            else:
-                sql_query = self._replace_whole_word(
-                    query=sql_query,
-                    old_word=field_name,
-                    new_word=f"{mapping_field}",
-                )
+                if mapping_field == field_name:
+                    logger.debug(
+                        "Mapping field_uuid not found for '%s'", field_name
+                    )
 
-        self.mapped_fields_dict = mapped_fields_dict
+                if "." in field_name:
+                    replacements[field_name] = f"`{mapping_field}`"
+                else:
+                    replacements[field_name] = f"{mapping_field}"
 
-        return sql_query
+        # Quote stripping and whole word replacement of every field happen
+        # in a single scan of the query
+        with conversion_metrics.time_stage("string_rewrite"):
+            sql_query = self.field_name_replacer.replace(
+                sql_query, replacements
+            )
 
-    @staticmethod
-    def _starts_with_any(string, prefixes):
-        response = ""
+        context.mapped_fields_dict = mapped_fields_dict
 
-        for prefix in prefixes:
-            if string.startswith(prefix):
-                response = prefix
-        return response
+        return sql_query
 
     def _get_field_mapping_if_exists(self, field_name):
         # print("Field: ", field_name)
 
-        matched_template = self._starts_with_any(
-            field_name, list(self.field_mappings.keys())
+        matched_template = self.template_prefix_index.get_longest_prefix(
+            field_name
         )
 
         if matched_template:
@@ -1383,18 +2053,11 @@ class SQLQueryConversion:
                 len(matched_template) + 1 :
             ]
 
-            matched_field = (
-                field_name_without_template_name
-                if field_name_without_template_name
-                in self.field_mappings[matched_template]["fields"].keys()
-                else None
-            )
-
-            if matched_field:
-                matched_field_details = self.field_mappings[matched_template][
-                    "fields"
-                ][matched_field]
+            matched_field_details = self.field_mappings[matched_template][
+                "fields"
+            ].get(field_name_without_template_name)
 
+            if matched_field_details:
                 field_uuid = matched_field_details.get("field_id")
 
                 field_type = matched_field_details.get("field_type")
@@ -1405,19 +2068,11 @@ class SQLQueryConversion:
         # print("Not Matched Field: ", field_name)
 
         # Lead Field
-        lead_template_fields = list(
-            self.field_mappings.get("lead", {}).get("fields", {}).keys()
+        matched_field_details = (
+            self.field_mappings.get("lead", {}).get("fields", {}).get(field_name)
         )
 
-        matched_field = (
-            field_name if field_name in lead_template_fields else None
-        )
-
-        if matched_field:
-            matched_field_details = self.field_mappings["lead"]["fields"][
-                matched_field
-            ]
-
+        if matched_field_details:
             field_uuid = matched_field_details.get("field_id")
 
             field_type = matched_field_details.get("field_type")
@@ -1428,119 +2083,118 @@ class SQLQueryConversion:
 
         return None, None
 
-    def _parse_sql_query(self, sql_query: str):
-        select_expression = parse_one(format_sql_query(sql_query))
-        query_data = self._prepare_expression_result(
-            expression=select_expression, source="OPEN_SEARCH_SQL_QUERY"
-        )
-        return query_data
+    def _prepare_query_ir(self, select_expression: exp.Expression):
+        with conversion_metrics.time_stage("ir_build"):
+            query_ir = self._prepare_expression_result(
+                expression=select_expression, source="OPEN_SEARCH_SQL_QUERY"
+            )
+        return query_ir
 
     @staticmethod
-    def _get_alias_config(alias, aliases):
-        matched_alias = None
-
-        for item in aliases:
-            # print("Alias name: ", item.get("alias"))
-            if item.get("alias") and item["alias"] == alias:
-                matched_alias = item
-                break
-        return matched_alias
+    def _get_alias_config(alias, query: QueryNode):
+        return query.get_alias(alias)
 
-    def _get_field_for_given_alias(self, alias: str, aliases: List[Dict]):
-        # print(f"Alias: {aliases}")
-        matched_alias = self._get_alias_config(alias=alias, aliases=aliases)
+    def _get_field_for_given_alias(self, alias: str, query: QueryNode):
+        # print(f"Alias: {query.aliases}")
+        matched_alias = self._get_alias_config(alias=alias, query=query)
 
-        if matched_alias and matched_alias["type"] == "alias_column":
-            return matched_alias["field"]
-        elif matched_alias and matched_alias["type"] == "alias_aggregation":
-            aggregation_dict = matched_alias["aggregation"]
+        if isinstance(matched_alias, AliasColumnNode):
+            return matched_alias.field
+        elif isinstance(matched_alias, AliasAggregationNode):
+            aggregation_dict = matched_alias.aggregation
 
             aggregation_type = aggregation_dict["type"]
 
             if aggregation_type == "count_method":
                 aggregation_field = aggregation_dict["count"]
 
-                if aggregation_field["type"] == "column":
-                    return aggregation_field["field"]
-                elif aggregation_field["type"] == "star":
+                aggregation_field_type = get_node_type(aggregation_field)
+
+                if isinstance(aggregation_field, ColumnNode):
+                    return aggregation_field.field
+                elif aggregation_field_type == "star":
                     return "_id"
                 else:
-                    print(
-                        f"Alias Config Fetch with aggregation type "
-                        f"{aggregation_type} and field_type '"
-                        f"{aggregation_field['type']}' not supported"
+                    logger.debug(
+                        "Alias Config Fetch with aggregation type %s and "
+                        "field_type '%s' not supported",
+                        aggregation_type,
+                        aggregation_field_type,
                     )
             elif aggregation_type == "month_method":
                 aggregation_field = aggregation_dict["field"]
 
-                if aggregation_field["type"] == "column":
-                    return aggregation_field["field"]
-                elif aggregation_field["type"] == "star":
+                aggregation_field_type = get_node_type(aggregation_field)
+
+                if isinstance(aggregation_field, ColumnNode):
+                    return aggregation_field.field
+                elif aggregation_field_type == "star":
                     return "_id"
                 else:
-                    print(
-                        f"Alias Config Fetch with aggregation type "
-                        f"{aggregation_type} and field_type '"
-                        f"{aggregation_field['type']}' not supported"
+                    logger.debug(
+                        "Alias Config Fetch with aggregation type %s and "
+                        "field_type '%s' not supported",
+                        aggregation_type,
+                        aggregation_field_type,
                     )
             elif aggregation_type == "week_method":
                 aggregation_field = aggregation_dict["field"]
 
-                if aggregation_field["type"] == "column":
-                    return aggregation_field["field"]
-                elif aggregation_field["type"] == "star":
+                aggregation_field_type = get_node_type(aggregation_field)
+
+                if isinstance(aggregation_field, ColumnNode):
+                    return aggregation_field.field
+                elif aggregation_field_type == "star":
                     return "_id"
                 else:
-                    print(
-                        f"Alias Config Fetch with aggregation type "
-                        f"{aggregation_type} and field_type '"
-                        f"{aggregation_field['type']}' not supported"
+                    logger.debug(
+                        "Alias Config Fetch with aggregation type %s and "
+                        "field_type '%s' not supported",
+                        aggregation_type,
+                        aggregation_field_type,
                     )
             elif aggregation_type == "datetrunc_method":
                 aggregation_field = aggregation_dict["field"]
 
-                if aggregation_field["type"] == "column":
-                    return aggregation_field["field"]
-                elif aggregation_field["type"] == "star":
+                aggregation_field_type = get_node_type(aggregation_field)
+
+                if isinstance(aggregation_field, ColumnNode):
+                    return aggregation_field.field
+                elif aggregation_field_type == "star":
                     return "_id"
                 else:
-                    print(
-                        f"Alias Config Fetch with aggregation type "
-                        f"{aggregation_type} and field_type '"
-                        f"{aggregation_field['type']}' not supported"
+                    logger.debug(
+                        "Alias Config Fetch with aggregation type %s and "
+                        "field_type '%s' not supported",
+                        aggregation_type,
+                        aggregation_field_type,
                     )
             elif aggregation_type == "date_method":
                 aggregation_field = aggregation_dict["field"]
 
-                if aggregation_field["type"] == "column":
-                    return aggregation_field["field"]
-                elif aggregation_field["type"] == "star":
+                aggregation_field_type = get_node_type(aggregation_field)
+
+                if isinstance(aggregation_field, ColumnNode):
+                    return aggregation_field.field
+                elif aggregation_field_type == "star":
                     return "_id"
                 else:
-                    print(
-                        f"Alias Config Fetch with aggregation type "
-                        f"{aggregation_type} and field_type '"
-                        f"{aggregation_field['type']}' not supported"
+                    logger.debug(
+                        "Alias Config Fetch with aggregation type %s and "
+                        "field_type '%s' not supported",
+                        aggregation_type,
+                        aggregation_field_type,
                     )
 
             else:
-                print(
-                    f"Alias Config Fetch with aggregation type "
-                    f"{aggregation_type} not supported"
+                logger.debug(
+                    "Alias Config Fetch with aggregation type %s not supported",
+                    aggregation_type,
                 )
 
     @staticmethod
-    def _get_alias_for_given_field(field: str, aliases: List[Dict]):
-        matched_alias = None
-
-        for item in aliases:
-            # print("Alias name: ", item.get("alias"))
-            if item.get("field") and item["field"] == field:
-                matched_alias = item
-                break
-
-        if matched_alias and matched_alias["type"] == "alias_column":
-            return matched_alias["alias"]
+    def _get_alias_for_given_field(field: str, query: QueryNode):
+        return query.get_alias_for_field(field)
 
     @staticmethod
     def _update_template_mappings(field_mappings):
@@ -1569,11 +2223,24 @@ class SQLQueryConversion:
         return updated_field_mappings
 
     @classmethod
-    def _fetch_required_data_mappings(cls) -> Tuple[Dict[str, str], List[Dict]]:
-        file_path = "tables.json"
-        with open(file_path, "r") as json_file:
-            data = json.load(json_file)
+    def _fetch_required_data_mappings(
+        cls, source: mapping_compiler.MappingSource
+    ) -> Tuple[Dict[str, str], Dict[str, Dict]]:
+        compiled_mappings = mapping_compiler.load_compiled_mappings(
+            mappings_key=cls.MAPPINGS_ARTIFACT_KEY,
+            artifact_path=mapping_compiler.get_artifact_path(source.path),
+            checksum=source.checksum,
+        )
+        if compiled_mappings:
+            return compiled_mappings
+        return cls._build_required_data_mappings(source.load_tables())
 
+    @classmethod
+    def _build_required_data_mappings(
+        cls, data: List[Dict]
+    ) -> Tuple[Dict[str, str], Dict[str, Dict]]:
+        # _prep_table_data_mapping_json already builds fresh dicts, so the
+        # template mappings can be updated in place without a deepcopy
         table_wise_data_mappings = [
             cls._prep_table_data_mapping_json(table_dict)
             for table_dict in data
@@ -1582,7 +2249,9 @@ class SQLQueryConversion:
             tb_data_mapping["sales_template_name"]: tb_data_mapping["normalized_name"]
             for tb_data_mapping in table_wise_data_mappings
         }
-        return table_mappings, table_wise_data_mappings
+        return table_mappings, cls._update_template_mappings(
+            field_mappings=table_wise_data_mappings
+        )
 
     @classmethod
     def _prep_table_data_mapping_json(cls, table_dict: Dict) -> Dict:
@@ -1592,11 +2261,16 @@ class SQLQueryConversion:
             "sales_template_id": table_dict["sales_template_id"],
             "sales_template_type": table_dict["sales_template_type"],
             "fields": [
-                {
-                    "field_name": field_dict["field_name"],
-                    "normalized_name": field_dict["field_id"],
-                    "field_id": field_dict["field_id"],
-                    "field_type": field_dict["field_type"],
-                } for field_dict in table_dict.get("fields", [])
+                cls._prep_field_mapping_json(field_dict)
+                for field_dict in table_dict.get("fields", [])
             ]
         }
+
+    @staticmethod
+    def _prep_field_mapping_json(field_dict: Dict) -> Dict:
+        return {
+            "field_name": field_dict["field_name"],
+            "normalized_name": field_dict["field_id"],
+            "field_id": field_dict["field_id"],
+            "field_type": field_dict["field_type"],
+        }
@@ -0,0 +1,293 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from big_query_converter import BigQueryConverterInteractor
+from conversion_logging import set_log_stream
+from exceptions import InvalidBatchItem, get_error_details
+from script_converter import (
+    BIG_QUERY_CONVERTER,
+    SQL_QUERY_CONVERSION,
+    get_statement_converter,
+    split_statements,
+)
+
+BULK_CHUNK_SIZE = 32
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+# Converter of the worker, one per rewrite mode; the mappings are loaded once
+# per worker by the pool initializer
+_converter_name = BIG_QUERY_CONVERTER
+_statement_converters: Dict[str, Callable[[str], Dict]] = {}
+
+
+def read_jsonl(path: str) -> Iterator[Dict]:
+    # {"sql_query": ..., "id": (optional), "rewrite_mode": (optional)} per line
+    with open(path, "r") as jsonl_file:
+        for line_number, line in enumerate(jsonl_file, start=1):
+            if not line.strip():
+                continue
+            source = f"{path}:{line_number}"
+            try:
+                item = json.loads(line)
+            except ValueError:
+                yield _get_invalid_item(line_number, line_number, source, "Line is not valid JSON")
+                continue
+            if not isinstance(item, dict):
+                yield _get_invalid_item(line_number, line_number, source, "Line must be an object")
+                continue
+
+            yield _get_item(
+                item_id=item.get("id", line_number),
+                line_number=line_number,
+                source=source,
+                sql_query=item.get("sql_query"),
+                rewrite_mode=item.get("rewrite_mode"),
+            )
+
+
+def read_csv(path: str, query_column: str = "sql_query", id_column: str = "id") -> Iterator[Dict]:
+    # Saved queries easily outgrow the default field size limit of csv
+    csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+    with open(path, "r", newline="") as csv_file:
+        for row_number, row in enumerate(csv.DictReader(csv_file), start=1):
+            yield _get_item(
+                item_id=row.get(id_column) or row_number,
+                line_number=row_number,
+                source=f"{path}:{row_number}",
+                sql_query=row.get(query_column),
+                rewrite_mode=row.get("rewrite_mode") or None,
+            )
+
+
+def _get_item(
+        item_id: Any,
+        line_number: int,
+        source: str,
+        sql_query: Any,
+        rewrite_mode: Any,
+) -> Dict:
+    # A malformed line / row becomes an error result of its own, the rest of
+    # the backlog still converts
+    if not isinstance(sql_query, str):
+        return _get_invalid_item(item_id, line_number, source, "Missing or non-string sql_query")
+    if rewrite_mode is not None and not isinstance(rewrite_mode, str):
+        return _get_invalid_item(item_id, line_number, source, "Non-string rewrite_mode")
+    return {"id": item_id, "sql_query": sql_query, "rewrite_mode": rewrite_mode, "source": source}
+
+
+def _get_invalid_item(item_id: Any, line_number: int, source: str, reason: str) -> Dict:
+    return {
+        "id": item_id,
+        "source": source,
+        "error": get_error_details(InvalidBatchItem(index=line_number, reason=reason)),
+    }
+
+
+def read_sql_directory(path: str) -> Iterator[Dict]:
+    # Every statement of every .sql file under path
+    for directory, directory_names, file_names in os.walk(path):
+        directory_names.sort()
+        for file_name in sorted(file_names):
+            if not file_name.endswith(".sql"):
+                continue
+            file_path = os.path.join(directory, file_name)
+            relative_path = os.path.relpath(file_path, path)
+            with open(file_path, "r") as sql_file:
+                for statement in split_statements(sql_file):
+                    yield {
+                        "id": relative_path if statement.index == 0 else f"{relative_path}#{statement.index}",
+                        "sql_query": statement.sql_query,
+                        "rewrite_mode": None,
+                        "source": f"{file_path}:{statement.line}",
+                    }
+
+
+def read_items(
+        path: str,
+        input_format: Optional[str] = None,
+        query_column: str = "sql_query",
+        id_column: str = "id",
+) -> Iterator[Dict]:
+    if input_format is None:
+        if os.path.isdir(path):
+            input_format = "sql"
+        elif path.endswith(".csv"):
+            input_format = "csv"
+        else:
+            input_format = "jsonl"
+
+    if input_format == "sql":
+        return read_sql_directory(path)
+    if input_format == "csv":
+        return read_csv(path, query_column=query_column, id_column=id_column)
+    return read_jsonl(path)
+
+
+def _init_worker(converter_name: str, rewrite_mode: str):
+    global _converter_name
+
+    # The results are written to stdout
+    set_log_stream(sys.stderr)
+
+    _converter_name = converter_name
+    _statement_converters.clear()
+    _get_converter(rewrite_mode)
+
+
+def _get_converter(rewrite_mode: str) -> Callable[[str], Dict]:
+    convert = _statement_converters.get(rewrite_mode)
+    if convert is None:
+        convert = _statement_converters[rewrite_mode] = get_statement_converter(
+            _converter_name, rewrite_mode
+        )
+    return convert
+
+
+def _convert_chunk(items: List[Dict], rewrite_mode: str) -> List[Dict]:
+    results = []
+    for item in items:
+        result = {"id": item["id"], "source": item["source"]}
+        if "error" in item:
+            result["error"] = item["error"]
+            results.append(result)
+            continue
+        try:
+            result.update(_get_converter(item["rewrite_mode"] or rewrite_mode)(item["sql_query"]))
+        except Exception as e:
+            result["error"] = get_error_details(e)
+        results.append(result)
+    return results
+
+
+def _chunked(items: Iterable[Dict], chunk_size: int) -> Iterator[List[Dict]]:
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def convert_items(
+        items: Iterable[Dict],
+        converter_name: str = BIG_QUERY_CONVERTER,
+        rewrite_mode: str = BigQueryConverterInteractor.STRING_REWRITE_MODE,
+        workers: int = os.cpu_count() or 1,
+        chunk_size: int = BULK_CHUNK_SIZE,
+) -> Iterator[Dict]:
+    # Results in input order. Only a few chunks per worker are in flight, so
+    # the input is read as the results are written, never all at once.
+    chunks = _chunked(items, chunk_size)
+
+    if workers < 2:
+        _init_worker(converter_name, rewrite_mode)
+        for chunk in chunks:
+            yield from _convert_chunk(chunk, rewrite_mode)
+        return
+
+    with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(converter_name, rewrite_mode)
+    ) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_convert_chunk, chunk, rewrite_mode))
+            if len(pending) >= workers * 4:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class ProgressReporter:
+    def __init__(self, stream=sys.stderr, interval: float = PROGRESS_INTERVAL_SECONDS):
+        self.stream = stream
+        self.interval = interval
+        self.started_at = time.monotonic()
+        self._reported_at = self.started_at
+        self.converted = 0
+        self.failed = 0
+
+    def add(self, result: Dict):
+        if "error" in result:
+            self.failed += 1
+        else:
+            self.converted += 1
+
+        now = time.monotonic()
+        if now - self._reported_at >= self.interval:
+            self._reported_at = now
+            self.stream.write(
+                f"{self.converted + self.failed} queries, {self.failed} failed, "
+                f"{self._get_rate(now):.1f} queries/s\n"
+            )
+            self.stream.flush()
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "queries": self.converted + self.failed,
+            "converted": self.converted,
+            "failed": self.failed,
+            "elapsed_seconds": round(now - self.started_at, 3),
+            "queries_per_second": round(self._get_rate(now), 1),
+        }
+
+    def _get_rate(self, now: float) -> float:
+        elapsed = now - self.started_at
+        return (self.converted + self.failed) / elapsed if elapsed else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a backlog of queries (JSONL, CSV or a directory of .sql files) to JSONL"
+    )
+    parser.add_argument("input", help="JSONL / CSV file or directory of .sql files")
+    parser.add_argument("--output", help="Write the results here instead of stdout")
+    parser.add_argument("--format", choices=("jsonl", "csv", "sql"), help="Defaults to the input extension")
+    parser.add_argument("--query-column", default="sql_query", help="CSV column of the queries")
+    parser.add_argument("--id-column", default="id", help="CSV column of the query ids")
+    parser.add_argument("--converter", choices=(BIG_QUERY_CONVERTER, SQL_QUERY_CONVERSION), default=BIG_QUERY_CONVERTER)
+    parser.add_argument(
+        "--rewrite-mode",
+        choices=(BigQueryConverterInteractor.STRING_REWRITE_MODE, BigQueryConverterInteractor.AST_REWRITE_MODE),
+        default=BigQueryConverterInteractor.STRING_REWRITE_MODE,
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    items = read_items(
+        args.input,
+        input_format=args.format,
+        query_column=args.query_column,
+        id_column=args.id_column,
+    )
+
+    progress = ProgressReporter()
+    output_file = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for result in convert_items(
+                items,
+                converter_name=args.converter,
+                rewrite_mode=args.rewrite_mode,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+        ):
+            output_file.write(json.dumps(result) + "\n")
+            progress.add(result)
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    sys.stderr.write(json.dumps(progress.stats()) + "\n")
+
+
+if __name__ == "__main__":
+    main()
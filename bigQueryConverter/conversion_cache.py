@@ -0,0 +1,241 @@
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+_QUERY_TOKEN_PATTERN = re.compile(
+    r"(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<quoted>'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)"
+    r"|(?P<word>\w+)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>.)",
+    re.DOTALL,
+)
+
+
+_WORD_PATTERN = re.compile(r"\w+")
+_QUOTE_CHARACTERS = "'\"`"
+
+# Mapping versions swapped out by a newer one are remembered so conversions
+# still running on them neither flush nor fill the cache
+_MAX_RETIRED_MAPPING_VERSIONS = 64
+
+
+def get_query_fingerprint(sql_query: str) -> str:
+    # Of the exact query text: the converters keep the comments, whitespace
+    # and keyword case of the query in the converted text, so two queries
+    # that differ only in those still get results of their own
+    return hashlib.blake2b(sql_query.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _get_query_tokens(sql_query: str) -> List[str]:
+    # Tokens of the query without comments and whitespace
+    return [
+        match.group(match.lastgroup)
+        for match in _QUERY_TOKEN_PATTERN.finditer(sql_query)
+        if match.lastgroup != "comment" and match.lastgroup != "space"
+    ]
+
+
+def _get_query_identifiers(tokens: List[str]) -> FrozenSet[str]:
+    # Casefolded words of the query; quoted tokens both as a whole and word
+    # by word. Decides whether a mapping change can affect a cached entry.
+    identifiers = set()
+    for token in tokens:
+        if token[0] in _QUOTE_CHARACTERS:
+            text = token[1:-1].casefold()
+            identifiers.add(text)
+            identifiers.update(_WORD_PATTERN.findall(text))
+        elif token[0] == "_" or token[0].isalnum():
+            identifiers.add(token.casefold())
+    return frozenset(identifiers)
+
+
+# The nested query_data dicts take roughly 8 times the length of their repr
+# in memory; close enough to budget the cache without walking every node
+_REPR_SIZE_FACTOR = 8
+
+
+def _estimate_size(value: Any) -> int:
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    try:
+        return len(repr(value)) * _REPR_SIZE_FACTOR
+    except RecursionError:
+        # Nested deeper than repr can go, e.g. the query data of hundreds of
+        # ORed conditions; walk it on an explicit stack instead
+        return _estimate_nested_size(value)
+
+
+def _estimate_nested_size(value: Any) -> int:
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return size
+
+
+class ConversionCache:
+    # Bounded LRU cache of conversion results, keyed by the query fingerprint
+    # and the mapping version the result was converted with.
+    #
+    # Entries are grouped by namespace (converter / rewrite mode); when a
+    # namespace is asked for a new mapping version, e.g. after tables.json
+    # changed and the converter was rebuilt, the entries of its previous
+    # version are dropped. carry_over moves the entries a mapping change can
+    # not affect to the new version instead.
+    #
+    # Cached results are shared between callers and must not be mutated.
+
+    def __init__(self, max_entries: int = 1024, max_memory_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+
+        # key -> (result, size, identifiers of the query)
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[Any, int, FrozenSet[str]]]" = OrderedDict()
+        self._mapping_versions: Dict[str, str] = {}
+        self._retired_mapping_versions: "OrderedDict[str, None]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.carried_over = 0
+
+    def get_or_convert(
+            self,
+            namespace: str,
+            mapping_version: str,
+            sql_query: str,
+            convert: Callable[[], Any],
+    ) -> Any:
+        key = (namespace, mapping_version, get_query_fingerprint(sql_query))
+
+        with self._lock:
+            is_retired = mapping_version in self._retired_mapping_versions
+            if not is_retired and self._mapping_versions.get(namespace) != mapping_version:
+                self._invalidate_namespace(namespace)
+                self._mapping_versions[namespace] = mapping_version
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Converted outside the lock, concurrent misses of the same query
+        # only cost a duplicate conversion
+        result = convert()
+        if not is_retired:
+            self._put(key, result, _get_query_identifiers(_get_query_tokens(sql_query)))
+        return result
+
+    def carry_over(
+            self,
+            previous_version: str,
+            mapping_version: str,
+            is_affected: Optional[Callable[[FrozenSet[str]], bool]] = None,
+    ) -> int:
+        # Moves the namespaces on previous_version to mapping_version. The
+        # entries is_affected rejects are kept for the new version, the
+        # others (all of them without is_affected) are dropped.
+        with self._lock:
+            entries = OrderedDict()
+            carried_over = 0
+            for key, entry in self._entries.items():
+                namespace, version, fingerprint = key
+                if version == previous_version:
+                    if is_affected is None or is_affected(entry[2]):
+                        self._memory_bytes -= entry[1]
+                        self.invalidations += 1
+                        continue
+                    key = (namespace, mapping_version, fingerprint)
+                    carried_over += 1
+                entries[key] = entry
+            self._entries = entries
+
+            for namespace, version in list(self._mapping_versions.items()):
+                if version == previous_version:
+                    self._mapping_versions[namespace] = mapping_version
+
+            # A version can come back, e.g. when tables.json is reverted
+            self._retired_mapping_versions.pop(mapping_version, None)
+            self._retired_mapping_versions[previous_version] = None
+            while len(self._retired_mapping_versions) > _MAX_RETIRED_MAPPING_VERSIONS:
+                self._retired_mapping_versions.popitem(last=False)
+
+            self.carried_over += carried_over
+            return carried_over
+
+    def _put(self, key: Tuple[str, str, str], result: Any, identifiers: FrozenSet[str]):
+        size = _estimate_size(result) + sys.getsizeof(identifiers)
+        if size > self.max_memory_bytes:
+            return
+
+        with self._lock:
+            if self._mapping_versions.get(key[0]) != key[1]:
+                # Converted with mappings that were swapped out meanwhile
+                return
+
+            previous_entry = self._entries.pop(key, None)
+            if previous_entry is not None:
+                self._memory_bytes -= previous_entry[1]
+
+            self._entries[key] = (result, size, identifiers)
+            self._memory_bytes += size
+
+            while self._entries and (
+                    len(self._entries) > self.max_entries
+                    or self._memory_bytes > self.max_memory_bytes
+            ):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._memory_bytes -= evicted_size
+                self.evictions += 1
+
+    def _invalidate_namespace(self, namespace: str):
+        stale_keys = [key for key in self._entries if key[0] == namespace]
+        for key in stale_keys:
+            self._memory_bytes -= self._entries.pop(key)[1]
+        self.invalidations += len(stale_keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._mapping_versions.clear()
+            self._retired_mapping_versions.clear()
+            self._memory_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "carried_over": self.carried_over,
+                "mapping_versions": dict(self._mapping_versions),
+            }
+
+
+conversion_cache = ConversionCache(
+    max_entries=int(os.environ.get("CONVERSION_CACHE_MAX_ENTRIES", 1024)),
+    max_memory_bytes=int(
+        os.environ.get("CONVERSION_CACHE_MAX_MEMORY_BYTES", 64 * 1024 * 1024)
+    ),
+)
@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import random
+import sys
+import time
+from typing import Any, TextIO
+
+LOGGER_NAME = "bigQueryConverter"
+LOG_LEVEL = os.environ.get("CONVERSION_LOG_LEVEL", "INFO").upper()
+# Share of the records below WARNING that are written, warnings, errors and
+# records logged with extra={"unsampled": True} are always written
+LOG_SAMPLE_RATE = float(os.environ.get("CONVERSION_LOG_SAMPLE_RATE", 1.0))
+# Logged queries / payloads longer than this are cut
+MAX_LOGGED_TEXT_LENGTH = int(os.environ.get("CONVERSION_LOG_MAX_TEXT_LENGTH", 2000))
+
+
+class TruncatedText:
+    # Log argument cut to max_length characters; like every log argument it
+    # is only formatted when the record is actually written
+    __slots__ = ("value", "max_length")
+
+    def __init__(self, value: Any, max_length: int = MAX_LOGGED_TEXT_LENGTH):
+        self.value = value
+        self.max_length = max_length
+
+    def __str__(self):
+        text = str(self.value)
+        if len(text) > self.max_length:
+            return f"{text[:self.max_length]}... ({len(text)} chars)"
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.sample_rate >= 1:
+            return True
+        if getattr(record, "unsampled", False):
+            return True
+        return random.random() < self.sample_rate
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line; structured fields are passed with
+    # extra={"fields": {...}}
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": time.strftime(
+                "%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _configure_logger() -> logging.Logger:
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(LOG_LEVEL)
+
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+        logger.addHandler(handler)
+    # The Lambda runtime's root handler would write every record again
+    logger.propagate = False
+    return logger
+
+
+_configure_logger()
+
+
+def set_log_stream(stream: TextIO):
+    # CLIs writing their results to stdout move the log lines out of the way;
+    # handlers added by whoever hosts the converters are left alone
+    for handler in logging.getLogger(LOGGER_NAME).handlers:
+        if isinstance(handler, logging.StreamHandler) and isinstance(handler.formatter, JsonFormatter):
+            handler.setStream(stream)
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
@@ -0,0 +1,164 @@
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from conversion_cache import conversion_cache
+from converter_registry import converter_registry
+from query_shape_cache import query_shape_cache
+from tenant_registry import tenant_registry
+
+# Bucket i of a histogram counts the durations up to
+# BUCKET_BASE_SECONDS * BUCKET_GROWTH ** i, i.e. 1us up to ~4.5 minutes with
+# percentiles estimated within ~19% of the real value
+BUCKET_BASE_SECONDS = 1e-6
+BUCKET_GROWTH = 2 ** 0.25
+BUCKET_COUNT = 112
+PERCENTILES = (50, 95, 99)
+
+# Minimum time between two metric dumps of handler.hello, 0 -> every call
+METRICS_LOG_INTERVAL_SECONDS = float(
+    os.environ.get("CONVERSION_METRICS_LOG_INTERVAL_SECONDS", 60)
+)
+
+
+def _to_ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+class LatencyHistogram:
+    __slots__ = ("bucket_counts", "count", "total_seconds", "max_seconds")
+
+    def __init__(self):
+        self.bucket_counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float):
+        if seconds <= BUCKET_BASE_SECONDS:
+            index = 0
+        else:
+            index = min(
+                math.ceil(math.log(seconds / BUCKET_BASE_SECONDS, BUCKET_GROWTH)),
+                BUCKET_COUNT - 1,
+            )
+        self.bucket_counts[index] += 1
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def get_percentile(self, percentile: float) -> float:
+        # Upper bound of the bucket holding the percentile, never above the
+        # slowest recorded duration
+        if not self.count:
+            return 0.0
+
+        rank = math.ceil(self.count * percentile / 100)
+        seen = 0
+        for index, bucket_count in enumerate(self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(BUCKET_BASE_SECONDS * BUCKET_GROWTH ** index, self.max_seconds)
+        return self.max_seconds
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {
+            "count": self.count,
+            "total_ms": _to_ms(self.total_seconds),
+            "mean_ms": _to_ms(self.total_seconds / self.count if self.count else 0.0),
+        }
+        for percentile in PERCENTILES:
+            summary[f"p{percentile}_ms"] = _to_ms(self.get_percentile(percentile))
+        summary["max_ms"] = _to_ms(self.max_seconds)
+        return summary
+
+
+class ConversionMetrics:
+    # In-process latency histograms of the conversion stages. Stages are
+    # timed around the work itself, so cached conversions only show up in
+    # the cache hit rates, not in the stage latencies.
+
+    def __init__(self):
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._last_logged_at = time.monotonic()
+
+    @contextmanager
+    def time_stage(self, stage: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started_at)
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {
+                stage: histogram.summary()
+                for stage, histogram in self._histograms.items()
+            }
+        return {
+            "stages": stages,
+            "caches": {
+                "conversion": conversion_cache.stats(),
+                "query_shape": query_shape_cache.stats(),
+            },
+            "mapping_versions": converter_registry.get_mapping_versions(),
+            "tenants": tenant_registry.stats(),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def log_snapshot(self, logger: logging.Logger):
+        # One structured line per stage / cache / converter; metric lines
+        # bypass the log sampling
+        for fields in self._get_metric_lines(self.snapshot()):
+            logger.info(
+                "metric %s", fields["metric"], extra={"fields": fields, "unsampled": True}
+            )
+
+    def log_snapshot_if_due(self, logger: logging.Logger):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_logged_at < METRICS_LOG_INTERVAL_SECONDS:
+                return
+            self._last_logged_at = now
+        self.log_snapshot(logger)
+
+    @staticmethod
+    def _get_metric_lines(snapshot: Dict[str, Any]) -> List[Dict[str, Any]]:
+        lines = []
+        for stage, summary in snapshot["stages"].items():
+            lines.append({"metric": "stage_latency", "stage": stage, **summary})
+        for cache, stats in snapshot["caches"].items():
+            lines.append({"metric": "cache", "cache": cache, **stats})
+        for converter, mapping_version in snapshot["mapping_versions"].items():
+            lines.append(
+                {
+                    "metric": "mapping_version",
+                    "converter": converter,
+                    "mapping_version": mapping_version,
+                }
+            )
+        lines.append({"metric": "tenants", **snapshot["tenants"]})
+        return lines
+
+
+conversion_metrics = ConversionMetrics()
+
+
+def get_metrics_snapshot() -> Dict[str, Any]:
+    return conversion_metrics.snapshot()
@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple, Type, TypeVar, Union
+
+import mapping_compiler
+from conversion_logging import get_logger
+from mapping_delta import MappingDelta, MappingDeltaImpact, get_delta_mapping_version
+from query_shape_cache import carry_over_cached
+
+logger = get_logger(__name__)
+
+Converter = TypeVar("Converter")
+
+# How often tables.json is checked for changes, 0 checks it on every call
+MAPPING_CHECK_INTERVAL_SECONDS = float(
+    os.environ.get("CONVERSION_MAPPING_CHECK_INTERVAL_SECONDS", 5)
+)
+
+
+class MappingSnapshot:
+    # One version of tables.json, the deltas applied on top of it and the
+    # converters built from both. The mappings of a snapshot never change: a
+    # modified tables.json or new deltas get a new snapshot, so a conversion
+    # that already holds a converter finishes with the version it started
+    # with. Converters of classes not asked for yet are added on first use,
+    # built from the same source and deltas.
+    __slots__ = ("source", "source_mtime", "version", "deltas", "converters")
+
+    def __init__(
+            self,
+            source: mapping_compiler.MappingSource,
+            source_mtime: Optional[int],
+            version: Optional[str] = None,
+            deltas: Tuple[MappingDelta, ...] = (),
+    ):
+        self.source = source
+        self.source_mtime = source_mtime
+        self.version = version or source.version
+        self.deltas = deltas
+        self.converters: Dict[Type, object] = {}
+
+    def build_converter(self, converter_cls: Type[Converter]) -> Converter:
+        converter = converter_cls.from_source(self.source)
+        if self.deltas:
+            converter = converter.apply_deltas(list(self.deltas), self.version)
+        return converter
+
+
+class ConverterRegistry:
+    # Keeps one converter instance per converter class for the lifetime of
+    # the process, so warm Lambda invocations reuse the already built
+    # table / field mappings instead of re-reading tables.json.
+    #
+    # tables.json is checked for changes at most every check_interval
+    # seconds. A changed file is loaded into a new snapshot on a background
+    # thread while the current one keeps serving, then swapped in; the new
+    # mapping version also invalidates the cached conversions of the old one.
+    # Small schema changes can be applied as deltas instead, see apply_deltas.
+
+    def __init__(
+            self,
+            source_path: str = mapping_compiler.TABLES_JSON_PATH,
+            check_interval: float = MAPPING_CHECK_INTERVAL_SECONDS,
+            scope: str = "",
+    ):
+        self.source_path = source_path
+        self.check_interval = check_interval
+        # Tenant of the mappings, see MappingSource.scope
+        self.scope = scope
+        self._snapshot: Optional[MappingSnapshot] = None
+        self._checked_at = time.monotonic()
+        self._reload_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def get_converter(self, converter_cls: Type[Converter]) -> Converter:
+        snapshot = self.get_snapshot()
+        converter = snapshot.converters.get(converter_cls)
+        if converter is not None:
+            return converter
+
+        with self._lock:
+            converter = snapshot.converters.get(converter_cls)
+            if converter is None:
+                converter = snapshot.build_converter(converter_cls)
+                snapshot.converters[converter_cls] = converter
+        return converter
+
+    def get_snapshot(self) -> MappingSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.reload()
+
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._check_source(snapshot)
+        return snapshot
+
+    def reload(self) -> MappingSnapshot:
+        # Builds the snapshot of tables.json as it is now and swaps it in;
+        # callers keep getting the previous snapshot until it is ready
+        with self._reload_lock:
+            snapshot = self._snapshot
+            # Taken before reading the file: a change made while reading is
+            # picked up again by the next check
+            source_mtime = self._get_source_mtime()
+            source = mapping_compiler.load_source(self.source_path, scope=self.scope)
+
+            if snapshot is not None and source.checksum == snapshot.source.checksum:
+                # Touched or rewritten with the same content, the converters
+                # and cached conversions stay valid
+                snapshot.source_mtime = source_mtime
+                return snapshot
+
+            new_snapshot = MappingSnapshot(source=source, source_mtime=source_mtime)
+            for converter_cls in list(snapshot.converters) if snapshot else []:
+                new_snapshot.converters[converter_cls] = new_snapshot.build_converter(converter_cls)
+
+            if snapshot is not None:
+                carry_over_cached(snapshot.version, new_snapshot.version)
+            self._snapshot = new_snapshot
+            if snapshot is not None:
+                logger.info(
+                    "Mappings reloaded",
+                    extra={
+                        "fields": {
+                            "mapping_version": new_snapshot.version,
+                            "previous_mapping_version": snapshot.version,
+                            "source_path": self.source_path,
+                        },
+                        "unsampled": True,
+                    },
+                )
+            return new_snapshot
+
+    def apply_deltas(self, deltas: Iterable[Union[MappingDelta, Dict]]) -> MappingSnapshot:
+        # Applies schema changes (see MappingDelta) to the current mappings
+        # without reading tables.json again: only the changed tables / fields
+        # are built, and cached conversions of the queries that mention none
+        # of them are kept. tables.json itself is not modified; once it is,
+        # the next reload replaces the deltas. Deltas are checked against the
+        # converters already built, an invalid one changes nothing.
+        deltas = [
+            delta if isinstance(delta, MappingDelta) else MappingDelta.from_dict(delta)
+            for delta in deltas
+        ]
+        self.get_snapshot()
+
+        with self._reload_lock:
+            snapshot = self._snapshot
+            new_snapshot = MappingSnapshot(
+                source=snapshot.source,
+                source_mtime=snapshot.source_mtime,
+                version=get_delta_mapping_version(snapshot.version, deltas),
+                deltas=snapshot.deltas + tuple(deltas),
+            )
+            impact = MappingDeltaImpact()
+            for converter_cls, converter in list(snapshot.converters.items()):
+                new_snapshot.converters[converter_cls] = converter.apply_deltas(
+                    deltas, new_snapshot.version, impact
+                )
+
+            carried_over = carry_over_cached(snapshot.version, new_snapshot.version, impact.affects)
+            self._snapshot = new_snapshot
+            logger.info(
+                "Mapping deltas applied",
+                extra={
+                    "fields": {
+                        "mapping_version": new_snapshot.version,
+                        "previous_mapping_version": snapshot.version,
+                        "source_path": self.source_path,
+                        "deltas": len(deltas),
+                        "cache_entries_carried_over": carried_over,
+                    },
+                    "unsampled": True,
+                },
+            )
+            return new_snapshot
+
+    def get_loaded_snapshot(self) -> Optional[MappingSnapshot]:
+        # Current snapshot, without loading or checking tables.json
+        return self._snapshot
+
+    def get_mapping_versions(self) -> Dict[str, str]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {}
+        return {
+            cls.__name__: getattr(converter, "mapping_version", None)
+            for cls, converter in list(snapshot.converters.items())
+        }
+
+    def clear(self):
+        with self._reload_lock:
+            self._snapshot = None
+
+    def _check_source(self, snapshot: MappingSnapshot):
+        if self._get_source_mtime() == snapshot.source_mtime:
+            return
+
+        with self._lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return
+            self._reload_thread = threading.Thread(
+                target=self._reload_in_background, name="mapping-reload", daemon=True
+            )
+            self._reload_thread.start()
+
+    def _reload_in_background(self):
+        try:
+            self.reload()
+        except Exception:
+            # e.g. a tables.json caught half written; the current snapshot
+            # keeps serving and the next check tries again
+            logger.exception("Reloading the mappings failed")
+
+    def _get_source_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.source_path).st_mtime_ns
+        except OSError:
+            return None
+
+
+converter_registry = ConverterRegistry()
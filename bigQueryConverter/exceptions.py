@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 
 
 class TableNamesMappingNotFound(Exception):
@@ -9,3 +9,39 @@ class TableNamesMappingNotFound(Exception):
 class NoMappingFoundForFieldNames(Exception):
     def __init__(self, field_names: List[str]):
         self.field_names = field_names
+
+
+class UnsupportedRewriteMode(Exception):
+    def __init__(self, rewrite_mode: str):
+        self.rewrite_mode = rewrite_mode
+
+
+class QueryTooDeeplyNested(Exception):
+    def __init__(self, rewrite_mode: str):
+        self.rewrite_mode = rewrite_mode
+
+
+class InvalidBatchItem(Exception):
+    def __init__(self, index: int, reason: str):
+        self.index = index
+        self.reason = reason
+
+
+class InvalidMappingDelta(Exception):
+    def __init__(self, delta: Dict, reason: str):
+        self.delta = delta
+        self.reason = reason
+
+
+class UnknownTenant(Exception):
+    def __init__(self, tenant_id: str):
+        self.tenant_id = tenant_id
+
+
+def get_error_details(e: Exception) -> Dict:
+    # JSON ready description of a failed conversion
+    return {
+        "type": type(e).__name__,
+        "message": str(e),
+        "details": {key: str(value) for key, value in vars(e).items()},
+    }
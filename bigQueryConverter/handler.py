@@ -1,21 +1,63 @@
 import json
 
+from conversion_logging import TruncatedText, get_logger
+from conversion_metrics import conversion_metrics
+from tenant_registry import get_converter_for_tenant
+
+logger = get_logger(__name__)
+
 
 def hello(event, context):
-    print("event:", event)
-    print("context:", context)
+    logger.debug("event: %s", TruncatedText(event))
+    logger.debug("context: %s", TruncatedText(context))
+
+    try:
+        with conversion_metrics.time_stage("request"):
+            return _handle_request(event)
+    finally:
+        conversion_metrics.log_snapshot_if_due(logger)
 
+
+def _handle_request(event):
     from big_query_converter import BigQueryConverterInteractor
 
-    sql_query = event["body"]["sql_query"]
-    util = BigQueryConverterInteractor()
-    updated_query = util.get_converted_sql_query(sql_query=sql_query)
-
-    return {
-        "statusCode": 200,
-        "body": json.dumps(
-            {
-                "updated_query": updated_query,
-            }
+    rewrite_mode = event["body"].get(
+        "rewrite_mode", BigQueryConverterInteractor.STRING_REWRITE_MODE
+    )
+    # Optional, converts with the mappings of tenants/{tenant_id}/
+    tenant_id = event["body"].get("tenant_id")
+
+    # Batch request -> {"queries": [{"id": ..., "sql_query": ...}, ...]}
+    if "queries" in event["body"]:
+        from batch_converter import convert_batch
+
+        results = convert_batch(
+            queries=event["body"]["queries"],
+            rewrite_mode=rewrite_mode,
+            tenant_id=tenant_id,
         )
-    }
+        with conversion_metrics.time_stage("response_serialization"):
+            return {
+                "statusCode": 200,
+                "body": json.dumps(
+                    {
+                        "results": results,
+                    }
+                )
+            }
+
+    sql_query = event["body"]["sql_query"]
+    util = get_converter_for_tenant(BigQueryConverterInteractor, tenant_id)
+    updated_query = util.get_converted_sql_query(
+        sql_query=sql_query, rewrite_mode=rewrite_mode
+    )
+
+    with conversion_metrics.time_stage("response_serialization"):
+        return {
+            "statusCode": 200,
+            "body": json.dumps(
+                {
+                    "updated_query": updated_query,
+                }
+            )
+        }
@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Dict, List
+
+from conversion_metrics import LatencyHistogram
+
+
+async def _send_requests(
+        host: str,
+        port: int,
+        payloads: "itertools.cycle",
+        deadline: float,
+        latency: LatencyHistogram,
+        statuses: Dict[int, int],
+):
+    # One keep-alive connection, requests sent back to back until deadline
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.monotonic() < deadline:
+            body = json.dumps(next(payloads)).encode("utf-8")
+            started_at = time.perf_counter()
+            writer.write(
+                (
+                    f"POST / HTTP/1.1\r\n"
+                    f"Host: {host}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"\r\n"
+                ).encode("latin-1")
+                + body
+            )
+            await writer.drain()
+
+            head = await reader.readuntil(b"\r\n\r\n")
+            status_line, *header_lines = head.decode("latin-1").split("\r\n")
+            headers = dict(
+                (name.strip().lower(), value.strip())
+                for name, _, value in (line.partition(":") for line in header_lines if line)
+            )
+            await reader.readexactly(int(headers.get("content-length", 0)))
+
+            latency.record(time.perf_counter() - started_at)
+            status = int(status_line.split(" ")[1])
+            statuses[status] = statuses.get(status, 0) + 1
+            if headers.get("connection") == "close":
+                break
+    finally:
+        writer.close()
+
+
+async def run_load_test(
+        host: str, port: int, payloads: List[Dict[str, Any]], concurrency: int, duration: float
+) -> Dict[str, Any]:
+    latency = LatencyHistogram()
+    statuses: Dict[int, int] = {}
+    payload_cycle = itertools.cycle(payloads)
+
+    started_at = time.monotonic()
+    await asyncio.gather(
+        *(
+            _send_requests(host, port, payload_cycle, started_at + duration, latency, statuses)
+            for _ in range(concurrency)
+        )
+    )
+    elapsed = time.monotonic() - started_at
+
+    return {
+        "requests": latency.count,
+        "duration_seconds": round(elapsed, 3),
+        "requests_per_second": round(latency.count / elapsed, 1) if elapsed else 0.0,
+        "statuses": statuses,
+        "latency_ms": latency.summary(),
+    }
+
+
+def _load_payloads(queries_path: str) -> List[Dict[str, Any]]:
+    # JSON lines of query_generator.py, or of any {"sql_query": ...} objects
+    with open(queries_path, "r") as queries_file:
+        return [
+            {"sql_query": json.loads(line)["sql_query"]}
+            for line in queries_file
+            if line.strip()
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test a running server.py with keep-alive connections"
+    )
+    parser.add_argument("queries", help="JSON lines file of queries, e.g. from query_generator.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run_load_test(
+            host=args.host,
+            port=args.port,
+            payloads=_load_payloads(args.queries),
+            concurrency=args.concurrency,
+            duration=args.duration,
+        )
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+from copy import deepcopy
+from typing import Any, Dict, List, NamedTuple, Optional
+
+TABLES_JSON_PATH = "tables.json"
+COMPILED_MAPPINGS_PATH = "tables.compiled.pickle"
+
+# Bump whenever the shape of the compiled lookup dicts changes, so artifacts
+# built by an older version of the converters are ignored instead of loaded.
+COMPILED_MAPPINGS_FORMAT_VERSION = 2
+COMPILED_MAPPINGS_PICKLE_PROTOCOL = 4
+
+
+class MappingSource(NamedTuple):
+    # Content of tables.json as read at one point in time; mappings built
+    # from it are always tagged with the checksum of that same content, even
+    # if the file is replaced while they are being built
+    path: str
+    checksum: str
+    content: bytes
+    # Tenant the mappings belong to, "" for the process wide tables.json
+    scope: str = ""
+
+    @property
+    def version(self) -> str:
+        # Mapping version of the converters built from this source; two
+        # tenants with the same tables.json still get their own version, so
+        # their cached conversions are invalidated independently
+        if not self.scope:
+            return self.checksum
+        return hashlib.sha256(f"{self.scope}\n{self.checksum}".encode("utf-8")).hexdigest()
+
+    def get_cache_namespace(self, namespace: str) -> str:
+        return f"{self.scope}/{namespace}" if self.scope else namespace
+
+    def load_tables(self) -> List[Dict]:
+        return json.loads(self.content)
+
+
+def load_source(file_path: str = TABLES_JSON_PATH, scope: str = "") -> MappingSource:
+    with open(file_path, "rb") as source_file:
+        content = source_file.read()
+    return MappingSource(
+        path=file_path,
+        checksum=hashlib.sha256(content).hexdigest(),
+        content=content,
+        scope=scope,
+    )
+
+
+def get_artifact_path(source_path: str) -> str:
+    # Compiled artifact next to its tables.json, e.g. the one of a tenant
+    return os.path.join(os.path.dirname(source_path), COMPILED_MAPPINGS_PATH)
+
+
+def get_source_checksum(file_path: str = TABLES_JSON_PATH) -> str:
+    return load_source(file_path).checksum
+
+
+def load_tables_json(file_path: str = TABLES_JSON_PATH) -> List[Dict]:
+    with open(file_path, "r") as json_file:
+        return json.load(json_file)
+
+
+def compile_mappings(
+        source_path: str = TABLES_JSON_PATH,
+        artifact_path: str = COMPILED_MAPPINGS_PATH,
+) -> Dict[str, Any]:
+    from big_query_converter import BigQueryConverterInteractor
+    from big_query_sql_script import SQLQueryConversion
+
+    source = load_source(source_path)
+    checksum = source.checksum
+    data = source.load_tables()
+
+    artifact = {
+        "format_version": COMPILED_MAPPINGS_FORMAT_VERSION,
+        "checksum": checksum,
+        "mappings": {
+            converter_cls.MAPPINGS_ARTIFACT_KEY:
+                converter_cls._build_required_data_mappings(deepcopy(data))
+            for converter_cls in (BigQueryConverterInteractor, SQLQueryConversion)
+        },
+    }
+
+    # Write to a temporary file first so a concurrently starting converter
+    # never reads a partially written artifact.
+    tmp_artifact_path = f"{artifact_path}.tmp"
+    with open(tmp_artifact_path, "wb") as artifact_file:
+        pickle.dump(
+            artifact, artifact_file, protocol=COMPILED_MAPPINGS_PICKLE_PROTOCOL
+        )
+    os.replace(tmp_artifact_path, artifact_path)
+    return artifact
+
+
+def load_compiled_mappings(
+        mappings_key: str,
+        source_path: str = TABLES_JSON_PATH,
+        artifact_path: str = COMPILED_MAPPINGS_PATH,
+        checksum: Optional[str] = None,
+) -> Optional[Any]:
+    # checksum -> of the tables.json content the caller already read;
+    # otherwise the artifact is checked against source_path as it is now
+    if not os.path.exists(artifact_path):
+        return None
+
+    try:
+        with open(artifact_path, "rb") as artifact_file:
+            artifact = pickle.load(artifact_file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+
+    if artifact.get("format_version") != COMPILED_MAPPINGS_FORMAT_VERSION:
+        return None
+
+    if checksum is not None:
+        if artifact.get("checksum") != checksum:
+            return None
+    elif os.path.exists(source_path) and (
+            artifact.get("checksum") != get_source_checksum(source_path)
+    ):
+        return None
+
+    return artifact["mappings"].get(mappings_key)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile tables.json into a ready to load mappings artifact"
+    )
+    parser.add_argument("--source", default=TABLES_JSON_PATH)
+    parser.add_argument("--output", default=COMPILED_MAPPINGS_PATH)
+    args = parser.parse_args()
+
+    artifact = compile_mappings(source_path=args.source, artifact_path=args.output)
+    print(f"Compiled '{args.source}' -> '{args.output}' (checksum: {artifact['checksum']})")
+
+
+if __name__ == "__main__":
+    main()
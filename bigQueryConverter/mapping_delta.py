@@ -0,0 +1,94 @@
+import hashlib
+import json
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+import exceptions
+
+ADD_TABLE = "add_table"
+RENAME_TABLE = "rename_table"
+REMOVE_TABLE = "remove_table"
+ADD_FIELD = "add_field"
+RENAME_FIELD = "rename_field"
+REMOVE_FIELD = "remove_field"
+
+TABLE_OPERATIONS = (ADD_TABLE, RENAME_TABLE, REMOVE_TABLE)
+FIELD_OPERATIONS = (ADD_FIELD, RENAME_FIELD, REMOVE_FIELD)
+RENAME_OPERATIONS = (RENAME_TABLE, RENAME_FIELD)
+
+
+class MappingDelta(NamedTuple):
+    # One change of tables.json, as a dict:
+    #   {"operation": "add_table", "table": {<tables.json table>}}
+    #   {"operation": "rename_table", "table_name": ..., "new_name": ...}
+    #   {"operation": "remove_table", "table_name": ...}
+    #   {"operation": "add_field", "table_name": ..., "field": {<tables.json field>}}
+    #   {"operation": "rename_field", "table_name": ..., "field_name": ..., "new_name": ...}
+    #   {"operation": "remove_field", "table_name": ..., "field_name": ...}
+    operation: str
+    table_name: str
+    field_name: Optional[str] = None
+    new_name: Optional[str] = None
+    # Table of add_table / field of add_field, in the tables.json format
+    definition: Optional[Dict] = None
+
+    @classmethod
+    def from_dict(cls, delta_dict: Dict) -> "MappingDelta":
+        operation = delta_dict.get("operation")
+        try:
+            if operation == ADD_TABLE:
+                definition = delta_dict["table"]
+                return cls(operation, table_name=definition["Table Name"], definition=definition)
+            if operation == ADD_FIELD:
+                definition = delta_dict["field"]
+                return cls(
+                    operation,
+                    table_name=delta_dict["table_name"],
+                    field_name=definition["field_name"],
+                    definition=definition,
+                )
+            if operation in TABLE_OPERATIONS or operation in FIELD_OPERATIONS:
+                return cls(
+                    operation,
+                    table_name=delta_dict["table_name"],
+                    field_name=delta_dict["field_name"] if operation in FIELD_OPERATIONS else None,
+                    new_name=delta_dict["new_name"] if operation in RENAME_OPERATIONS else None,
+                )
+        except (KeyError, TypeError) as e:
+            raise exceptions.InvalidMappingDelta(delta=delta_dict, reason=f"Missing key {e}")
+        raise exceptions.InvalidMappingDelta(delta=delta_dict, reason="Unknown operation")
+
+    def get_error(self, reason: str) -> exceptions.InvalidMappingDelta:
+        return exceptions.InvalidMappingDelta(delta=self._asdict(), reason=reason)
+
+
+def get_delta_mapping_version(mapping_version: str, deltas: List[MappingDelta]) -> str:
+    # The same deltas applied to the same mapping version always give the
+    # same new version, e.g. on every worker process of the server
+    content = json.dumps([delta._asdict() for delta in deltas], sort_keys=True)
+    return hashlib.sha256(f"{mapping_version}\n{content}".encode("utf-8")).hexdigest()
+
+
+class MappingDeltaImpact:
+    # Identifiers whose mappings changed while applying deltas, filled in by
+    # every converter. A cached conversion of a query that mentions none of
+    # them converts the same with the new mappings and is kept.
+
+    __slots__ = ("names", "prefixes")
+
+    def __init__(self):
+        self.names: Set[str] = set()
+        # Template names, field names may start with them
+        self.prefixes: Set[str] = set()
+
+    def add_names(self, names: Iterable[Optional[str]]):
+        self.names.update(name.casefold() for name in names if name)
+
+    def add_prefixes(self, prefixes: Iterable[Optional[str]]):
+        self.prefixes.update(prefix.casefold() for prefix in prefixes if prefix)
+
+    def affects(self, identifiers: FrozenSet[str]) -> bool:
+        # identifiers -> casefolded identifiers of the query
+        if not self.names.isdisjoint(identifiers):
+            return True
+        prefixes = tuple(self.prefixes)
+        return bool(prefixes) and any(identifier.startswith(prefixes) for identifier in identifiers)
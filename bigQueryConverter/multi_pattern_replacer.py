@@ -0,0 +1,145 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, Optional, Pattern
+
+# Never matches, used when there is nothing to replace
+_EMPTY_PATTERN = re.compile(r"(?P<name>(?!))")
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Narrowed patterns kept per WholeWordsReplacer lineage
+NARROWED_PATTERNS_MAX_ENTRIES = 256
+
+
+def _compile_whole_words(words: Iterable[str], qualified: bool) -> Pattern:
+    # Longest words first, so the alternation settles on the right word
+    # without backtracking through its prefixes
+    words = sorted(set(words), key=len, reverse=True)
+    if not words:
+        return _EMPTY_PATTERN
+
+    # qualified -> the "name" group also captures a "{qualifier}." prefix,
+    # e.g. "l.lead_id", so qualified columns get their own replacement
+    qualifier = r"(?:\w+\.)?" if qualified else ""
+    alternatives = "|".join(re.escape(word) for word in words)
+    return re.compile(r"\b(?P<name>" + qualifier + "(?:" + alternatives + r"))\b(?![a-zA-Z0-9_])")
+
+
+class MultiPatternReplacer:
+    # Rewrites all the names captured by the "name" group of a single
+    # compiled pattern in one left to right scan of the query; the
+    # replacement of every match is a dict lookup.
+
+    def __init__(self, pattern: Pattern):
+        self.pattern = pattern
+
+    @classmethod
+    def for_whole_words(
+            cls, words: Iterable[str], qualified: bool = False
+    ) -> "WholeWordsReplacer":
+        words = frozenset(words)
+        return WholeWordsReplacer(
+            pattern=_compile_whole_words(words, qualified), words=words, qualified=qualified
+        )
+
+    def replace(self, text: str, replacements: Dict[str, str]) -> str:
+        if not replacements:
+            return text
+        return self._replace(self.pattern, text, replacements)
+
+    @staticmethod
+    def _replace(pattern: Pattern, text: str, replacements: Dict[str, str]) -> str:
+        def _replace_match(match):
+            replacement = replacements.get(match.group("name"))
+            return match.group(0) if replacement is None else replacement
+
+        return pattern.sub(_replace_match, text)
+
+
+class _NarrowedPatterns:
+    # Least recently used patterns of WholeWordsReplacer.replace by the words
+    # they match, so a hot query mentioning a changed word compiles its
+    # pattern once, not on every call
+
+    def __init__(self, qualified: bool, max_entries: int = NARROWED_PATTERNS_MAX_ENTRIES):
+        self.qualified = qualified
+        self.max_entries = max_entries
+        self._patterns: "OrderedDict[FrozenSet[str], Pattern]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compile(self, words: FrozenSet[str]) -> Pattern:
+        with self._lock:
+            pattern = self._patterns.get(words)
+            if pattern is not None:
+                self._patterns.move_to_end(words)
+                return pattern
+
+        pattern = _compile_whole_words(words, self.qualified)
+        with self._lock:
+            self._patterns[words] = pattern
+            while len(self._patterns) > self.max_entries:
+                self._patterns.popitem(last=False)
+        return pattern
+
+
+class WholeWordsReplacer(MultiPatternReplacer):
+    # Replacer of for_whole_words. Compiling the alternation of thousands of
+    # names takes longer than building all the mappings, so with_changes
+    # keeps the compiled pattern: texts that mention none of the words added
+    # / removed since it was compiled match the same with it, the others get
+    # a pattern of just the words they mention, compiled once per set of
+    # words.
+
+    def __init__(
+            self,
+            pattern: Pattern,
+            words: FrozenSet[str],
+            qualified: bool,
+            pattern_words: Optional[FrozenSet[str]] = None,
+            other_words: Optional[FrozenSet[str]] = None,
+            narrowed_patterns: Optional[_NarrowedPatterns] = None,
+    ):
+        super().__init__(pattern)
+        self.words = words
+        self.qualified = qualified
+        # Words of the compiled pattern
+        self._pattern_words = words if pattern_words is None else pattern_words
+        self._changed_words = self._pattern_words ^ words
+        # Words that are not a single \w+ token, they can match across tokens
+        self._other_words = frozenset(
+            word for word in words if not _WORD_PATTERN.fullmatch(word)
+        ) if other_words is None else other_words
+        # Shared with the replacers of with_changes: a pattern only depends
+        # on its words, and other_words / qualified stay the same
+        self._narrowed_patterns = narrowed_patterns or _NarrowedPatterns(qualified)
+
+    def with_changes(
+            self, added: Iterable[str] = (), removed: Iterable[str] = ()
+    ) -> "WholeWordsReplacer":
+        added, removed = set(added), set(removed)
+        words = (self.words - removed) | added
+        if not all(_WORD_PATTERN.fullmatch(word) for word in added | removed):
+            return self.for_whole_words(words, qualified=self.qualified)
+
+        return WholeWordsReplacer(
+            pattern=self.pattern,
+            words=words,
+            qualified=self.qualified,
+            pattern_words=self._pattern_words,
+            other_words=self._other_words,
+            narrowed_patterns=self._narrowed_patterns,
+        )
+
+    def replace(self, text: str, replacements: Dict[str, str]) -> str:
+        if not replacements:
+            return text
+
+        pattern = self.pattern
+        if self._changed_words:
+            # A word only ever matches as a whole \w+ token of the text
+            text_words = set(_WORD_PATTERN.findall(text))
+            if not self._changed_words.isdisjoint(text_words):
+                pattern = self._narrowed_patterns.get_or_compile(
+                    frozenset((self.words & text_words) | self._other_words)
+                )
+        return self._replace(pattern, text, replacements)
@@ -0,0 +1,246 @@
+import argparse
+import json
+import random
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import mapping_compiler
+
+DATE_FIELD_TYPES = ("DATE", "DATE_TIME")
+NUMERIC_FIELD_TYPES = ("INTEGER", "FLOAT")
+OPTION_FIELD_TYPES = ("DROPDOWN", "FIELDS_SELECTOR", "MULTI_SELECT")
+
+# Date bucketing expressions, the ones the converters know how to handle
+DATE_BUCKETS = (
+    "MONTH({})",
+    "WEEK({})",
+    "DATE({})",
+    "DATE_TRUNC('month', {})",
+    "DATE_TRUNC('week', {})",
+)
+
+
+def _quote(value: Any) -> str:
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+class QueryGenerator:
+    # Random but realistic queries over the templates of tables.json: real
+    # field names, filters on the real dropdown options, joins along the
+    # fk_config foreign keys, aggregations and date bucketing. The same seed
+    # always generates the same queries.
+
+    def __init__(
+            self,
+            tables: List[Dict],
+            seed: Optional[int] = None,
+            max_columns: int = 6,
+            max_conditions: int = 4,
+            join_probability: float = 0.25,
+            aggregation_probability: float = 0.4,
+            date_bucket_probability: float = 0.3,
+    ):
+        self.tables = [table_dict for table_dict in tables if table_dict.get("fields")]
+        self.tables_by_name = {table_dict["Table Name"]: table_dict for table_dict in self.tables}
+        self.random = random.Random(seed)
+        self.max_columns = max_columns
+        self.max_conditions = max_conditions
+        self.join_probability = join_probability
+        self.aggregation_probability = aggregation_probability
+        self.date_bucket_probability = date_bucket_probability
+
+    def generate_many(self, count: int) -> Iterator[Dict[str, Any]]:
+        for index in range(count):
+            yield {"id": index, **self.generate()}
+
+    def generate(self) -> Dict[str, Any]:
+        table_dict = self.random.choice(self.tables)
+        features = []
+
+        # (alias, template) of every table of the query; aliases are only
+        # used, and columns only qualified, once the query has a join
+        sources = [(None, table_dict)]
+        from_clause = table_dict["Table Name"]
+        join = self._get_join(table_dict)
+        if join:
+            fk_field, fk_table_dict = join
+            sources = [("t0", table_dict), ("t1", fk_table_dict)]
+            from_clause = (
+                f"{table_dict['Table Name']} AS t0 JOIN {fk_table_dict['Table Name']} AS t1"
+                f" ON t0.{fk_field['field_name']} = t1.{fk_field['fk_config']['field_name']}"
+            )
+            features.append("join")
+
+        select_items, group_by, order_by = self._get_projection(sources, features)
+
+        sql_query = f"SELECT {', '.join(select_items)} FROM {from_clause}"
+
+        conditions = self._get_conditions(sources)
+        if conditions:
+            sql_query += f" WHERE {conditions}"
+            features.append("filter")
+        if group_by:
+            sql_query += f" GROUP BY {', '.join(group_by)}"
+        if order_by:
+            sql_query += f" ORDER BY {order_by}"
+        if self.random.random() < 0.5:
+            sql_query += f" LIMIT {self.random.choice((10, 50, 100, 1000))}"
+            features.append("limit")
+
+        return {
+            "sql_query": sql_query,
+            "table": table_dict["Table Name"],
+            "features": features,
+        }
+
+    def _get_join(self, table_dict: Dict) -> Optional[Tuple[Dict, Dict]]:
+        if self.random.random() >= self.join_probability:
+            return None
+        fk_fields = [
+            field_dict for field_dict in table_dict["fields"]
+            if field_dict.get("fk_config")
+            and field_dict["fk_config"].get("table_name") in self.tables_by_name
+        ]
+        if not fk_fields:
+            return None
+        fk_field = self.random.choice(fk_fields)
+        return fk_field, self.tables_by_name[fk_field["fk_config"]["table_name"]]
+
+    def _get_projection(
+            self, sources: List[Tuple[Optional[str], Dict]], features: List[str]
+    ) -> Tuple[List[str], List[str], Optional[str]]:
+        columns = self._get_columns(sources, self.random.randint(1, self.max_columns))
+
+        date_bucket = None
+        date_columns = self._get_columns(sources, 1, field_types=DATE_FIELD_TYPES)
+        if date_columns and self.random.random() < self.date_bucket_probability:
+            date_bucket = self.random.choice(DATE_BUCKETS).format(date_columns[0])
+            features.append("date_bucket")
+
+        if self.random.random() >= self.aggregation_probability:
+            select_items = list(columns)
+            if date_bucket:
+                select_items.append(f"{date_bucket} AS bucket")
+            order_by = self.random.choice(columns) if self.random.random() < 0.3 else None
+            return select_items, [], order_by
+
+        # Grouped by a couple of (preferably dropdown) columns and the date
+        # bucket, every other column aggregated
+        features.append("aggregation")
+        group_by = self._get_columns(
+            sources, self.random.randint(1, 2), field_types=OPTION_FIELD_TYPES
+        ) or columns[:1]
+        select_items = list(group_by)
+        if date_bucket:
+            select_items.append(f"{date_bucket} AS bucket")
+            group_by = group_by + ["bucket"]
+
+        select_items.append("COUNT(*) AS total")
+        aggregations = [f"COUNT(DISTINCT {column})" for column in columns[:1]]
+        aggregations.extend(
+            f"{self.random.choice(('AVG', 'SUM'))}({column})"
+            for column in self._get_columns(sources, 2, field_types=NUMERIC_FIELD_TYPES)
+        )
+        select_items.extend(
+            f"{aggregation} AS aggregation_{index}"
+            for index, aggregation in enumerate(aggregations)
+        )
+        order_by = "total DESC" if self.random.random() < 0.5 else None
+        return select_items, group_by, order_by
+
+    def _get_conditions(self, sources: List[Tuple[Optional[str], Dict]]) -> str:
+        condition_count = self.random.randint(0, self.max_conditions)
+        conditions = []
+        for _ in range(condition_count):
+            alias, table_dict = self.random.choice(sources)
+            field_dict = self.random.choice(table_dict["fields"])
+            conditions.append(self._get_condition(self._get_column(alias, field_dict), field_dict))
+
+        if len(conditions) > 2 and self.random.random() < 0.3:
+            # Part of the conditions OR-ed together
+            conditions[:2] = [f"({conditions[0]} OR {conditions[1]})"]
+        return " AND ".join(conditions)
+
+    def _get_condition(self, column: str, field_dict: Dict) -> str:
+        field_type = field_dict["field_type"]
+        options = field_dict.get("options") or []
+
+        if options:
+            if len(options) > 2 and self.random.random() < 0.4:
+                values = self.random.sample(options, self.random.randint(2, min(4, len(options))))
+                return f"{column} IN ({', '.join(_quote(value) for value in values)})"
+            operator = "=" if self.random.random() < 0.8 else "<>"
+            return f"{column} {operator} {_quote(self.random.choice(options))}"
+
+        if field_type in DATE_FIELD_TYPES:
+            if self.random.random() < 0.5:
+                days = self.random.choice((7, 30, 90, 365))
+                return f"{column} >= DATE_SUB(CURRENT_DATE(), INTERVAL {days} DAY)"
+            month = self.random.randint(1, 6)
+            return f"{column} BETWEEN '2023-{month:02d}-01' AND '2023-{month + 6:02d}-01'"
+
+        if field_type in NUMERIC_FIELD_TYPES:
+            operator = self.random.choice((">", ">=", "<", "<="))
+            return f"{column} {operator} {self.random.randint(0, 1000)}"
+
+        if self.random.random() < 0.5:
+            return f"{column} IS NOT NULL"
+        return f"{column} LIKE {_quote(self.random.choice('abcdefghij') + '%')}"
+
+    def _get_columns(
+            self,
+            sources: List[Tuple[Optional[str], Dict]],
+            count: int,
+            field_types: Optional[Tuple[str, ...]] = None,
+    ) -> List[str]:
+        candidates = [
+            self._get_column(alias, field_dict)
+            for alias, table_dict in sources
+            for field_dict in table_dict["fields"]
+            if field_types is None or field_dict["field_type"] in field_types
+        ]
+        return self.random.sample(candidates, min(count, len(candidates)))
+
+    @staticmethod
+    def _get_column(alias: Optional[str], field_dict: Dict) -> str:
+        if alias:
+            return f"{alias}.{field_dict['field_name']}"
+        return field_dict["field_name"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate random queries over the tables.json templates, one JSON object per line"
+    )
+    parser.add_argument("--source", default=mapping_compiler.TABLES_JSON_PATH)
+    parser.add_argument("--output", help="Write the queries here instead of stdout")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--max-columns", type=int, default=6)
+    parser.add_argument("--max-conditions", type=int, default=4)
+    parser.add_argument("--join-probability", type=float, default=0.25)
+    parser.add_argument("--aggregation-probability", type=float, default=0.4)
+    parser.add_argument("--date-bucket-probability", type=float, default=0.3)
+    args = parser.parse_args()
+
+    generator = QueryGenerator(
+        tables=mapping_compiler.load_tables_json(args.source),
+        seed=args.seed,
+        max_columns=args.max_columns,
+        max_conditions=args.max_conditions,
+        join_probability=args.join_probability,
+        aggregation_probability=args.aggregation_probability,
+        date_bucket_probability=args.date_bucket_probability,
+    )
+
+    output_file = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for query in generator.generate_many(args.count):
+            output_file.write(json.dumps(query) + "\n")
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class NodeKind(str, Enum):
+    QUERY = "query"
+    COLUMN = "column"
+    LITERAL = "literal"
+    EQ_CONDITION = "eq_condition"
+    NEQ_CONDITION = "neq_condition"
+    GT_CONDITION = "gt_condition"
+    LT_CONDITION = "lt_condition"
+    GTE_CONDITION = "gte_condition"
+    LTE_CONDITION = "lte_condition"
+    AND_CONDITION = "and_condition"
+    OR_CONDITION = "or_condition"
+    IN_CONDITION = "in_condition"
+    ALIAS = "alias"
+    ALIAS_COLUMN = "alias_column"
+    ALIAS_AGGREGATION = "alias_aggregation"
+
+
+class Node(ABC):
+    # Typed query_data node. The most frequent node types of the query data
+    # are nodes, the rare ones stay plain dicts; to_dict() gives the query
+    # data of the node exactly as the nested dicts used to look.
+    __slots__ = ()
+
+    kind: NodeKind
+
+    @property
+    def type_name(self) -> str:
+        # "type" of the node in its query data
+        return self.kind.value
+
+    @abstractmethod
+    def _items(self) -> List[Tuple[str, Any]]:
+        # (key, value) pairs of the query data of the node, in its key order
+        pass
+
+    def to_dict(self) -> Dict:
+        return to_query_data(self)
+
+    def __repr__(self):
+        items = ", ".join(f"{key}={value!r}" for key, value in self._items())
+        return f"{type(self).__name__}({items})"
+
+
+class ColumnNode(Node):
+    __slots__ = ("field",)
+
+    kind = NodeKind.COLUMN
+
+    def __init__(self, field: str):
+        self.field = field
+
+    def _items(self):
+        return [("field", self.field), ("type", self.type_name)]
+
+
+class LiteralNode(Node):
+    __slots__ = ("value",)
+
+    kind = NodeKind.LITERAL
+
+    def __init__(self, value: str):
+        self.value = value
+
+    def _items(self):
+        return [("value", self.value), ("type", self.type_name)]
+
+
+class ComparisonNode(Node):
+    __slots__ = ("kind", "field", "value")
+
+    def __init__(self, kind: NodeKind, field: Any, value: Any):
+        self.kind = kind
+        self.field = field
+        self.value = value
+
+    def _items(self):
+        return [
+            ("field", self.field),
+            ("value", self.value),
+            ("type", self.type_name),
+        ]
+
+
+class ConditionalNode(Node):
+    # AND / OR of the conditions in items
+    __slots__ = ("kind", "items")
+
+    ITEMS_KEYS = {
+        NodeKind.AND_CONDITION: "conditional_and",
+        NodeKind.OR_CONDITION: "conditional_or",
+    }
+
+    def __init__(self, kind: NodeKind, items: List[Any]):
+        self.kind = kind
+        self.items = items
+
+    def _items(self):
+        return [(self.ITEMS_KEYS[self.kind], self.items), ("type", self.type_name)]
+
+
+class InConditionNode(Node):
+    __slots__ = ("field", "values_list")
+
+    kind = NodeKind.IN_CONDITION
+
+    def __init__(self, field: Any, values_list: List[Any]):
+        self.field = field
+        self.values_list = values_list
+
+    def _items(self):
+        items = [("type", self.type_name), ("field", self.field)]
+        if self.values_list:
+            items.append(("values_list", self.values_list))
+        return items
+
+
+class AliasNode(Node):
+    # "<alias_expression> AS <alias>" as found in the query, the select
+    # resolves it into an AliasColumnNode or an AliasAggregationNode
+    __slots__ = ("alias_expression", "alias")
+
+    kind = NodeKind.ALIAS
+
+    def __init__(self, alias_expression: Any, alias: str):
+        self.alias_expression = alias_expression
+        self.alias = alias
+
+    @property
+    def type_name(self) -> str:
+        return NodeKind.ALIAS_COLUMN.value
+
+    def _items(self):
+        return [
+            ("alias_expression", self.alias_expression),
+            ("alias", self.alias),
+            ("type", self.type_name),
+        ]
+
+
+class AliasColumnNode(Node):
+    __slots__ = ("alias", "field")
+
+    kind = NodeKind.ALIAS_COLUMN
+
+    def __init__(self, alias: str, field: str):
+        self.alias = alias
+        self.field = field
+
+    def _items(self):
+        return [
+            ("type", self.type_name),
+            ("alias", self.alias),
+            ("field", self.field),
+        ]
+
+
+class AliasAggregationNode(Node):
+    __slots__ = ("alias", "aggregation", "aggregation_type")
+
+    kind = NodeKind.ALIAS_AGGREGATION
+
+    def __init__(
+            self, alias: str, aggregation: Dict, aggregation_type: Optional[str] = None
+    ):
+        self.alias = alias
+        self.aggregation = aggregation
+        self.aggregation_type = aggregation_type
+
+    def _items(self):
+        items = [("aggregation", self.aggregation)]
+        if self.aggregation_type is not None:
+            items.append(("aggregation_type", self.aggregation_type))
+        items.extend([("alias", self.alias), ("type", self.type_name)])
+        return items
+
+
+class QueryNode(Node):
+    # Query data of a SELECT. Parts the query does not have are None and left
+    # out of its query data.
+    __slots__ = (
+        "table_name",
+        "conditions",
+        "limit",
+        "order_by",
+        "group_by_fields",
+        "columns",
+        "aliases",
+        "aggregations",
+        "unions",
+        "part_order",
+        "alias_index",
+        "field_alias_index",
+    )
+
+    kind = NodeKind.QUERY
+
+    def __init__(self):
+        self.table_name = None
+        self.conditions = None
+        self.limit = None
+        self.order_by = None
+        self.group_by_fields = None
+        self.columns: Optional[List[str]] = None
+        self.aliases: Optional[List[Node]] = None
+        self.aggregations: Optional[List[Dict]] = None
+        self.unions: Optional[List[Any]] = None
+        # table_name / conditions / limit / order_by in the order the select
+        # has them, which is their key order in the query data
+        self.part_order: List[str] = []
+
+        # alias -> its alias node, field -> the alias of the field
+        self.alias_index: Dict[str, Node] = {}
+        self.field_alias_index: Dict[str, str] = {}
+
+    def set_part(self, key: str, value: Any):
+        if key not in self.part_order:
+            self.part_order.append(key)
+        setattr(self, key, value)
+
+    def add_alias(self, alias_node: Node):
+        if self.aliases is None:
+            self.aliases = []
+        self.aliases.append(alias_node)
+
+        # First alias wins, as in a scan of the aliases in select order
+        if alias_node.alias:
+            self.alias_index.setdefault(alias_node.alias, alias_node)
+        if isinstance(alias_node, AliasColumnNode) and alias_node.field:
+            self.field_alias_index.setdefault(alias_node.field, alias_node.alias)
+
+    def get_alias(self, alias: str) -> Optional[Node]:
+        return self.alias_index.get(alias)
+
+    def get_alias_for_field(self, field: str) -> Optional[str]:
+        return self.field_alias_index.get(field)
+
+    def add_union(self, query_data: Any):
+        if self.unions is None:
+            self.unions = []
+        self.unions.append(query_data)
+
+    def _items(self):
+        items = []
+        for key in self.part_order:
+            value = getattr(self, key)
+            if value is None:
+                continue
+            if key == "limit":
+                # The select takes over the whole limit query data, "type"
+                # included
+                items.extend([("limit", value), ("type", "limit")])
+            else:
+                items.append((key, value))
+
+        for key, value in (
+                ("order_by", self.order_by),
+                ("group_by_fields", self.group_by_fields),
+                ("columns", self.columns),
+                ("aliases", self.aliases),
+                ("aggregations", self.aggregations),
+                ("unions", self.unions),
+        ):
+            if value is not None:
+                items.append((key, value))
+        return items
+
+
+def get_node_type(query_data: Any) -> Optional[str]:
+    if isinstance(query_data, Node):
+        return query_data.type_name
+    if isinstance(query_data, dict):
+        return query_data.get("type")
+    return None
+
+
+def to_query_data(value: Any) -> Any:
+    # Nested dicts / lists of value with every node replaced by its query
+    # data; walks an explicit stack, the query data nests as deep as the query
+    root = [value]
+    stack = [(root, 0)]
+
+    while stack:
+        container, key = stack.pop()
+        item = container[key]
+        if isinstance(item, Node):
+            item = container[key] = dict(item._items())
+        elif isinstance(item, dict):
+            item = container[key] = dict(item)
+        elif isinstance(item, list):
+            item = container[key] = list(item)
+        else:
+            continue
+
+        if isinstance(item, dict):
+            stack.extend((item, item_key) for item_key in item)
+        else:
+            stack.extend((item, index) for index in range(len(item)))
+
+    return root[0]
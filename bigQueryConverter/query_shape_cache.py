@@ -0,0 +1,271 @@
+import re
+import threading
+from typing import Any, Callable, FrozenSet, Iterator, List, Optional, Tuple
+
+from conversion_cache import ConversionCache, conversion_cache
+
+# String literals are swapped for '__bqc_literal_{index}__' and numbers for
+# 918273{index:06d}, so the placeholder query still parses the same way.
+STRING_PLACEHOLDER = "__bqc_literal_{index}__"
+NUMBER_PLACEHOLDER = "918273{index:06d}"
+
+_LITERAL_TOKEN_PATTERN = re.compile(
+    r"(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<string>'(?:[^'\\]|\\.|'')*')"
+    r"|(?P<identifier>\"[^\"]*\"|`[^`]*`)"
+    r"|(?P<word>\w+)",
+    re.DOTALL,
+)
+_WORD_PATTERN = re.compile(r"\w+")
+_PLACEHOLDER_PATTERN = re.compile(
+    r"'__bqc_literal_(?P<quoted>\d+)__'"
+    r"|__bqc_literal_(?P<bare>\d+)__"
+    r"|\b918273(?P<number>\d{6})\b"
+)
+_LEFTOVER_PLACEHOLDER_PATTERN = re.compile(
+    r"__bqc_literal_\d+__|\b918273\d{6}\b", re.IGNORECASE
+)
+
+# Template stored for shapes whose literals can not be re-bound (a literal
+# was transformed or dropped by the conversion); they are converted directly.
+_UNSHAPEABLE = "__bqc_unshapeable__"
+
+
+class Literal:
+    __slots__ = ("sql_text", "value")
+
+    def __init__(self, sql_text: str, value: str):
+        # sql_text as written in the query, value as it shows up in query_data
+        self.sql_text = sql_text
+        self.value = value
+
+
+def parametrize_query(sql_query: str) -> Optional[Tuple[str, List[Literal]]]:
+    literals: List[Literal] = []
+    parts: List[str] = []
+    position = 0
+    # Casefolded words of the identifiers / of the string literals
+    identifier_words = set()
+    literal_words = set()
+
+    for match in _LITERAL_TOKEN_PATTERN.finditer(sql_query):
+        kind = match.lastgroup
+        token = match.group(kind)
+
+        if kind == "identifier" or (kind == "word" and not token.isdigit()):
+            identifier_words.update(word.casefold() for word in _WORD_PATTERN.findall(token))
+            continue
+
+        if kind == "string":
+            value = token[1:-1]
+            # Escaped quotes are kept in the shape, their value in query_data
+            # depends on the dialect's unescaping rules
+            if "\\" in value or "''" in value:
+                continue
+            literal_words.update(word.casefold() for word in _WORD_PATTERN.findall(value))
+            placeholder = f"'{STRING_PLACEHOLDER.format(index=len(literals))}'"
+        elif kind == "word" and token.isascii() and token.isdigit():
+            value = token
+            placeholder = NUMBER_PLACEHOLDER.format(index=len(literals))
+        else:
+            continue
+
+        parts.append(sql_query[position:match.start()])
+        parts.append(placeholder)
+        literals.append(Literal(sql_text=token, value=value))
+        position = match.end()
+
+    if not literals or _LEFTOVER_PLACEHOLDER_PATTERN.search(sql_query):
+        return None
+    # The text rewrites of the converters replace the field / table names of
+    # the query inside string literals too, e.g. 'lead_id' in
+    # "WHERE id = 'lead_id'"; a placeholder would hide such a literal from
+    # them, so these queries are only cached by their exact text
+    if not identifier_words.isdisjoint(literal_words):
+        return None
+
+    parts.append(sql_query[position:])
+    return "".join(parts), literals
+
+
+def bind_literals(template: Any, literals: List[Literal]) -> Any:
+    def _replace_placeholder(match):
+        if match.group("quoted") is not None:
+            return literals[int(match.group("quoted"))].sql_text
+        if match.group("bare") is not None:
+            return literals[int(match.group("bare"))].value
+        return literals[int(match.group("number"))].sql_text
+
+    return _map_strings(
+        template, lambda value: _PLACEHOLDER_PATTERN.sub(_replace_placeholder, value)
+    )
+
+
+# The nested dicts / lists of query_data follow the nesting of the query, the
+# walks below use an explicit stack so deeply nested queries can not hit the
+# recursion limit
+
+
+def _iter_strings(value: Any) -> Iterator[str]:
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            yield item
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+
+
+def _map_strings(value: Any, map_string: Callable[[str], str]) -> Any:
+    # Copy of value with map_string applied to every nested string
+    root = [value]
+    stack = [(root, 0)]
+    tuples = []
+
+    while stack:
+        container, key = stack.pop()
+        item = container[key]
+        if isinstance(item, str):
+            container[key] = map_string(item)
+        elif isinstance(item, dict):
+            item = container[key] = dict(item)
+            stack.extend((item, item_key) for item_key in item)
+        elif isinstance(item, (list, tuple)):
+            if isinstance(item, tuple):
+                tuples.append((container, key))
+            item = container[key] = list(item)
+            stack.extend((item, index) for index in range(len(item)))
+
+    # Inner tuples were found after their outer ones, freeze them first
+    for container, key in reversed(tuples):
+        container[key] = tuple(container[key])
+    return root[0]
+
+
+def _find_placeholder_indexes(value: Any, indexes: set):
+    for string in _iter_strings(value):
+        for match in _PLACEHOLDER_PATTERN.finditer(string):
+            index = match.group("quoted") or match.group("bare") or match.group("number")
+            indexes.add(int(index))
+
+
+def _has_leftover_placeholders(value: Any) -> bool:
+    return any(
+        _LEFTOVER_PLACEHOLDER_PATTERN.search(string)
+        for string in _iter_strings(value)
+    )
+
+
+class QueryShapeCache:
+    # Caches one converted template per query shape, i.e. the query with its
+    # string and number literals swapped for placeholders. A hit only re-binds
+    # the literals of the incoming query into the cached template.
+
+    def __init__(self, templates: ConversionCache):
+        self.templates = templates
+        self.rebinds = 0
+        self.unshapeable = 0
+        self._lock = threading.Lock()
+
+    def get_or_convert(
+            self,
+            namespace: str,
+            mapping_version: str,
+            sql_query: str,
+            convert: Callable[[str], Any],
+    ) -> Any:
+        parametrized_query = parametrize_query(sql_query)
+        if parametrized_query is None:
+            return convert(sql_query)
+
+        shape_query, literals = parametrized_query
+        template = self.templates.get_or_convert(
+            namespace=namespace,
+            mapping_version=mapping_version,
+            sql_query=shape_query,
+            convert=lambda: self._build_template(
+                shape_query=shape_query,
+                literals_count=len(literals),
+                convert=convert,
+            ),
+        )
+
+        if template == _UNSHAPEABLE:
+            with self._lock:
+                self.unshapeable += 1
+            return convert(sql_query)
+
+        with self._lock:
+            self.rebinds += 1
+        return bind_literals(template, literals)
+
+    @staticmethod
+    def _build_template(
+            shape_query: str, literals_count: int, convert: Callable[[str], Any]
+    ) -> Any:
+        try:
+            template = convert(shape_query)
+        except Exception:
+            return _UNSHAPEABLE
+
+        # Every literal must come out of the conversion untouched, else it
+        # can not be re-bound for another query of the same shape
+        indexes = set()
+        _find_placeholder_indexes(template, indexes)
+        if indexes != set(range(literals_count)):
+            return _UNSHAPEABLE
+
+        if _has_leftover_placeholders(bind_literals(template, [
+            Literal(sql_text="", value="") for _ in range(literals_count)
+        ])):
+            return _UNSHAPEABLE
+        return template
+
+    def stats(self):
+        stats = self.templates.stats()
+        with self._lock:
+            stats.update({"rebinds": self.rebinds, "unshapeable": self.unshapeable})
+        return stats
+
+
+query_shape_cache = QueryShapeCache(
+    templates=ConversionCache(
+        max_entries=conversion_cache.max_entries,
+        max_memory_bytes=conversion_cache.max_memory_bytes,
+    )
+)
+
+
+def get_or_convert_cached(
+        namespace: str,
+        mapping_version: str,
+        sql_query: str,
+        convert: Callable[[str], Any],
+) -> Any:
+    # Exact query text first, then the query shape
+    return conversion_cache.get_or_convert(
+        namespace=namespace,
+        mapping_version=mapping_version,
+        sql_query=sql_query,
+        convert=lambda: query_shape_cache.get_or_convert(
+            namespace=namespace,
+            mapping_version=mapping_version,
+            sql_query=sql_query,
+            convert=convert,
+        ),
+    )
+
+
+def carry_over_cached(
+        previous_version: str,
+        mapping_version: str,
+        is_affected: Optional[Callable[[FrozenSet[str]], bool]] = None,
+) -> int:
+    # Both cache levels of get_or_convert_cached
+    return conversion_cache.carry_over(
+        previous_version, mapping_version, is_affected
+    ) + query_shape_cache.templates.carry_over(
+        previous_version, mapping_version, is_affected
+    )
@@ -0,0 +1,231 @@
+import argparse
+import json
+import re
+import sys
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Union
+
+from big_query_converter import BigQueryConverterInteractor
+from conversion_logging import set_log_stream
+from converter_registry import converter_registry
+from exceptions import get_error_details
+
+SCRIPT_CHUNK_SIZE = 64 * 1024
+
+BIG_QUERY_CONVERTER = "big_query_converter"
+SQL_QUERY_CONVERSION = "sql_query_conversion"
+
+# Next character that changes the scanner state, per state. Outside of quotes
+# and comments: a statement end, an opening quote or a comment start.
+_STATE_PATTERNS = {
+    None: re.compile(r"[;'\"`]|--|#|/\*"),
+    "'": re.compile(r"\\.|'", re.DOTALL),
+    '"': re.compile(r'\\.|"', re.DOTALL),
+    "`": re.compile(r"`"),
+    "--": re.compile(r"\n"),
+    "/*": re.compile(r"\*/"),
+}
+_CLOSING_TOKENS = {"'": "'", '"': '"', "`": "`", "--": "\n", "/*": "*/"}
+_NON_SPACE_PATTERN = re.compile(r"\S")
+
+
+class ScriptStatement(NamedTuple):
+    index: int
+    # Line of the script the statement starts on, 1 based
+    line: int
+    sql_query: str
+
+
+class StatementSplitter:
+    # Splits a SQL script fed in chunks of any size into its statements.
+    # Semicolons inside quotes, backticks and comments do not end a
+    # statement; only the text of the current statement is kept in memory.
+
+    def __init__(self):
+        self._buffer = ""
+        # Start of the current statement in the buffer
+        self._start = 0
+        # Scanned up to here, the next feed continues from it
+        self._position = 0
+        self._state: Optional[str] = None
+        self._has_content = False
+        self._line = 1
+        self._index = 0
+
+    def feed(self, chunk: str) -> List[ScriptStatement]:
+        self._buffer += chunk
+        statements = []
+
+        while True:
+            pattern = _STATE_PATTERNS[self._state]
+            match = pattern.search(self._buffer, self._position)
+            if match is None:
+                self._skip_to_end()
+                return statements
+
+            token = match.group(0)
+            if self._state is None:
+                self._mark_content(self._position, match.start())
+                if token == ";":
+                    statement = self._cut_statement(match.start(), match.end())
+                    if statement:
+                        statements.append(statement)
+                    continue
+                if token == "#":
+                    token = "--"
+                self._state = token
+                if token not in ("--", "/*"):
+                    self._has_content = True
+            elif token == _CLOSING_TOKENS[self._state]:
+                # Closing quote / end of the comment; escaped characters
+                # inside quotes are two characters long and skipped
+                self._state = None
+            self._position = match.end()
+
+    def close(self) -> Optional[ScriptStatement]:
+        # Last statement of the script, the one without a closing semicolon
+        if self._state is None:
+            self._mark_content(self._position, len(self._buffer))
+        return self._cut_statement(len(self._buffer), len(self._buffer))
+
+    def _skip_to_end(self):
+        # The last character is scanned again with the next chunk when it
+        # may start a two character token, "--", "/*", "*/" or "\x"
+        end = len(self._buffer)
+        if self._state != "--" and self._buffer[-1:] in ("-", "/", "*", "\\"):
+            end -= 1
+        if self._state is None:
+            self._mark_content(self._position, end)
+        self._position = max(self._position, end)
+
+        # Drop the statements already cut from this chunk
+        self._buffer = self._buffer[self._start:]
+        self._position -= self._start
+        self._start = 0
+
+    def _mark_content(self, start: int, end: int):
+        if not self._has_content and _NON_SPACE_PATTERN.search(self._buffer, start, end):
+            self._has_content = True
+
+    def _cut_statement(self, end: int, next_start: int) -> Optional[ScriptStatement]:
+        statement = None
+        if self._has_content:
+            text = self._buffer[self._start:end]
+            leading_space = len(text) - len(text.lstrip())
+            statement = ScriptStatement(
+                index=self._index,
+                line=self._line + text.count("\n", 0, leading_space),
+                sql_query=text.strip(),
+            )
+            self._index += 1
+
+        self._line += self._buffer.count("\n", self._start, next_start)
+        self._start = self._position = next_start
+        self._has_content = False
+        return statement
+
+
+def read_chunks(script_file: TextIO, chunk_size: int = SCRIPT_CHUNK_SIZE) -> Iterator[str]:
+    while True:
+        chunk = script_file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def split_statements(script: Union[str, TextIO, Iterable[str]]) -> Iterator[ScriptStatement]:
+    # script -> the whole script, a file object or an iterable of chunks
+    if isinstance(script, str):
+        chunks = [script]
+    elif hasattr(script, "read"):
+        chunks = read_chunks(script)
+    else:
+        chunks = script
+
+    splitter = StatementSplitter()
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    statement = splitter.close()
+    if statement:
+        yield statement
+
+
+def convert_script(
+        script: Union[str, TextIO, Iterable[str]],
+        converter_name: str = BIG_QUERY_CONVERTER,
+        rewrite_mode: str = BigQueryConverterInteractor.STRING_REWRITE_MODE,
+) -> Iterator[Dict]:
+    # Converts every statement of script as soon as it is read; a statement
+    # that fails to convert gets an "error" instead of stopping the script
+    convert = get_statement_converter(converter_name, rewrite_mode)
+    for statement in split_statements(script):
+        result = {
+            "index": statement.index,
+            "line": statement.line,
+            "sql_query": statement.sql_query,
+        }
+        try:
+            result.update(convert(statement.sql_query))
+        except Exception as e:
+            result["error"] = get_error_details(e)
+        yield result
+
+
+def get_statement_converter(converter_name: str, rewrite_mode: str):
+    if converter_name == SQL_QUERY_CONVERSION:
+        from big_query_sql_script import SQLQueryConversion
+
+        converter = converter_registry.get_converter(SQLQueryConversion)
+
+        def _convert(sql_query: str) -> Dict:
+            conversion = converter.get_conversion(sql_query)
+            return {
+                "updated_query": conversion.sql_query,
+                "mapped_fields_dict": conversion.mapped_fields_dict,
+            }
+
+        return _convert
+
+    converter = converter_registry.get_converter(BigQueryConverterInteractor)
+    return lambda sql_query: {
+        "updated_query": converter.get_converted_sql_query(
+            sql_query=sql_query, rewrite_mode=rewrite_mode
+        )
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert every statement of a SQL script, one JSON line per statement"
+    )
+    parser.add_argument("script", help="SQL script to convert, - reads stdin")
+    parser.add_argument("--output", help="Write the results here instead of stdout")
+    parser.add_argument(
+        "--converter", choices=(BIG_QUERY_CONVERTER, SQL_QUERY_CONVERSION), default=BIG_QUERY_CONVERTER
+    )
+    parser.add_argument(
+        "--rewrite-mode",
+        choices=(BigQueryConverterInteractor.STRING_REWRITE_MODE, BigQueryConverterInteractor.AST_REWRITE_MODE),
+        default=BigQueryConverterInteractor.STRING_REWRITE_MODE,
+    )
+    args = parser.parse_args()
+
+    # The results are written to stdout
+    set_log_stream(sys.stderr)
+
+    script_file = sys.stdin if args.script == "-" else open(args.script, "r")
+    output_file = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for result in convert_script(
+                script_file, converter_name=args.converter, rewrite_mode=args.rewrite_mode
+        ):
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+    finally:
+        if script_file is not sys.stdin:
+            script_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+
+if __name__ == "__main__":
+    main()
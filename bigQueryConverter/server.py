@@ -0,0 +1,324 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from typing import Any, Dict, NamedTuple, Optional, Set, Tuple
+
+from conversion_logging import get_logger
+from exceptions import UnknownTenant, get_error_details
+
+logger = get_logger(__name__)
+
+SERVER_HOST = os.environ.get("CONVERSION_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("CONVERSION_SERVER_PORT", 8080))
+# "process" converts on all the cores, "thread" keeps a single warm cache
+WORKER_POOL = os.environ.get("CONVERSION_SERVER_WORKER_POOL", "process")
+WORKERS = int(os.environ.get("CONVERSION_SERVER_WORKERS", os.cpu_count() or 1))
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("CONVERSION_SERVER_REQUEST_TIMEOUT_SECONDS", 30))
+KEEP_ALIVE_TIMEOUT_SECONDS = float(os.environ.get("CONVERSION_SERVER_KEEP_ALIVE_TIMEOUT_SECONDS", 15))
+SHUTDOWN_TIMEOUT_SECONDS = float(os.environ.get("CONVERSION_SERVER_SHUTDOWN_TIMEOUT_SECONDS", 30))
+MAX_BODY_BYTES = int(os.environ.get("CONVERSION_SERVER_MAX_BODY_BYTES", 10 * 1024 * 1024))
+# Request line and headers
+MAX_HEAD_BYTES = 64 * 1024
+
+
+class HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        self.status = status
+        self.message = message
+
+
+class HttpRequest(NamedTuple):
+    method: str
+    path: str
+    version: str
+    headers: Dict[str, str]
+    body: bytes
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+def _init_worker(is_worker_process: bool = False):
+    if is_worker_process:
+        # Batches are already converted on a worker process of the server,
+        # they must not start process pools of their own
+        os.environ["BATCH_CONVERSION_MAX_WORKERS"] = "1"
+
+    from big_query_converter import BigQueryConverterInteractor
+    from converter_registry import converter_registry
+
+    # Build the mappings once per worker, not on its first request
+    converter_registry.get_converter(BigQueryConverterInteractor)
+
+
+def _handle_event(payload: Dict[str, Any]) -> Tuple[int, str]:
+    # Runs on the worker pool; same event and response as the Lambda
+    import handler
+
+    try:
+        response = handler.hello({"body": payload}, None)
+    except KeyError as e:
+        return HTTPStatus.BAD_REQUEST, _get_error_body(f"Missing key {e}")
+    except UnknownTenant as e:
+        return HTTPStatus.NOT_FOUND, json.dumps({"error": get_error_details(e)})
+    except Exception as e:
+        logger.exception("Conversion failed")
+        return HTTPStatus.INTERNAL_SERVER_ERROR, json.dumps({"error": get_error_details(e)})
+    return response["statusCode"], response["body"]
+
+
+def _get_error_body(message: str) -> str:
+    return json.dumps({"error": {"message": message}})
+
+
+class ConversionServer:
+    # HTTP/1.1 entry point beside the Lambda handler for running the
+    # converters as a long lived service: POST takes the same payload as
+    # handler.hello, the conversions run on a worker pool whose mappings and
+    # caches stay warm between requests.
+
+    def __init__(
+            self,
+            host: str = SERVER_HOST,
+            port: int = SERVER_PORT,
+            worker_pool: str = WORKER_POOL,
+            workers: int = WORKERS,
+            request_timeout: float = REQUEST_TIMEOUT_SECONDS,
+            keep_alive_timeout: float = KEEP_ALIVE_TIMEOUT_SECONDS,
+            shutdown_timeout: float = SHUTDOWN_TIMEOUT_SECONDS,
+            max_body_bytes: int = MAX_BODY_BYTES,
+    ):
+        self.host = host
+        self.port = port
+        self.worker_pool = worker_pool
+        self.workers = workers
+        self.request_timeout = request_timeout
+        self.keep_alive_timeout = keep_alive_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.max_body_bytes = max_body_bytes
+
+        self._executor: Optional[Executor] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connection_tasks: Set[asyncio.Task] = set()
+        self._in_flight = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._closing = False
+
+    async def start(self):
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._executor = self._create_executor()
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=MAX_HEAD_BYTES
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(
+            "Listening on %s:%s",
+            self.host,
+            self.port,
+            extra={"fields": {"worker_pool": self.worker_pool, "workers": self.workers}},
+        )
+
+    async def serve_forever(self):
+        await self.start()
+
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, stopped.set)
+            except NotImplementedError:
+                pass
+
+        await stopped.wait()
+        await self.shutdown()
+
+    async def shutdown(self):
+        # Stop accepting, let the in flight requests finish, then drop the
+        # idle keep-alive connections
+        self._closing = True
+        if self._server is not None:
+            self._server.close()
+
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Shutting down with %s requests in flight", self._in_flight)
+
+        for task in list(self._connection_tasks):
+            task.cancel()
+        if self._connection_tasks:
+            await asyncio.gather(*self._connection_tasks, return_exceptions=True)
+        if self._server is not None:
+            # Only after the connections are gone, newer Pythons wait for them
+            await self._server.wait_closed()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        logger.info("Server stopped")
+
+    def _create_executor(self) -> Executor:
+        if self.worker_pool == "process" and self.workers > 1:
+            try:
+                return ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_worker, initargs=(True,)
+                )
+            except (OSError, NotImplementedError):
+                logger.warning("Process pools are not available, converting on threads")
+
+        # Threads share the mappings and caches of this process
+        _init_worker()
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connection_tasks.add(task)
+        try:
+            while not self._closing:
+                try:
+                    request = await asyncio.wait_for(
+                        self._read_request(reader), self.keep_alive_timeout
+                    )
+                except HttpError as e:
+                    await self._write_response(writer, e.status, _get_error_body(e.message), False)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+
+                self._in_flight += 1
+                self._idle.clear()
+                try:
+                    status, body = await self._dispatch(request)
+                finally:
+                    self._in_flight -= 1
+                    if not self._in_flight:
+                        self._idle.set()
+
+                keep_alive = request.keep_alive and not self._closing
+                await self._write_response(writer, status, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            self._connection_tasks.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[HttpRequest]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HttpError(HTTPStatus.BAD_REQUEST, "Incomplete request")
+            # Client closed its keep-alive connection
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Request head too large")
+
+        request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+        try:
+            method, path, version = request_line.split(" ")
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+        headers = {}
+        for header_line in header_lines:
+            name, _, value = header_line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(HTTPStatus.LENGTH_REQUIRED, "Chunked bodies are not supported")
+        try:
+            content_length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if content_length > self.max_body_bytes:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+
+        body = await reader.readexactly(content_length) if content_length else b""
+        return HttpRequest(method=method.upper(), path=path, version=version, headers=headers, body=body)
+
+    async def _dispatch(self, request: HttpRequest) -> Tuple[int, str]:
+        if request.method == "GET" and request.path == "/health":
+            return HTTPStatus.OK, json.dumps({"status": "ok"})
+        if request.method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, _get_error_body("Only POST is supported")
+
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, _get_error_body("Body is not valid JSON")
+        if not isinstance(payload, dict):
+            return HTTPStatus.BAD_REQUEST, _get_error_body("Body must be a JSON object")
+
+        loop = asyncio.get_running_loop()
+        try:
+            # A timed out conversion still finishes on its worker, only its
+            # response is dropped
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, _handle_event, payload),
+                self.request_timeout,
+            )
+        except asyncio.TimeoutError:
+            return HTTPStatus.GATEWAY_TIMEOUT, _get_error_body("Conversion timed out")
+        except BrokenProcessPool:
+            logger.error("Worker pool broke, starting a new one")
+            self._executor = self._create_executor()
+            return HTTPStatus.SERVICE_UNAVAILABLE, _get_error_body("Worker pool restarted")
+
+    @staticmethod
+    async def _write_response(
+            writer: asyncio.StreamWriter, status: int, body: str, keep_alive: bool
+    ):
+        status = HTTPStatus(status)
+        body_bytes = body.encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body_bytes)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n"
+        )
+        writer.write(head.encode("latin-1") + body_bytes)
+        await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the converters over HTTP, with the payload of handler.hello"
+    )
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--worker-pool", choices=("process", "thread"), default=WORKER_POOL)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--request-timeout", type=float, default=REQUEST_TIMEOUT_SECONDS)
+    parser.add_argument("--keep-alive-timeout", type=float, default=KEEP_ALIVE_TIMEOUT_SECONDS)
+    parser.add_argument("--shutdown-timeout", type=float, default=SHUTDOWN_TIMEOUT_SECONDS)
+    args = parser.parse_args()
+
+    server = ConversionServer(
+        host=args.host,
+        port=args.port,
+        worker_pool=args.worker_pool,
+        workers=args.workers,
+        request_timeout=args.request_timeout,
+        keep_alive_timeout=args.keep_alive_timeout,
+        shutdown_timeout=args.shutdown_timeout,
+    )
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
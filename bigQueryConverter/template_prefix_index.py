@@ -0,0 +1,75 @@
+from typing import Dict, Iterable, Optional
+
+# Key of the trie node entry holding the template name ending at that node,
+# a plain character can never be an empty string
+_TEMPLATE_NAME_KEY = ""
+
+
+class TemplatePrefixIndex:
+    # Character trie over the template names, resolves the longest template
+    # name a field name starts with in a single walk over the field name.
+
+    def __init__(self, template_names: Iterable[str]):
+        self._root: Dict[str, Dict] = {}
+        for template_name in template_names:
+            node = self._root
+            for char in template_name:
+                node = node.setdefault(char, {})
+            node[_TEMPLATE_NAME_KEY] = template_name
+
+        self.lookups = 0
+        self.matched_lookups = 0
+
+    def with_changes(
+            self, added: Iterable[str] = (), removed: Iterable[str] = ()
+    ) -> "TemplatePrefixIndex":
+        # New index sharing the nodes of this one; only the nodes on the path
+        # of an added / removed template name are copied
+        index = TemplatePrefixIndex(template_names=())
+        index._root = dict(self._root)
+        copied_node_ids = {id(index._root)}
+
+        for template_name in removed:
+            node = index._copy_path(template_name, copied_node_ids, create=False)
+            if node is not None:
+                node.pop(_TEMPLATE_NAME_KEY, None)
+        for template_name in added:
+            node = index._copy_path(template_name, copied_node_ids, create=True)
+            node[_TEMPLATE_NAME_KEY] = template_name
+        return index
+
+    def _copy_path(self, template_name: str, copied_node_ids: set, create: bool) -> Optional[Dict]:
+        node = self._root
+        for char in template_name:
+            child = node.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = {}
+            elif id(child) not in copied_node_ids:
+                child = dict(child)
+            copied_node_ids.add(id(child))
+            node[char] = child
+            node = child
+        return node
+
+    def get_longest_prefix(self, name: str) -> Optional[str]:
+        self.lookups += 1
+
+        matched_template_name = None
+        node = self._root
+        for char in name:
+            node = node.get(char)
+            if node is None:
+                break
+            matched_template_name = node.get(_TEMPLATE_NAME_KEY, matched_template_name)
+
+        if matched_template_name is not None:
+            self.matched_lookups += 1
+        return matched_template_name
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "lookups": self.lookups,
+            "matched_lookups": self.matched_lookups,
+        }
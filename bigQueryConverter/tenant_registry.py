@@ -0,0 +1,170 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import exceptions
+import mapping_compiler
+from conversion_logging import get_logger
+from converter_registry import Converter, ConverterRegistry, converter_registry
+
+logger = get_logger(__name__)
+
+TENANTS_DIRECTORY = os.environ.get("CONVERSION_TENANTS_DIRECTORY", "tenants")
+TENANTS_MAX_MEMORY_BYTES = int(
+    os.environ.get("CONVERSION_TENANTS_MAX_MEMORY_BYTES", 512 * 1024 * 1024)
+)
+
+# The mappings of one converter take roughly 4 times the size of the
+# tables.json they are built from; close enough to budget the tenants
+# without walking every mapping
+_MAPPING_SIZE_FACTOR = 4
+
+# Also keeps tenant ids from walking out of the tenants directory
+_TENANT_ID_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*")
+
+
+class DirectoryTenantSource:
+    # Every tenant has its own tables.json (and optionally its compiled
+    # artifact) in {directory}/{tenant_id}/. Any object with a
+    # get_source_path(tenant_id) method can be used as a tenant source.
+
+    def __init__(
+            self,
+            directory: str = TENANTS_DIRECTORY,
+            file_name: str = mapping_compiler.TABLES_JSON_PATH,
+    ):
+        self.directory = directory
+        self.file_name = file_name
+
+    def get_source_path(self, tenant_id: str) -> str:
+        if not isinstance(tenant_id, str) or not _TENANT_ID_PATTERN.fullmatch(tenant_id):
+            raise exceptions.UnknownTenant(tenant_id=tenant_id)
+
+        source_path = os.path.join(self.directory, tenant_id, self.file_name)
+        if not os.path.isfile(source_path):
+            raise exceptions.UnknownTenant(tenant_id=tenant_id)
+        return source_path
+
+
+class TenantRegistry:
+    # One ConverterRegistry per tenant, created on the first request of the
+    # tenant, so a process serves any number of tenants without loading
+    # their mappings up front. Once the mappings of the loaded tenants
+    # outgrow max_memory_bytes the least recently used tenants are dropped;
+    # their next request loads them again. Every tenant keeps the hot reload
+    # and deltas of its own registry.
+
+    def __init__(
+            self,
+            source: Optional[Any] = None,
+            max_memory_bytes: int = TENANTS_MAX_MEMORY_BYTES,
+    ):
+        self.source = source or DirectoryTenantSource()
+        self.max_memory_bytes = max_memory_bytes
+
+        # tenant id -> (registry, estimated memory bytes), least recently
+        # used first
+        self._registries: "OrderedDict[str, Tuple[ConverterRegistry, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.loads = 0
+        self.evictions = 0
+
+    def get_converter(self, tenant_id: str, converter_cls: Type[Converter]) -> Converter:
+        registry = self.get_registry(tenant_id)
+        converter = registry.get_converter(converter_cls)
+        self._update_memory(tenant_id, registry)
+        return converter
+
+    def get_registry(self, tenant_id: str) -> ConverterRegistry:
+        with self._lock:
+            entry = self._registries.get(tenant_id)
+            if entry is not None:
+                self._registries.move_to_end(tenant_id)
+                return entry[0]
+
+        # The mappings themselves are only loaded by the first get_converter
+        # of the registry, outside of this lock
+        registry = ConverterRegistry(
+            source_path=self.source.get_source_path(tenant_id), scope=tenant_id
+        )
+        with self._lock:
+            entry = self._registries.get(tenant_id)
+            if entry is not None:
+                self._registries.move_to_end(tenant_id)
+                return entry[0]
+            self._registries[tenant_id] = (registry, 0)
+            self.loads += 1
+        return registry
+
+    def evict(self, tenant_id: str):
+        with self._lock:
+            entry = self._registries.pop(tenant_id, None)
+            if entry is not None:
+                self._memory_bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._registries.clear()
+            self._memory_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tenants": len(self._registries),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+    def _update_memory(self, tenant_id: str, registry: ConverterRegistry):
+        # Sized again on every use: converters are built lazily and a reload
+        # or deltas may change the mappings of the tenant
+        snapshot = registry.get_loaded_snapshot()
+        memory_bytes = 0
+        if snapshot is not None:
+            memory_bytes = len(snapshot.source.content) * (
+                1 + _MAPPING_SIZE_FACTOR * len(snapshot.converters)
+            )
+
+        evicted_tenant_ids: List[str] = []
+        with self._lock:
+            entry = self._registries.get(tenant_id)
+            if entry is None or entry[0] is not registry:
+                # Evicted meanwhile
+                return
+            self._memory_bytes += memory_bytes - entry[1]
+            self._registries[tenant_id] = (registry, memory_bytes)
+
+            # The tenant being served stays, even alone over the budget
+            for evicted_tenant_id in list(self._registries):
+                if self._memory_bytes <= self.max_memory_bytes:
+                    break
+                if evicted_tenant_id == tenant_id:
+                    continue
+                _, evicted_memory_bytes = self._registries.pop(evicted_tenant_id)
+                self._memory_bytes -= evicted_memory_bytes
+                self.evictions += 1
+                evicted_tenant_ids.append(evicted_tenant_id)
+
+        if evicted_tenant_ids:
+            logger.info(
+                "Evicted %s tenants",
+                len(evicted_tenant_ids),
+                extra={"fields": {"tenant_ids": evicted_tenant_ids, "memory_bytes": self._memory_bytes}},
+            )
+
+
+tenant_registry = TenantRegistry()
+
+
+def get_converter_for_tenant(converter_cls: Type[Converter], tenant_id: Optional[str] = None) -> Converter:
+    # Converter of the tenant's mappings, or of the process wide tables.json
+    # when the request names no tenant
+    if tenant_id is None:
+        return converter_registry.get_converter(converter_cls)
+    return tenant_registry.get_converter(tenant_id, converter_cls)
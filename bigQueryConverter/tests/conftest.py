@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+# The modules import each other by their flat names and read tables.json
+# relative to the working directory, as they do on Lambda
+APP_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIRECTORY)
+os.environ.setdefault("CONVERSION_LOG_LEVEL", "WARNING")
+
+
+@pytest.fixture(autouse=True, scope="session")
+def app_directory():
+    working_directory = os.getcwd()
+    os.chdir(APP_DIRECTORY)
+    yield APP_DIRECTORY
+    os.chdir(working_directory)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    from conversion_cache import conversion_cache
+    from query_shape_cache import query_shape_cache
+
+    conversion_cache.clear()
+    query_shape_cache.templates.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def log_stream():
+    from conversion_logging import set_log_stream
+
+    # CLIs run in process move the log lines to the sys.stderr of the test,
+    # which pytest closes after it
+    yield
+    set_log_stream(sys.__stderr__)
+
+
+@pytest.fixture(scope="session")
+def big_query_converter(app_directory):
+    from big_query_converter import BigQueryConverterInteractor
+
+    return BigQueryConverterInteractor()
+
+
+@pytest.fixture(scope="session")
+def sql_query_conversion(app_directory):
+    from big_query_sql_script import SQLQueryConversion
+
+    return SQLQueryConversion()
@@ -0,0 +1,62 @@
+import json
+
+import benchmark
+
+
+def test_every_corpus_case_converts_without_errors():
+    with open("tables.json") as f:
+        templates = len(json.load(f))
+
+    results = benchmark.run_benchmark(
+        query_sizes=(1, 10), schema_sizes=(0, templates + 2), iterations=1
+    )["results"]
+
+    assert len(results) == 2 * len(benchmark.CORPUS_FAMILIES) * 2 * 3
+    assert {result["schema_size"] for result in results} == {templates, templates + 2}
+    assert [
+        (result["converter"], result["family"], result["query_size"], result["error"])
+        for result in results
+        if result["errors"]
+    ] == []
+
+
+def test_synthesized_templates_add_new_names():
+    with open("tables.json") as f:
+        tables = json.load(f)
+
+    synthesized = benchmark.synthesize_tables(tables, len(tables) + 1)
+
+    assert synthesized[:len(tables)] == tables
+    assert synthesized[-1]["Table Name"] == tables[0]["Table Name"] + "_0"
+    assert synthesized[-1]["fields"][0]["field_name"] == tables[0]["fields"][0]["field_name"] + "_0"
+
+
+def _results(p50_ms, errors=0):
+    return {
+        "results": [
+            {
+                "converter": "sql_query_conversion",
+                "family": "or_chain",
+                "query_size": 1,
+                "schema_size": 10,
+                "errors": errors,
+                "latency_ms": {"p50_ms": p50_ms, "p95_ms": 0},
+            }
+        ]
+    }
+
+
+def test_compare_reports_latency_ratios_and_new_errors():
+    comparisons = benchmark.compare_results(_results(2.0), _results(3.0, errors=1))
+
+    assert comparisons == [
+        {
+            "converter": "sql_query_conversion",
+            "family": "or_chain",
+            "query_size": 1,
+            "schema_size": 10,
+            "errors": {"baseline": 0, "current": 1},
+            "p50_ms": {"baseline": 2.0, "current": 3.0, "ratio": 1.5},
+            "p95_ms": {"baseline": 0, "current": 0, "ratio": None},
+        }
+    ]
@@ -0,0 +1,115 @@
+import pytest
+
+from big_query_converter import BigQueryConverterInteractor
+
+LEADS = "`lead_5c8a3b39_3e20_476c_b196_e3a2abd8742b`"
+CALL_LOGS = "`call_logs_213c1644_6e93_413a_86d1_534739873130`"
+
+REWRITE_MODES = (
+    BigQueryConverterInteractor.STRING_REWRITE_MODE,
+    BigQueryConverterInteractor.AST_REWRITE_MODE,
+)
+
+
+def _convert(converter, sql_query, rewrite_mode):
+    return converter.get_converted_sql_query(
+        sql_query=sql_query, rewrite_mode=rewrite_mode, use_cache=False
+    )
+
+
+@pytest.mark.parametrize("rewrite_mode", REWRITE_MODES)
+@pytest.mark.parametrize(
+    "sql_query, expected",
+    [
+        # lead_id is a field of both templates, with a different column each
+        ("SELECT lead_id FROM leads", f"SELECT `id` FROM {LEADS}"),
+        ("SELECT lead_id FROM call_logs", f"SELECT `pipeline_item_id` FROM {CALL_LOGS}"),
+    ],
+)
+def test_column_maps_to_its_own_table(big_query_converter, rewrite_mode, sql_query, expected):
+    assert _convert(big_query_converter, sql_query, rewrite_mode) == expected
+
+
+@pytest.mark.parametrize("rewrite_mode", REWRITE_MODES)
+def test_qualified_columns_of_a_join(big_query_converter, rewrite_mode):
+    converted = _convert(
+        big_query_converter,
+        "SELECT l.lead_id, c.lead_id FROM leads l JOIN call_logs c ON c.lead_id = l.lead_id",
+        rewrite_mode,
+    )
+    assert "l.`id`" in converted
+    assert "c.`pipeline_item_id`" in converted
+    assert "c.`id`" not in converted
+
+
+@pytest.mark.parametrize("rewrite_mode", REWRITE_MODES)
+def test_subquery_columns_use_the_subquery_table(big_query_converter, rewrite_mode):
+    converted = _convert(
+        big_query_converter,
+        "SELECT lead_id FROM leads WHERE lead_id IN (SELECT lead_id FROM call_logs)",
+        rewrite_mode,
+    )
+    assert converted.startswith(f"SELECT `id` FROM {LEADS}")
+    assert f"SELECT `pipeline_item_id` FROM {CALL_LOGS}" in converted
+
+
+@pytest.mark.parametrize("rewrite_mode", REWRITE_MODES)
+@pytest.mark.parametrize(
+    "sql_query, expected",
+    [
+        (
+            "WITH c AS (SELECT lead_id, call_status FROM call_logs) SELECT c.lead_id, c.call_status FROM c",
+            f"WITH c AS (SELECT `pipeline_item_id`, `task_call_status` FROM {CALL_LOGS}) "
+            "SELECT c.`pipeline_item_id`, c.`task_call_status` FROM c",
+        ),
+        (
+            "SELECT t.lead_id FROM (SELECT lead_id FROM call_logs) AS t",
+            f"SELECT t.`pipeline_item_id` FROM (SELECT `pipeline_item_id` FROM {CALL_LOGS}) AS t",
+        ),
+        (
+            "SELECT lead_id FROM (SELECT lead_id FROM call_logs) AS t",
+            f"SELECT `pipeline_item_id` FROM (SELECT `pipeline_item_id` FROM {CALL_LOGS}) AS t",
+        ),
+        (
+            "SELECT t.lead_id FROM (SELECT * FROM call_logs) AS t",
+            f"SELECT t.`pipeline_item_id` FROM (SELECT * FROM {CALL_LOGS}) AS t",
+        ),
+        (
+            "WITH a AS (SELECT lead_id FROM call_logs), b AS (SELECT lead_id FROM a) SELECT b.lead_id FROM b",
+            f"WITH a AS (SELECT `pipeline_item_id` FROM {CALL_LOGS}), "
+            "b AS (SELECT `pipeline_item_id` FROM a) SELECT b.`pipeline_item_id` FROM b",
+        ),
+    ],
+)
+def test_cte_and_derived_table_columns_follow_their_select(
+        big_query_converter, rewrite_mode, sql_query, expected
+):
+    assert _convert(big_query_converter, sql_query, rewrite_mode) == expected
+
+
+@pytest.mark.parametrize("rewrite_mode", REWRITE_MODES)
+def test_aliased_cte_column_keeps_its_alias(big_query_converter, rewrite_mode):
+    converted = _convert(
+        big_query_converter,
+        "WITH c AS (SELECT lead_id AS lead_id FROM call_logs) SELECT lead_id FROM c",
+        rewrite_mode,
+    )
+    assert converted == (
+        f"WITH c AS (SELECT `pipeline_item_id` AS lead_id FROM {CALL_LOGS}) SELECT lead_id FROM c"
+    )
+
+
+@pytest.mark.parametrize("conditions", [1000, 3000])
+def test_deep_or_chain_falls_back_to_lookup_by_name(big_query_converter, conditions):
+    sql_query = "SELECT lead_id FROM leads WHERE " + " OR ".join(
+        f"lead_id = '{index}'" for index in range(conditions)
+    )
+    converted = _convert(
+        big_query_converter, sql_query, BigQueryConverterInteractor.STRING_REWRITE_MODE
+    )
+    # Too deep for the scope walk: no exception, the columns get their
+    # mapping by name as before the per-table resolution
+    bq_field_name = big_query_converter.field_mapping_by_name["lead_id"]["bigquery_column_name"]
+    assert converted.startswith(
+        f"SELECT {bq_field_name} FROM {LEADS} WHERE {bq_field_name} = '0' OR"
+    )
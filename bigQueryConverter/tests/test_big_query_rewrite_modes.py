@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import benchmark
+import exceptions
+from big_query_converter import BigQueryConverterInteractor
+
+LEADS = "`lead_5c8a3b39_3e20_476c_b196_e3a2abd8742b`"
+
+REWRITE_MODES = (
+    BigQueryConverterInteractor.STRING_REWRITE_MODE,
+    BigQueryConverterInteractor.AST_REWRITE_MODE,
+)
+
+
+@pytest.fixture(scope="module")
+def leads_table(app_directory):
+    with open("tables.json") as f:
+        return next(table for table in json.load(f) if table["Table Name"] == "leads")
+
+
+@pytest.mark.parametrize("rewrite_mode", REWRITE_MODES)
+@pytest.mark.parametrize("size", [1, 10, 50])
+def test_benchmark_or_chain_converts_in_both_modes(
+        big_query_converter, leads_table, rewrite_mode, size
+):
+    sql_query = benchmark.build_or_chain(leads_table, size)
+
+    converted = big_query_converter.get_converted_sql_query(
+        sql_query=sql_query, rewrite_mode=rewrite_mode, use_cache=False
+    )
+
+    assert f"FROM {LEADS} WHERE" in converted
+    assert converted == big_query_converter.get_converted_sql_query(
+        sql_query=sql_query,
+        rewrite_mode=BigQueryConverterInteractor.STRING_REWRITE_MODE,
+        use_cache=False,
+    )
+
+
+def test_deep_query_with_ambiguous_columns_raises_a_typed_error(big_query_converter):
+    # The string rewrite hands ambiguous columns to the tree rewrite, which
+    # cannot take the query either
+    sql_query = (
+        "SELECT l.lead_id FROM leads l JOIN (SELECT lead_id FROM call_logs) c ON 1 = 1 WHERE "
+        + " OR ".join(f"lead_id = '{index}'" for index in range(600))
+    )
+
+    with pytest.raises(exceptions.QueryTooDeeplyNested):
+        big_query_converter.get_converted_sql_query(sql_query=sql_query, use_cache=False)
+
+
+def test_unknown_rewrite_mode_is_rejected(big_query_converter):
+    with pytest.raises(exceptions.UnsupportedRewriteMode):
+        big_query_converter.get_converted_sql_query(
+            sql_query="SELECT lead_id FROM leads", rewrite_mode="regex"
+        )
+
+
+@pytest.mark.parametrize(
+    "sql_query, expected",
+    [
+        (
+            "SELECT lead_id, call_status FROM call_logs WHERE call_status = 'lead_id'",
+            "SELECT `pipeline_item_id`, `task_call_status` FROM "
+            "`call_logs_213c1644_6e93_413a_86d1_534739873130` WHERE `task_call_status` = 'lead_id'",
+        ),
+        (
+            "SELECT `lead_id` FROM leads -- lead_id\nWHERE lead_id > 1",
+            f"SELECT `id` FROM {LEADS} /* lead_id */ WHERE `id` > 1",
+        ),
+    ],
+)
+def test_ast_mode_only_rewrites_identifiers(big_query_converter, sql_query, expected):
+    # Unlike the string rewrite, literals, comments and quoted identifiers
+    # are told apart from the columns
+    assert big_query_converter.get_converted_sql_query(
+        sql_query=sql_query, rewrite_mode=BigQueryConverterInteractor.AST_REWRITE_MODE
+    ) == expected
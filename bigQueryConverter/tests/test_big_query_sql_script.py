@@ -0,0 +1,146 @@
+import logging
+import logging.handlers
+
+import pytest
+
+import big_query_sql_script
+from conversion_logging import LOGGER_NAME
+
+# Field of the leads template, named "{template name}_{field id}"
+LEADS_FIELD = "leads_c1333a4e-27a8-4529-9034-d5554887d223"
+
+
+@pytest.fixture
+def parsed_queries(monkeypatch):
+    parsed = []
+    parse_one = big_query_sql_script.parse_one
+
+    def _parse_one(sql_query, *args, **kwargs):
+        parsed.append(sql_query)
+        return parse_one(sql_query, *args, **kwargs)
+
+    monkeypatch.setattr(big_query_sql_script, "parse_one", _parse_one)
+    return parsed
+
+
+@pytest.fixture
+def app_log_records():
+    # The app logger does not propagate, records are collected on it directly
+    logger = logging.getLogger(LOGGER_NAME)
+    level = logger.level
+    handler = logging.handlers.BufferingHandler(capacity=1000)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    yield handler.buffer
+    logger.setLevel(level)
+    logger.removeHandler(handler)
+
+
+@pytest.mark.parametrize(
+    "sql_query",
+    [
+        "SELECT lead_id, LOWER(lead_id) FROM leads",
+        "SELECT COALESCE(lead_id, 'x') FROM leads",
+        "SELECT lead_id FROM leads WHERE lead_id REGEXP 'a'",
+    ],
+)
+def test_unhandled_expressions_do_not_log_at_info(
+        sql_query_conversion, app_log_records, sql_query
+):
+    sql_query_conversion.get_converted_sql_query(sql_query, use_cache=False)
+
+    assert [record.getMessage() for record in app_log_records] == []
+
+
+def test_query_is_parsed_once(sql_query_conversion, parsed_queries):
+    sql_query, query_data, mapped_fields_dict = sql_query_conversion.get_converted_sql_query(
+        f'SELECT "{LEADS_FIELD}" FROM leads WHERE "{LEADS_FIELD}" = \'x\'', use_cache=False
+    )
+
+    assert len(parsed_queries) == 1
+    assert sql_query == (
+        "SELECT leads.`c1333a4e-27a8-4529-9034-d5554887d223` FROM leads "
+        "WHERE leads.`c1333a4e-27a8-4529-9034-d5554887d223` = 'x'"
+    )
+    assert query_data["columns"] == [LEADS_FIELD]
+    assert mapped_fields_dict == {"`leads`.`c1333a4e-27a8-4529-9034-d5554887d223`": LEADS_FIELD}
+
+
+def test_registered_handler_builds_its_expression_type(sql_query_conversion):
+    class LowerConversion(big_query_sql_script.SQLQueryConversion):
+        pass
+
+    def _prepare_lower_expression_result(
+            self, expression, parent_key=None, parent_field=None, source=None
+    ):
+        field = yield big_query_sql_script.ChildExpression(expression.this, source=source)
+        return {"field": field, "type": "lower_method"}
+
+    LowerConversion.register_expression_result_handler(
+        "lower", _prepare_lower_expression_result
+    )
+    sql_query = "SELECT lead_id FROM leads WHERE LOWER(lead_id) = 'a'"
+
+    _, query_data, _ = LowerConversion(schema=sql_query_conversion.schema).get_converted_sql_query(
+        sql_query, use_cache=False
+    )
+    _, base_query_data, _ = sql_query_conversion.get_converted_sql_query(
+        sql_query, use_cache=False
+    )
+
+    assert query_data["conditions"]["field"] == {
+        "field": {"field": "lead_id", "type": "column"},
+        "type": "lower_method",
+    }
+    # Registered on the subclass only
+    assert base_query_data["conditions"] == {}
+
+
+@pytest.mark.parametrize("conditions", [1000, 3000])
+def test_deep_or_chain_builds_its_query_data(sql_query_conversion, conditions):
+    # Every OR nests the previous ones, far deeper than the recursion limit
+    sql_query = "SELECT lead_id FROM leads WHERE " + " OR ".join(
+        f"lead_id = '{index}'" for index in range(conditions)
+    )
+
+    _, query_data, _ = sql_query_conversion.get_converted_sql_query(sql_query, use_cache=False)
+
+    depth = 0
+    condition = query_data["conditions"]
+    while condition["type"] == "or_condition":
+        left, right = condition["conditional_or"]
+        assert right["value"] == {"value": str(conditions - 1 - depth), "type": "literal"}
+        condition = left
+        depth += 1
+    assert depth == conditions - 1
+    assert condition["value"] == {"value": "0", "type": "literal"}
+
+
+def test_conversion_builds_query_data_on_first_access(
+        sql_query_conversion, parsed_queries, monkeypatch
+):
+    built = []
+    prepare_query_ir = big_query_sql_script.SQLQueryConversion._prepare_query_ir
+
+    def _prepare_query_ir(self, select_expression):
+        built.append(select_expression)
+        return prepare_query_ir(self, select_expression)
+
+    monkeypatch.setattr(
+        big_query_sql_script.SQLQueryConversion, "_prepare_query_ir", _prepare_query_ir
+    )
+    sql_query = f'SELECT "{LEADS_FIELD}" FROM leads'
+    expected = sql_query_conversion.get_converted_sql_query(sql_query, use_cache=False)
+    del built[:], parsed_queries[:]
+
+    for use_cache in (False, True, True):
+        conversion = sql_query_conversion.get_conversion(sql_query, use_cache=use_cache)
+        assert (conversion.sql_query, conversion.mapped_fields_dict) == (expected[0], expected[2])
+    assert built == []
+
+    assert conversion.query_data == expected[1]
+    assert conversion.query_data is conversion.query_data
+    assert len(built) == 1
+    # The uncached conversion and the cache miss parse the query to convert
+    # it, the cache hit only to build its query data
+    assert len(parsed_queries) == 3
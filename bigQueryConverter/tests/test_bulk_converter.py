@@ -0,0 +1,86 @@
+import json
+
+from bulk_converter import convert_items, read_items
+
+LEADS = "`lead_5c8a3b39_3e20_476c_b196_e3a2abd8742b`"
+
+
+def _write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines))
+    return str(path)
+
+
+def test_malformed_jsonl_lines_become_error_results(tmp_path):
+    path = _write_lines(
+        tmp_path / "queries.jsonl",
+        [
+            json.dumps({"id": "a", "sql_query": "SELECT lead_id FROM leads"}),
+            "{not json",
+            json.dumps({"id": "c"}),
+            json.dumps([1]),
+            json.dumps({"id": "e", "sql_query": "SELECT lead_id FROM leads", "rewrite_mode": ["ast"]}),
+            "",
+            json.dumps({"id": "g", "sql_query": "SELECT lead_id FROM leads"}),
+        ],
+    )
+
+    results = list(convert_items(read_items(path), workers=1))
+
+    assert [result["id"] for result in results] == ["a", 2, "c", 4, "e", "g"]
+    assert results[0]["updated_query"] == f"SELECT `id` FROM {LEADS}"
+    assert results[-1]["updated_query"] == f"SELECT `id` FROM {LEADS}"
+    for result, line_number in zip(results[1:5], (2, 3, 4, 5)):
+        assert result["error"]["type"] == "InvalidBatchItem"
+        assert result["error"]["details"]["index"] == str(line_number)
+        assert result["source"] == f"{path}:{line_number}"
+
+
+def test_csv_without_the_query_column_reports_every_row(tmp_path):
+    path = _write_lines(
+        tmp_path / "queries.csv", ["id,query", "1,SELECT lead_id FROM leads", "2,SELECT 1"]
+    )
+
+    results = list(convert_items(read_items(path), workers=1))
+
+    assert [result["id"] for result in results] == ["1", "2"]
+    assert all(result["error"]["type"] == "InvalidBatchItem" for result in results)
+
+
+def test_csv_query_column_and_per_row_rewrite_mode(tmp_path):
+    path = _write_lines(
+        tmp_path / "queries.csv",
+        ["id,query,rewrite_mode", "1,SELECT lead_id FROM leads l,", "2,SELECT lead_id FROM leads l,ast"],
+    )
+
+    results = list(convert_items(read_items(path, query_column="query"), workers=1))
+
+    assert results[0]["updated_query"] == f"SELECT `id` FROM {LEADS} l"
+    assert results[1]["updated_query"] == f"SELECT `id` FROM {LEADS} AS l"
+
+
+def test_sql_directory_yields_every_statement(tmp_path):
+    (tmp_path / "reports").mkdir()
+    (tmp_path / "reports" / "a.sql").write_text(
+        "SELECT lead_id FROM leads;\nSELECT lead_id FROM call_logs;\n"
+    )
+
+    results = list(convert_items(read_items(str(tmp_path / "reports")), workers=1))
+
+    assert [result["id"] for result in results] == ["a.sql", "a.sql#1"]
+    assert results[1]["updated_query"].startswith("SELECT `pipeline_item_id`")
+
+
+def test_process_pool_keeps_input_order(tmp_path):
+    path = _write_lines(
+        tmp_path / "queries.jsonl",
+        [
+            json.dumps({"id": index, "sql_query": f"SELECT lead_id FROM leads LIMIT {index}"})
+            for index in range(20)
+        ] + ["{not json"],
+    )
+
+    results = list(convert_items(read_items(path), workers=2, chunk_size=3))
+
+    assert [result["id"] for result in results] == list(range(20)) + [21]
+    assert results[7]["updated_query"] == f"SELECT `id` FROM {LEADS} LIMIT 7"
+    assert "error" in results[-1]
@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import mapping_compiler
+from query_generator import QueryGenerator
+
+
+@pytest.fixture(scope="module")
+def sql_queries(app_directory):
+    generator = QueryGenerator(tables=mapping_compiler.load_tables_json(), seed=19)
+    return [query["sql_query"] for query in generator.generate_many(200)]
+
+
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_shared_converters_give_the_sequential_results_from_many_threads(
+        big_query_converter, sql_query_conversion, sql_queries, use_cache
+):
+    def convert(sql_query):
+        return (
+            big_query_converter.get_converted_sql_query(sql_query=sql_query, use_cache=use_cache),
+            sql_query_conversion.get_converted_sql_query(sql_query, use_cache=use_cache),
+        )
+
+    expected = [
+        (
+            big_query_converter.get_converted_sql_query(sql_query=sql_query, use_cache=False),
+            sql_query_conversion.get_converted_sql_query(sql_query, use_cache=False),
+        )
+        for sql_query in sql_queries
+    ]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        # Every query twice, so threads also share cache entries
+        results = list(executor.map(convert, sql_queries + sql_queries))
+
+    assert results == expected + expected
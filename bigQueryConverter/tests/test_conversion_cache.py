@@ -0,0 +1,95 @@
+import pytest
+
+from conversion_cache import ConversionCache, get_query_fingerprint
+
+COMMENTED_QUERY = (
+    "SELECT lead_id -- comment\nFROM call_logs /* c */ WHERE call_status = 'done'"
+)
+
+
+def test_hit_returns_cached_result():
+    cache = ConversionCache()
+    calls = []
+
+    def convert():
+        calls.append(1)
+        return "converted"
+
+    for _ in range(3):
+        assert cache.get_or_convert("ns", "v1", "SELECT 1", convert) == "converted"
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 2
+
+
+def test_fingerprint_keeps_comments_whitespace_and_case():
+    fingerprints = {
+        get_query_fingerprint(sql_query)
+        for sql_query in (
+            "SELECT lead_id FROM leads",
+            "SELECT lead_id  FROM leads",
+            "select lead_id from leads",
+            "SELECT lead_id /* c */ FROM leads",
+        )
+    }
+    assert len(fingerprints) == 4
+
+
+@pytest.mark.parametrize(
+    "sql_query",
+    [
+        COMMENTED_QUERY,
+        "SELECT lead_id FROM call_logs WHERE call_status = 'x'",
+        "select lead_id from call_logs where call_status = 'x'",
+        "SELECT lead_id\nFROM call_logs WHERE call_status = 'x'",
+    ],
+)
+def test_cached_conversion_does_not_depend_on_the_first_query(
+        sql_query, big_query_converter, sql_query_conversion
+):
+    # The commented query fills the cache first; a query that only differs
+    # in comments / whitespace / keyword case must not get its text back
+    sql_query_conversion.get_converted_sql_query(COMMENTED_QUERY)
+    big_query_converter.get_converted_sql_query(sql_query=COMMENTED_QUERY)
+
+    assert (
+        sql_query_conversion.get_converted_sql_query(sql_query)[0]
+        == sql_query_conversion.get_converted_sql_query(sql_query, use_cache=False)[0]
+    )
+    assert big_query_converter.get_converted_sql_query(
+        sql_query=sql_query
+    ) == big_query_converter.get_converted_sql_query(sql_query=sql_query, use_cache=False)
+
+
+def test_new_mapping_version_invalidates_namespace():
+    cache = ConversionCache()
+    cache.get_or_convert("ns", "v1", "SELECT 1", lambda: "old")
+    assert cache.get_or_convert("ns", "v2", "SELECT 1", lambda: "new") == "new"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_evicts_least_recently_used_entry():
+    cache = ConversionCache(max_entries=2)
+    cache.get_or_convert("ns", "v1", "a", lambda: "a")
+    cache.get_or_convert("ns", "v1", "b", lambda: "b")
+    cache.get_or_convert("ns", "v1", "a", lambda: "a")
+    cache.get_or_convert("ns", "v1", "c", lambda: "c")
+
+    assert cache.get_or_convert("ns", "v1", "a", lambda: "miss") == "a"
+    assert cache.get_or_convert("ns", "v1", "b", lambda: "miss") == "miss"
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_carry_over_keeps_unaffected_entries():
+    cache = ConversionCache()
+    cache.get_or_convert("ns", "v1", "SELECT lead_id FROM leads", lambda: "leads")
+    cache.get_or_convert("ns", "v1", "SELECT call_status FROM call_logs", lambda: "calls")
+
+    carried_over = cache.carry_over(
+        "v1", "v2", lambda identifiers: "call_status" in identifiers
+    )
+
+    assert carried_over == 1
+    assert cache.get_or_convert("ns", "v2", "SELECT lead_id FROM leads", lambda: "miss") == "leads"
+    assert cache.get_or_convert(
+        "ns", "v2", "SELECT call_status FROM call_logs", lambda: "miss"
+    ) == "miss"
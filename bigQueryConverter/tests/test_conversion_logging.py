@@ -0,0 +1,51 @@
+import json
+import logging
+
+import pytest
+
+from conversion_logging import JsonFormatter, SamplingFilter, TruncatedText
+
+
+def _record(level=logging.INFO, message="converted %s", args=("query",), **extra):
+    record = logging.LogRecord("bigQueryConverter.test", level, __file__, 1, message, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_writes_one_object_with_the_fields():
+    entry = json.loads(JsonFormatter().format(_record(fields={"mapping_version": "v1"})))
+
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "bigQueryConverter.test"
+    assert entry["message"] == "converted query"
+    assert entry["mapping_version"] == "v1"
+
+
+@pytest.mark.parametrize(
+    "record, written",
+    [
+        (_record(), False),
+        (_record(level=logging.DEBUG), False),
+        (_record(unsampled=True), True),
+        (_record(level=logging.WARNING), True),
+        (_record(level=logging.ERROR), True),
+    ],
+)
+def test_sampling_keeps_warnings_and_unsampled_records(record, written):
+    assert SamplingFilter(sample_rate=0).filter(record) is written
+    assert SamplingFilter(sample_rate=1).filter(record) is True
+
+
+def test_truncated_text_is_cut_when_formatted():
+    class Payload:
+        formatted = 0
+
+        def __str__(self):
+            Payload.formatted += 1
+            return "x" * 10
+
+    text = TruncatedText(Payload(), max_length=4)
+
+    assert Payload.formatted == 0
+    assert str(text) == "xxxx... (10 chars)"
+    assert str(TruncatedText("short", max_length=10)) == "short"
@@ -0,0 +1,65 @@
+import logging
+import logging.handlers
+
+import pytest
+
+from conversion_metrics import BUCKET_GROWTH, ConversionMetrics, LatencyHistogram, conversion_metrics
+
+
+def test_percentiles_are_within_a_bucket_of_the_durations():
+    histogram = LatencyHistogram()
+    for milliseconds in range(1, 101):
+        histogram.record(milliseconds / 1000)
+
+    summary = histogram.summary()
+
+    assert summary["count"] == 100
+    assert summary["mean_ms"] == pytest.approx(50.5)
+    assert summary["max_ms"] == 100
+    for percentile in (50, 95, 99):
+        assert percentile <= summary[f"p{percentile}_ms"] <= percentile * BUCKET_GROWTH
+    assert LatencyHistogram().summary()["p99_ms"] == 0
+
+
+def test_time_stage_records_failed_stages_too():
+    metrics = ConversionMetrics()
+
+    with metrics.time_stage("parse"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.time_stage("parse"):
+            raise ValueError
+
+    assert metrics.snapshot()["stages"]["parse"]["count"] == 2
+
+
+def test_conversion_stages_show_up_in_the_snapshot(big_query_converter, sql_query_conversion):
+    conversion_metrics.reset()
+
+    big_query_converter.get_converted_sql_query(
+        sql_query="SELECT lead_id FROM leads", use_cache=False
+    )
+    sql_query_conversion.get_converted_sql_query("SELECT lead_id FROM leads", use_cache=False)
+
+    stages = conversion_metrics.snapshot()["stages"]
+    for stage in ("parse", "column_collection", "field_mapping", "string_rewrite", "ir_build"):
+        assert stages[stage]["count"] >= 1
+
+
+def test_log_snapshot_writes_unsampled_metric_lines():
+    metrics = ConversionMetrics()
+    metrics.record("parse", 0.001)
+    logger = logging.getLogger("bigQueryConverter.test_metrics")
+    handler = logging.handlers.BufferingHandler(capacity=1000)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        metrics.log_snapshot(logger)
+    finally:
+        logger.removeHandler(handler)
+
+    lines = [record.fields for record in handler.buffer]
+    assert all(record.unsampled for record in handler.buffer)
+    assert lines[0]["metric"] == "stage_latency"
+    assert lines[0]["stage"] == "parse"
+    assert {line["metric"] for line in lines} >= {"stage_latency", "cache", "tenants"}
@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import mapping_compiler
+from big_query_converter import BigQueryConverterInteractor
+from converter_registry import ConverterRegistry
+
+SQL_QUERY = "SELECT lead_id FROM leads"
+LEADS = "`lead_5c8a3b39_3e20_476c_b196_e3a2abd8742b`"
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    path = tmp_path / mapping_compiler.TABLES_JSON_PATH
+    shutil.copyfile(mapping_compiler.TABLES_JSON_PATH, path)
+    return str(path)
+
+
+def _rename_lead_id_column(source_path, bigquery_column_name):
+    with open(source_path) as f:
+        tables = json.load(f)
+    for table_dict in tables:
+        for field_dict in table_dict["fields"]:
+            if table_dict["Table Name"] == "leads" and field_dict["field_name"] == "lead_id":
+                field_dict["bigquery_column_name"] = bigquery_column_name
+
+    # Replaced atomically, as the README asks for
+    with open(f"{source_path}.tmp", "w") as f:
+        json.dump(tables, f)
+    os.replace(f"{source_path}.tmp", source_path)
+
+
+def _convert(converter):
+    return converter.get_converted_sql_query(sql_query=SQL_QUERY)
+
+
+def _wait_for_reload(registry):
+    registry.get_snapshot()
+    if registry._reload_thread is not None:
+        registry._reload_thread.join(timeout=30)
+
+
+def test_changed_tables_json_is_swapped_in(source_path):
+    registry = ConverterRegistry(source_path=source_path, check_interval=0)
+    converter = registry.get_converter(BigQueryConverterInteractor)
+    assert _convert(converter) == f"SELECT `id` FROM {LEADS}"
+
+    _rename_lead_id_column(source_path, "lead_uuid")
+    _wait_for_reload(registry)
+    reloaded_converter = registry.get_converter(BigQueryConverterInteractor)
+
+    assert _convert(reloaded_converter) == f"SELECT `lead_uuid` FROM {LEADS}"
+    assert reloaded_converter.mapping_version != converter.mapping_version
+    # A conversion holding the previous converter finishes with its mappings
+    assert _convert(converter) == f"SELECT `id` FROM {LEADS}"
+
+
+def test_same_content_keeps_the_snapshot(source_path):
+    registry = ConverterRegistry(source_path=source_path, check_interval=0)
+    snapshot = registry.get_snapshot()
+
+    with open(source_path, "rb") as f:
+        content = f.read()
+    with open(source_path, "wb") as f:
+        f.write(content)
+    os.utime(source_path, ns=(0, 0))
+
+    assert registry.reload() is snapshot
+
+
+def test_unloadable_tables_json_keeps_the_current_mappings(source_path):
+    registry = ConverterRegistry(source_path=source_path, check_interval=0)
+    converter = registry.get_converter(BigQueryConverterInteractor)
+
+    with open(source_path, "w") as f:
+        f.write("[{")
+    _wait_for_reload(registry)
+
+    assert registry.get_converter(BigQueryConverterInteractor) is converter
+    assert _convert(converter) == f"SELECT `id` FROM {LEADS}"
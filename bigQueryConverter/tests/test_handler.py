@@ -0,0 +1,90 @@
+import json
+
+import batch_converter
+from big_query_converter import BigQueryConverterInteractor
+from converter_registry import ConverterRegistry, converter_registry
+from handler import hello
+
+LEADS = "`lead_5c8a3b39_3e20_476c_b196_e3a2abd8742b`"
+
+
+def _invoke(body):
+    response = hello({"body": body}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+class CountingConverter(BigQueryConverterInteractor):
+    builds = 0
+
+    @classmethod
+    def from_source(cls, source):
+        cls.builds += 1
+        return super().from_source(source)
+
+
+def test_converter_is_built_once_per_registry():
+    registry = ConverterRegistry(check_interval=3600)
+    CountingConverter.builds = 0
+
+    converters = [registry.get_converter(CountingConverter) for _ in range(3)]
+
+    assert CountingConverter.builds == 1
+    assert converters[0] is converters[1] is converters[2]
+
+
+def test_warm_invocations_reuse_the_converter():
+    status_code, body = _invoke({"sql_query": "SELECT lead_id FROM leads"})
+    converter = converter_registry.get_converter(BigQueryConverterInteractor)
+
+    assert (status_code, body) == (200, {"updated_query": f"SELECT `id` FROM {LEADS}"})
+    assert _invoke({"sql_query": "SELECT lead_id FROM leads"}) == (status_code, body)
+    assert converter_registry.get_converter(BigQueryConverterInteractor) is converter
+
+
+def test_batch_results_keep_the_request_order_with_per_item_errors():
+    status_code, body = _invoke(
+        {
+            "queries": [
+                {"id": 1, "sql_query": "SELECT lead_id FROM leads"},
+                {"id": 2},
+                "SELECT lead_id FROM leads",
+                {"id": 4, "sql_query": "SELECT lead_id FROM leads", "rewrite_mode": ["ast"]},
+                {"id": 5, "sql_query": "SELECT lead_id FROM leads", "rewrite_mode": "regex"},
+                {"id": 6, "sql_query": "SELECT lead_id FROM leads l", "rewrite_mode": "ast"},
+                {"id": 7, "sql_query": "SELECT lead_id FROM leads"},
+            ]
+        }
+    )
+    results = body["results"]
+
+    assert status_code == 200
+    assert [result["id"] for result in results] == [1, 2, None, 4, 5, 6, 7]
+    assert results[0] == {"id": 1, "updated_query": f"SELECT `id` FROM {LEADS}"}
+    assert results[6] == {"id": 7, "updated_query": f"SELECT `id` FROM {LEADS}"}
+    for result, index in zip(results[1:4], (1, 2, 3)):
+        assert result["error"]["type"] == "InvalidBatchItem"
+        assert result["error"]["details"]["index"] == str(index)
+    assert results[4]["error"]["type"] == "UnsupportedRewriteMode"
+    assert results[5]["updated_query"] == f"SELECT `id` FROM {LEADS} AS l"
+
+
+def test_batch_converts_on_the_process_pool(monkeypatch):
+    monkeypatch.setattr(batch_converter, "MIN_PARALLEL_QUERIES", 2)
+    monkeypatch.setattr(batch_converter, "MAX_WORKERS", 2)
+    queries = [
+        {"id": index, "sql_query": f"SELECT lead_id FROM call_logs LIMIT {index}"}
+        for index in range(10)
+    ]
+    try:
+        results = batch_converter.convert_batch(queries)
+    finally:
+        batch_converter._shutdown_executor()
+
+    assert results == [
+        {
+            "id": index,
+            "updated_query": "SELECT `pipeline_item_id` FROM "
+                             f"`call_logs_213c1644_6e93_413a_86d1_534739873130` LIMIT {index}",
+        }
+        for index in range(10)
+    ]
@@ -0,0 +1,80 @@
+import pickle
+import shutil
+
+import pytest
+
+import mapping_compiler
+from big_query_converter import BigQueryConverterInteractor
+from big_query_sql_script import SQLQueryConversion
+
+SQL_QUERY = "SELECT lead_id FROM call_logs WHERE call_status = 'done'"
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    path = tmp_path / mapping_compiler.TABLES_JSON_PATH
+    shutil.copyfile(mapping_compiler.TABLES_JSON_PATH, path)
+    mapping_compiler.compile_mappings(
+        source_path=str(path), artifact_path=mapping_compiler.get_artifact_path(str(path))
+    )
+    return path
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    # Converter classes whose mappings were built from tables.json instead of
+    # loaded from the artifact
+    built = []
+    for converter_cls in (BigQueryConverterInteractor, SQLQueryConversion):
+        build = converter_cls._build_required_data_mappings
+
+        def _build(data, converter_cls=converter_cls, build=build):
+            built.append(converter_cls)
+            return build(data)
+
+        monkeypatch.setattr(converter_cls, "_build_required_data_mappings", _build)
+    return built
+
+
+def test_converters_load_the_artifact_next_to_their_source(
+        source_path, builds, big_query_converter, sql_query_conversion
+):
+    source = mapping_compiler.load_source(str(source_path))
+
+    big_query = BigQueryConverterInteractor.from_source(source)
+    sql_script = SQLQueryConversion.from_source(source)
+
+    assert builds == []
+    assert big_query.get_converted_sql_query(
+        sql_query=SQL_QUERY, use_cache=False
+    ) == big_query_converter.get_converted_sql_query(sql_query=SQL_QUERY, use_cache=False)
+    assert sql_script.get_converted_sql_query(
+        SQL_QUERY, use_cache=False
+    ) == sql_query_conversion.get_converted_sql_query(SQL_QUERY, use_cache=False)
+
+
+def test_artifact_of_another_tables_json_is_ignored(source_path, builds):
+    source_path.write_bytes(source_path.read_bytes() + b"\n")
+
+    BigQueryConverterInteractor.from_source(mapping_compiler.load_source(str(source_path)))
+
+    assert builds == [BigQueryConverterInteractor]
+
+
+@pytest.mark.parametrize(
+    "artifact_content",
+    [
+        b"not a pickle",
+        pickle.dumps({"format_version": mapping_compiler.COMPILED_MAPPINGS_FORMAT_VERSION - 1}),
+    ],
+)
+def test_unreadable_or_outdated_artifact_is_ignored(source_path, artifact_content):
+    artifact_path = mapping_compiler.get_artifact_path(str(source_path))
+    with open(artifact_path, "wb") as artifact_file:
+        artifact_file.write(artifact_content)
+
+    assert mapping_compiler.load_compiled_mappings(
+        mappings_key=BigQueryConverterInteractor.MAPPINGS_ARTIFACT_KEY,
+        source_path=str(source_path),
+        artifact_path=artifact_path,
+    ) is None
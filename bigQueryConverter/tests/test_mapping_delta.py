@@ -0,0 +1,144 @@
+import json
+import shutil
+
+import pytest
+
+import exceptions
+import mapping_compiler
+from big_query_converter import BigQueryConverterInteractor
+from big_query_sql_script import SQLQueryConversion
+from conversion_cache import conversion_cache
+from converter_registry import ConverterRegistry
+from mapping_delta import MappingDelta
+
+LEAD_SCORE_FIELD = {
+    "bigquery_column_name": "lead_score_column",
+    "field_description": "",
+    "field_id": "lead_score_id",
+    "field_name": "lead_score",
+    "field_type": "INTEGER",
+    "fk_config": None,
+    "is_primary_key": False,
+    "options": [],
+}
+
+DELTAS = [
+    {"operation": "rename_field", "table_name": "leads", "field_name": "lead_id", "new_name": "lead_key"},
+    {"operation": "add_field", "table_name": "leads", "field": LEAD_SCORE_FIELD},
+    {"operation": "remove_field", "table_name": "call_logs", "field_name": "call_status"},
+    {"operation": "rename_table", "table_name": "call_logs", "new_name": "calls"},
+]
+
+BIG_QUERY_CONVERTER_QUERIES = [
+    "SELECT lead_key, lead_score FROM leads",
+    "SELECT lead_id FROM leads",
+    "SELECT lead_id, call_status FROM calls",
+    "SELECT lead_id FROM call_logs",
+]
+SQL_QUERY_CONVERSION_QUERIES = [
+    'SELECT "leads_lead_score_id", "leads_c1333a4e-27a8-4529-9034-d5554887d223" FROM leads',
+    'SELECT "calls_pipeline_item_id", "calls_task_call_status" FROM calls',
+]
+
+
+def _get_changed_tables(tables):
+    # tables.json as it looks with DELTAS applied
+    tables = json.loads(json.dumps(tables))
+    for table_dict in tables:
+        if table_dict["Table Name"] == "leads":
+            for field_dict in table_dict["fields"]:
+                if field_dict["field_name"] == "lead_id":
+                    field_dict["field_name"] = "lead_key"
+            table_dict["fields"].append(dict(LEAD_SCORE_FIELD))
+        if table_dict["Table Name"] == "call_logs":
+            table_dict["fields"] = [
+                field_dict for field_dict in table_dict["fields"]
+                if field_dict["field_name"] != "call_status"
+            ]
+            table_dict["Table Name"] = table_dict["sales_template_name"] = "calls"
+    return tables
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    path = tmp_path / mapping_compiler.TABLES_JSON_PATH
+    shutil.copyfile(mapping_compiler.TABLES_JSON_PATH, path)
+    return str(path)
+
+
+def _convert_all(registry):
+    big_query_converter = registry.get_converter(BigQueryConverterInteractor)
+    sql_query_conversion = registry.get_converter(SQLQueryConversion)
+    return [
+        big_query_converter.get_converted_sql_query(sql_query=sql_query, rewrite_mode=rewrite_mode)
+        for sql_query in BIG_QUERY_CONVERTER_QUERIES
+        for rewrite_mode in (
+            BigQueryConverterInteractor.STRING_REWRITE_MODE,
+            BigQueryConverterInteractor.AST_REWRITE_MODE,
+        )
+    ] + [
+        sql_query_conversion.get_converted_sql_query(sql_query)
+        for sql_query in SQL_QUERY_CONVERSION_QUERIES
+    ]
+
+
+def test_deltas_convert_like_a_rebuilt_tables_json(source_path, tmp_path):
+    registry = ConverterRegistry(source_path=source_path, check_interval=3600)
+    # Cached before the deltas, which must not be served after them
+    registry.get_converter(BigQueryConverterInteractor).get_converted_sql_query(
+        sql_query="SELECT lead_id FROM leads"
+    )
+    registry.get_converter(SQLQueryConversion)
+    registry.apply_deltas(DELTAS)
+
+    rebuilt_path = tmp_path / "rebuilt.json"
+    with open(source_path) as f:
+        rebuilt_path.write_text(json.dumps(_get_changed_tables(json.load(f))))
+    rebuilt_registry = ConverterRegistry(source_path=str(rebuilt_path), check_interval=3600)
+
+    assert _convert_all(registry) == _convert_all(rebuilt_registry)
+
+
+def test_same_deltas_give_the_same_mapping_version(source_path):
+    versions = []
+    for _ in range(2):
+        registry = ConverterRegistry(source_path=source_path, check_interval=3600)
+        registry.get_converter(BigQueryConverterInteractor)
+        versions.append(registry.apply_deltas(DELTAS).version)
+
+    assert versions[0] == versions[1]
+    assert versions[0] != ConverterRegistry(source_path=source_path, check_interval=3600).get_snapshot().version
+
+
+def test_invalid_delta_changes_nothing(source_path):
+    registry = ConverterRegistry(source_path=source_path, check_interval=3600)
+    converter = registry.get_converter(BigQueryConverterInteractor)
+    snapshot = registry.get_snapshot()
+
+    with pytest.raises(exceptions.InvalidMappingDelta):
+        registry.apply_deltas(
+            DELTAS[:1] + [{"operation": "remove_field", "table_name": "leads", "field_name": "nope"}]
+        )
+    with pytest.raises(exceptions.InvalidMappingDelta):
+        MappingDelta.from_dict({"operation": "drop_everything", "table_name": "leads"})
+
+    assert registry.get_snapshot() is snapshot
+    assert registry.get_converter(BigQueryConverterInteractor) is converter
+
+
+def test_unaffected_cached_conversions_are_kept(source_path):
+    registry = ConverterRegistry(source_path=source_path, check_interval=3600)
+    converter = registry.get_converter(BigQueryConverterInteractor)
+    converter.get_converted_sql_query(sql_query="SELECT lead_id FROM leads")
+    converter.get_converted_sql_query(sql_query="SELECT call_status FROM call_logs")
+
+    registry.apply_deltas(
+        [{"operation": "rename_field", "table_name": "call_logs", "field_name": "call_status", "new_name": "status"}]
+    )
+    converter = registry.get_converter(BigQueryConverterInteractor)
+    hits = conversion_cache.stats()["hits"]
+    converter.get_converted_sql_query(sql_query="SELECT lead_id FROM leads")
+    assert conversion_cache.stats()["hits"] == hits + 1
+
+    converter.get_converted_sql_query(sql_query="SELECT call_status FROM call_logs")
+    assert conversion_cache.stats()["hits"] == hits + 1
@@ -0,0 +1,74 @@
+from multi_pattern_replacer import MultiPatternReplacer
+
+REPLACEMENTS = {"lead": "`a`", "lead_id": "`b`", "lead_id_2": "`c`"}
+
+
+def test_replaces_whole_words_only():
+    replacer = MultiPatternReplacer.for_whole_words(REPLACEMENTS)
+
+    assert replacer.replace(
+        "SELECT lead, lead_id, lead_id_2, lead_ids, my_lead FROM t WHERE lead_id = 1",
+        REPLACEMENTS,
+    ) == "SELECT `a`, `b`, `c`, lead_ids, my_lead FROM t WHERE `b` = 1"
+
+
+def test_replacements_are_not_replaced_again():
+    replacements = {"a": "b", "b": "a"}
+    replacer = MultiPatternReplacer.for_whole_words(replacements)
+
+    assert replacer.replace("SELECT a, b", replacements) == "SELECT b, a"
+
+
+def test_words_without_a_replacement_stay():
+    replacer = MultiPatternReplacer.for_whole_words(REPLACEMENTS)
+
+    assert replacer.replace("SELECT lead, lead_id", {"lead_id": "`b`"}) == "SELECT lead, `b`"
+    assert replacer.replace("SELECT lead", {}) == "SELECT lead"
+
+
+def test_qualified_names_get_their_own_replacement():
+    replacer = MultiPatternReplacer.for_whole_words({"lead_id"}, qualified=True)
+
+    assert replacer.replace(
+        "SELECT l.lead_id, c.lead_id, lead_id", {"l.lead_id": "l.`id`", "lead_id": "`id`"}
+    ) == "SELECT l.`id`, c.lead_id, `id`"
+
+
+def test_no_words_match_nothing():
+    replacer = MultiPatternReplacer.for_whole_words(())
+
+    assert replacer.replace("SELECT lead_id", {"lead_id": "`id`"}) == "SELECT lead_id"
+
+
+def test_with_changes_matches_like_a_new_replacer():
+    replacer = MultiPatternReplacer.for_whole_words(REPLACEMENTS)
+    changed_replacer = replacer.with_changes(added={"lead_key"}, removed={"lead_id"})
+    replacements = dict(REPLACEMENTS, lead_key="`k`")
+    text = "SELECT lead, lead_id, lead_key, lead_id_2 FROM t"
+
+    assert changed_replacer.replace(text, replacements) == MultiPatternReplacer.for_whole_words(
+        {"lead", "lead_key", "lead_id_2"}
+    ).replace(text, replacements) == "SELECT `a`, lead_id, `k`, `c` FROM t"
+    # The replacer it was changed from keeps its words
+    assert replacer.replace(text, replacements) == "SELECT `a`, `b`, lead_key, `c` FROM t"
+
+
+def test_narrowed_patterns_are_compiled_once_per_set_of_words():
+    replacer = MultiPatternReplacer.for_whole_words(REPLACEMENTS).with_changes(added={"lead_key"})
+    narrowed_patterns = replacer._narrowed_patterns
+    narrowed_patterns.max_entries = 2
+    replacements = dict(REPLACEMENTS, lead_key="`k`")
+
+    replacer.replace("SELECT lead_key", replacements)
+    pattern = narrowed_patterns.get_or_compile(frozenset({"lead_key"}))
+    assert replacer.replace("SELECT lead_key FROM t", replacements) == "SELECT `k` FROM t"
+    assert list(narrowed_patterns._patterns.values()) == [pattern]
+    # Texts without a changed word keep the compiled pattern
+    assert replacer.replace("SELECT lead", replacements) == "SELECT `a`"
+    assert len(narrowed_patterns._patterns) == 1
+
+    replacer.replace("SELECT lead, lead_key", replacements)
+    replacer.replace("SELECT lead_id, lead_key", replacements)
+    assert list(narrowed_patterns._patterns) == [
+        frozenset({"lead", "lead_key"}), frozenset({"lead_id", "lead_key"})
+    ]
@@ -0,0 +1,41 @@
+import sqlglot
+
+import mapping_compiler
+from query_generator import QueryGenerator
+
+
+def _generator(**kwargs):
+    return QueryGenerator(tables=mapping_compiler.load_tables_json(), **kwargs)
+
+
+def test_same_seed_generates_the_same_queries():
+    assert list(_generator(seed=7).generate_many(50)) == list(_generator(seed=7).generate_many(50))
+    assert list(_generator(seed=7).generate_many(50)) != list(_generator(seed=8).generate_many(50))
+
+
+def test_generated_queries_convert(big_query_converter, sql_query_conversion):
+    for query in _generator(seed=1).generate_many(200):
+        sqlglot.parse_one(query["sql_query"], read="bigquery")
+        converted = big_query_converter.get_converted_sql_query(
+            sql_query=query["sql_query"], use_cache=False
+        )
+        assert query["table"] not in converted.split()
+        sql_query_conversion.get_converted_sql_query(query["sql_query"], use_cache=False)
+
+
+def test_limits_and_probabilities_shape_the_queries():
+    queries = list(
+        _generator(
+            seed=3,
+            max_columns=2,
+            join_probability=0,
+            aggregation_probability=0,
+            date_bucket_probability=0,
+        ).generate_many(100)
+    )
+
+    assert all(" JOIN " not in query["sql_query"] for query in queries)
+    assert all("join" not in query["features"] for query in queries)
+    assert all(
+        len(sqlglot.parse_one(query["sql_query"]).expressions) <= 2 for query in queries
+    )
@@ -0,0 +1,150 @@
+import json
+
+import pytest
+
+from query_ir import ColumnNode, Node, to_query_data
+
+# query_data of the nested dicts built before the typed IR, in their key order
+QUERY_DATA_CASES = [
+    (
+        "SELECT lead_id, call_status FROM call_logs WHERE call_status = 'done' AND lead_id > 3",
+        {
+            "table_name": "call_logs",
+            "conditions": {
+                "conditional_and": [
+                    {
+                        "field": {"field": "call_status", "type": "column"},
+                        "value": {"value": "done", "type": "literal"},
+                        "type": "eq_condition",
+                    },
+                    {
+                        "field": {"field": "lead_id", "type": "column"},
+                        "value": {"value": "3", "type": "literal"},
+                        "type": "gt_condition",
+                    },
+                ],
+                "type": "and_condition",
+            },
+            "columns": ["lead_id", "call_status"],
+            "aliases": [],
+            "aggregations": [],
+        },
+    ),
+    (
+        "SELECT lead_id FROM leads WHERE lead_id IN ('a', 'b') OR lead_id != 'c'",
+        {
+            "table_name": "leads",
+            "conditions": {
+                "conditional_or": [
+                    {
+                        "type": "in_condition",
+                        "field": {"field": "lead_id", "type": "column"},
+                        "values_list": [
+                            {"value": "a", "type": "literal"},
+                            {"value": "b", "type": "literal"},
+                        ],
+                    },
+                    {
+                        "field": {"field": "lead_id", "type": "column"},
+                        "value": {"value": "c", "type": "literal"},
+                        "type": "neq_condition",
+                    },
+                ],
+                "type": "or_condition",
+            },
+            "columns": ["lead_id"],
+            "aliases": [],
+            "aggregations": [],
+        },
+    ),
+    (
+        "SELECT COUNT(lead_id) AS total, call_status FROM call_logs "
+        "GROUP BY call_status ORDER BY total DESC LIMIT 5",
+        {
+            "limit": {"value": "5", "type": "literal"},
+            "type": "limit",
+            "table_name": "call_logs",
+            "order_by": {
+                "fields": [{"field": "total", "desc": True, "type": "column"}],
+                "type": "order_by_method",
+            },
+            "group_by_fields": {
+                "fields": [{"field": "call_status", "type": "column"}],
+                "type": "group_by_method",
+            },
+            "columns": ["call_status", "total"],
+            "aliases": [
+                {
+                    "aggregation": {
+                        "count": {"field": "lead_id", "type": "column"},
+                        "type": "count_method",
+                        "alias": "total",
+                    },
+                    "aggregation_type": "COUNT",
+                    "alias": "total",
+                    "type": "alias_aggregation",
+                }
+            ],
+            "aggregations": [
+                {
+                    "count": {"field": "lead_id", "type": "column"},
+                    "type": "count_method",
+                    "alias": "total",
+                }
+            ],
+        },
+    ),
+    (
+        "SELECT lead_id FROM leads WHERE lead_id IN "
+        "(SELECT lead_id FROM call_logs WHERE call_status = 'done')",
+        {
+            "table_name": "leads",
+            "conditions": {"type": "in_condition", "field": {"field": "lead_id", "type": "column"}},
+            "columns": ["lead_id"],
+            "aliases": [],
+            "aggregations": [],
+        },
+    ),
+    (
+        "SELECT lead_id FROM leads UNION ALL SELECT lead_id FROM call_logs",
+        {
+            "table_name": "leads",
+            "columns": ["lead_id"],
+            "aliases": [],
+            "aggregations": [],
+            "unions": [
+                {"table_name": "call_logs", "columns": ["lead_id"], "aliases": [], "aggregations": []}
+            ],
+        },
+    ),
+]
+
+
+@pytest.mark.parametrize("sql_query, expected", QUERY_DATA_CASES)
+def test_query_data_matches_the_nested_dicts(sql_query_conversion, sql_query, expected):
+    _, query_data, _ = sql_query_conversion.get_converted_sql_query(sql_query, use_cache=False)
+    conversion = sql_query_conversion.get_conversion(sql_query, use_cache=False)
+
+    for actual in (query_data, to_query_data(conversion.query_ir), conversion.query_data):
+        # The handler writes query_data as is, the key order is part of the output
+        assert json.dumps(actual) == json.dumps(expected)
+
+
+def test_query_data_is_detached_from_the_ir(sql_query_conversion):
+    conversion = sql_query_conversion.get_conversion(
+        "SELECT lead_id FROM leads WHERE lead_id = 'a'", use_cache=False
+    )
+
+    query_data = to_query_data(conversion.query_ir)
+    query_data["conditions"]["field"]["field"] = "changed"
+
+    assert to_query_data(conversion.query_ir)["conditions"]["field"]["field"] == "lead_id"
+
+
+def test_node_needs_its_items():
+    class IncompleteNode(Node):
+        __slots__ = ()
+
+    with pytest.raises(TypeError):
+        IncompleteNode()
+    assert ColumnNode("lead_id").to_dict() == {"field": "lead_id", "type": "column"}
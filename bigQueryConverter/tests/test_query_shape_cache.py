@@ -0,0 +1,91 @@
+import pytest
+
+from conversion_cache import ConversionCache
+from query_shape_cache import QueryShapeCache, parametrize_query
+
+
+def _shape_cache():
+    return QueryShapeCache(templates=ConversionCache())
+
+
+def test_parametrize_swaps_string_and_number_literals():
+    shape_query, literals = parametrize_query(
+        "SELECT lead_id FROM leads WHERE call_status = 'done' AND lead_id > 42"
+    )
+
+    assert shape_query == (
+        "SELECT lead_id FROM leads WHERE call_status = '__bqc_literal_0__' AND lead_id > 918273000001"
+    )
+    assert [(literal.sql_text, literal.value) for literal in literals] == [
+        ("'done'", "done"),
+        ("42", "42"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "sql_query",
+    [
+        "SELECT lead_id FROM leads",
+        # The literal names a column, the text rewrites replace it too
+        "SELECT lead_id FROM leads WHERE call_status = 'lead_id'",
+        "SELECT lead_id FROM leads WHERE call_status = 'LEADS'",
+        "SELECT lead_id FROM leads WHERE call_status = '__bqc_literal_0__'",
+    ],
+)
+def test_queries_without_a_shape(sql_query):
+    assert parametrize_query(sql_query) is None
+
+
+def test_same_shape_converts_once_and_rebinds_the_literals():
+    shape_cache = _shape_cache()
+    converted = []
+
+    def convert(sql_query):
+        converted.append(sql_query)
+        return {"sql_query": sql_query.replace("x", "`col`"), "columns": ["x"]}
+
+    first = shape_cache.get_or_convert("ns", "v1", "SELECT x FROM t WHERE y = 'a' LIMIT 1", convert)
+    second = shape_cache.get_or_convert("ns", "v1", "SELECT x FROM t WHERE y = 'b' LIMIT 2", convert)
+
+    assert len(converted) == 1
+    assert first == {"sql_query": "SELECT `col` FROM t WHERE y = 'a' LIMIT 1", "columns": ["x"]}
+    assert second == {"sql_query": "SELECT `col` FROM t WHERE y = 'b' LIMIT 2", "columns": ["x"]}
+    assert shape_cache.stats()["rebinds"] == 2
+
+
+def test_conversion_dropping_a_literal_is_not_rebound():
+    shape_cache = _shape_cache()
+
+    def convert(sql_query):
+        return sql_query.split(" WHERE ")[0]
+
+    for value in ("a", "b"):
+        assert shape_cache.get_or_convert(
+            "ns", "v1", f"SELECT x FROM t WHERE y = '{value}'", convert
+        ) == "SELECT x FROM t"
+    assert shape_cache.stats()["unshapeable"] == 2
+
+
+@pytest.mark.parametrize(
+    "sql_query",
+    [
+        "SELECT lead_id FROM call_logs WHERE call_status = 'missed' LIMIT 5",
+        "SELECT lead_id FROM call_logs WHERE call_status = 'lead_id' LIMIT 5",
+        "SELECT lead_id FROM call_logs WHERE call_status = 'call_logs' LIMIT 7",
+        "SELECT lead_id FROM call_logs WHERE call_status = 'it''s' LIMIT 5",
+    ],
+)
+def test_cached_shape_gives_the_uncached_conversion(
+        big_query_converter, sql_query_conversion, sql_query
+):
+    # The first query fills the shape every query above has
+    shape_query = "SELECT lead_id FROM call_logs WHERE call_status = 'done' LIMIT 1"
+    big_query_converter.get_converted_sql_query(sql_query=shape_query)
+    sql_query_conversion.get_converted_sql_query(shape_query)
+
+    assert big_query_converter.get_converted_sql_query(
+        sql_query=sql_query
+    ) == big_query_converter.get_converted_sql_query(sql_query=sql_query, use_cache=False)
+    assert sql_query_conversion.get_converted_sql_query(
+        sql_query
+    ) == sql_query_conversion.get_converted_sql_query(sql_query, use_cache=False)
@@ -0,0 +1,56 @@
+import io
+
+import pytest
+
+from script_converter import SQL_QUERY_CONVERSION, ScriptStatement, convert_script, split_statements
+
+SCRIPT = (
+    "-- header; not a statement\n"
+    "SELECT lead_id FROM leads WHERE call_status = 'a;b';\n"
+    "\n"
+    "SELECT `x;y` FROM leads /* c; */ WHERE a = \"q;\" ;  # done;\n"
+    "SELECT 'it\\'s; fine', 'o''k;' FROM leads;;\n"
+    "/* only a comment; */ ;\n"
+    "SELECT lead_id\n"
+    "FROM call_logs -- trailing; comment"
+)
+
+# Comments before a statement are part of it, a comment alone is no statement
+EXPECTED = [
+    ScriptStatement(
+        0, 1, "-- header; not a statement\nSELECT lead_id FROM leads WHERE call_status = 'a;b'"
+    ),
+    ScriptStatement(1, 4, "SELECT `x;y` FROM leads /* c; */ WHERE a = \"q;\""),
+    ScriptStatement(2, 4, "# done;\nSELECT 'it\\'s; fine', 'o''k;' FROM leads"),
+    ScriptStatement(3, 7, "SELECT lead_id\nFROM call_logs -- trailing; comment"),
+]
+
+
+def test_splits_on_semicolons_outside_quotes_and_comments():
+    assert list(split_statements(SCRIPT)) == EXPECTED
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_chunk_boundaries_do_not_change_the_statements(chunk_size):
+    chunks = [SCRIPT[start:start + chunk_size] for start in range(0, len(SCRIPT), chunk_size)]
+
+    assert list(split_statements(chunks)) == EXPECTED
+
+
+def test_failing_statement_does_not_stop_the_script():
+    script = io.StringIO("SELECT lead_id FROM leads; SELECT FROM WHERE; SELECT lead_id FROM call_logs")
+
+    results = list(convert_script(script))
+
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert results[0]["updated_query"] == "SELECT `id` FROM `lead_5c8a3b39_3e20_476c_b196_e3a2abd8742b`"
+    assert "error" in results[1]
+    assert results[2]["updated_query"].startswith("SELECT `pipeline_item_id` FROM")
+
+
+def test_sql_query_conversion_statements_carry_their_mapped_fields():
+    field = "leads_c1333a4e-27a8-4529-9034-d5554887d223"
+
+    (result,) = convert_script(f'SELECT "{field}" FROM leads;', converter_name=SQL_QUERY_CONVERSION)
+
+    assert result["mapped_fields_dict"] == {"`leads`.`c1333a4e-27a8-4529-9034-d5554887d223`": field}
@@ -0,0 +1,88 @@
+import asyncio
+import json
+from http import HTTPStatus
+
+import pytest
+
+from server import ConversionServer, _handle_event
+
+LEADS = "`lead_5c8a3b39_3e20_476c_b196_e3a2abd8742b`"
+SQL_QUERY_BODY = json.dumps({"sql_query": "SELECT lead_id FROM leads"}).encode("utf-8")
+
+
+@pytest.mark.parametrize(
+    "payload, status",
+    [
+        ({"sql_query": "SELECT lead_id FROM leads"}, HTTPStatus.OK),
+        ({"query": "SELECT lead_id FROM leads"}, HTTPStatus.BAD_REQUEST),
+        ({"sql_query": "SELECT lead_id FROM leads", "tenant_id": "missing"}, HTTPStatus.NOT_FOUND),
+        ({"sql_query": "SELECT lead_id FROM leads", "tenant_id": "../tenants"}, HTTPStatus.NOT_FOUND),
+    ],
+)
+def test_handle_event_status(payload, status):
+    assert _handle_event(payload)[0] == status
+
+
+async def _request(reader, writer, method, path, body=b"", connection="keep-alive"):
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+        f"Connection: {connection}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    status_line, *header_lines = head.rstrip("\r\n").split("\r\n")
+    headers = dict(line.lower().split(": ", 1) for line in header_lines)
+    body = await reader.readexactly(int(headers["content-length"]))
+    return int(status_line.split(" ")[1]), headers["connection"], json.loads(body)
+
+
+def test_server_answers_on_a_kept_alive_connection():
+    async def run():
+        server = ConversionServer(host="127.0.0.1", port=0, worker_pool="thread", workers=2)
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection(server.host, server.port)
+            responses = [
+                await _request(reader, writer, "GET", "/health"),
+                await _request(reader, writer, "POST", "/", SQL_QUERY_BODY),
+                await _request(reader, writer, "POST", "/", b"{not json"),
+                await _request(reader, writer, "PUT", "/"),
+                await _request(reader, writer, "POST", "/", b"[]", connection="close"),
+            ]
+            assert await reader.read() == b""
+            writer.close()
+        finally:
+            await server.shutdown()
+        return responses
+
+    responses = asyncio.run(run())
+
+    assert [(status, connection) for status, connection, _ in responses] == [
+        (200, "keep-alive"),
+        (200, "keep-alive"),
+        (400, "keep-alive"),
+        (405, "keep-alive"),
+        (400, "close"),
+    ]
+    assert responses[0][2] == {"status": "ok"}
+    assert responses[1][2] == {"updated_query": f"SELECT `id` FROM {LEADS}"}
+
+
+def test_server_rejects_oversized_bodies():
+    async def run():
+        server = ConversionServer(
+            host="127.0.0.1", port=0, worker_pool="thread", workers=1, max_body_bytes=10
+        )
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection(server.host, server.port)
+            response = await _request(reader, writer, "POST", "/", b"x" * 11)
+            writer.close()
+        finally:
+            await server.shutdown()
+        return response
+
+    status, connection, body = asyncio.run(run())
+
+    assert (status, connection) == (HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "close")
+    assert body == {"error": {"message": "Request body too large"}}
@@ -0,0 +1,42 @@
+import pytest
+
+from template_prefix_index import TemplatePrefixIndex
+
+TEMPLATE_NAMES = ["leads", "leads_history", "call_logs", "call"]
+
+
+@pytest.mark.parametrize(
+    "field_name, expected",
+    [
+        ("leads_lead_id", "leads"),
+        ("leads_history_lead_id", "leads_history"),
+        ("leads_histor_lead_id", "leads"),
+        ("call_logs_status", "call_logs"),
+        ("call_status", "call"),
+        ("lead_id", None),
+        ("", None),
+    ],
+)
+def test_longest_template_name_prefix(field_name, expected):
+    assert TemplatePrefixIndex(TEMPLATE_NAMES).get_longest_prefix(field_name) == expected
+
+
+def test_with_changes_leaves_the_original_index_alone():
+    index = TemplatePrefixIndex(TEMPLATE_NAMES)
+
+    changed = index.with_changes(added=["leads_h"], removed=["leads_history", "call"])
+
+    assert changed.get_longest_prefix("leads_history_lead_id") == "leads_h"
+    assert changed.get_longest_prefix("call_status") is None
+    assert changed.get_longest_prefix("call_logs_status") == "call_logs"
+    assert index.get_longest_prefix("leads_history_lead_id") == "leads_history"
+    assert index.get_longest_prefix("call_status") == "call"
+    assert index.get_longest_prefix("leads_h_lead_id") == "leads"
+
+
+def test_lookups_are_counted():
+    index = TemplatePrefixIndex(TEMPLATE_NAMES)
+    index.get_longest_prefix("leads_lead_id")
+    index.get_longest_prefix("lead_id")
+
+    assert index.stats() == {"lookups": 2, "matched_lookups": 1}
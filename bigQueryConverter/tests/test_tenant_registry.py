@@ -0,0 +1,123 @@
+import json
+import shutil
+
+import pytest
+
+import exceptions
+import mapping_compiler
+import tenant_registry
+from big_query_converter import BigQueryConverterInteractor
+from handler import hello
+from tenant_registry import DirectoryTenantSource, TenantRegistry
+
+SQL_QUERY = "SELECT lead_id FROM leads"
+LEADS = "`lead_5c8a3b39_3e20_476c_b196_e3a2abd8742b`"
+
+
+@pytest.fixture
+def tenants_directory(tmp_path):
+    # "acme" maps leads.lead_id to its own column, "globex" has the shared
+    # tables.json
+    with open(mapping_compiler.TABLES_JSON_PATH) as f:
+        tables = json.load(f)
+    for table_dict in tables:
+        for field_dict in table_dict["fields"]:
+            if table_dict["Table Name"] == "leads" and field_dict["field_name"] == "lead_id":
+                field_dict["bigquery_column_name"] = "acme_lead_id"
+
+    (tmp_path / "acme").mkdir()
+    with open(tmp_path / "acme" / mapping_compiler.TABLES_JSON_PATH, "w") as f:
+        json.dump(tables, f)
+    (tmp_path / "globex").mkdir()
+    shutil.copyfile(
+        mapping_compiler.TABLES_JSON_PATH, tmp_path / "globex" / mapping_compiler.TABLES_JSON_PATH
+    )
+    (tmp_path / "empty").mkdir()
+    return str(tmp_path)
+
+
+def _get_memory_bytes(tenants_directory, tenant_id):
+    # Estimate of a tenant with one converter
+    with open(f"{tenants_directory}/{tenant_id}/{mapping_compiler.TABLES_JSON_PATH}", "rb") as f:
+        return len(f.read()) * 5
+
+
+@pytest.mark.parametrize("tenant_id", ["empty", "missing", "../globex", ".", "", None])
+def test_unknown_tenant(tenants_directory, tenant_id):
+    registry = TenantRegistry(source=DirectoryTenantSource(directory=tenants_directory))
+
+    with pytest.raises(exceptions.UnknownTenant):
+        registry.get_converter(tenant_id, BigQueryConverterInteractor)
+    assert registry.stats()["tenants"] == 0
+
+
+def test_tenants_convert_with_their_own_mappings(tenants_directory):
+    registry = TenantRegistry(source=DirectoryTenantSource(directory=tenants_directory))
+    assert registry.stats()["loads"] == 0
+
+    acme_converter = registry.get_converter("acme", BigQueryConverterInteractor)
+    globex_converter = registry.get_converter("globex", BigQueryConverterInteractor)
+
+    assert acme_converter.get_converted_sql_query(sql_query=SQL_QUERY) == (
+        f"SELECT `acme_lead_id` FROM {LEADS}"
+    )
+    assert globex_converter.get_converted_sql_query(sql_query=SQL_QUERY) == f"SELECT `id` FROM {LEADS}"
+    assert acme_converter.mapping_version != globex_converter.mapping_version
+    assert acme_converter.cache_namespace != globex_converter.cache_namespace
+    assert registry.get_converter("acme", BigQueryConverterInteractor) is acme_converter
+    assert registry.stats()["loads"] == 2
+
+
+def test_least_recently_used_tenants_are_evicted(tenants_directory):
+    max_memory_bytes = _get_memory_bytes(tenants_directory, "acme") + _get_memory_bytes(
+        tenants_directory, "globex"
+    ) - 1
+    registry = TenantRegistry(
+        source=DirectoryTenantSource(directory=tenants_directory), max_memory_bytes=max_memory_bytes
+    )
+
+    acme_converter = registry.get_converter("acme", BigQueryConverterInteractor)
+    registry.get_converter("globex", BigQueryConverterInteractor)
+    stats = registry.stats()
+
+    assert (stats["tenants"], stats["evictions"]) == (1, 1)
+    assert stats["memory_bytes"] == _get_memory_bytes(tenants_directory, "globex")
+
+    # Loaded again on its next request
+    reloaded_acme_converter = registry.get_converter("acme", BigQueryConverterInteractor)
+    assert reloaded_acme_converter is not acme_converter
+    assert reloaded_acme_converter.get_converted_sql_query(sql_query=SQL_QUERY) == (
+        f"SELECT `acme_lead_id` FROM {LEADS}"
+    )
+    assert registry.stats()["loads"] == 3
+
+
+def test_tenant_being_served_stays_over_the_budget(tenants_directory):
+    registry = TenantRegistry(
+        source=DirectoryTenantSource(directory=tenants_directory), max_memory_bytes=1
+    )
+
+    converter = registry.get_converter("acme", BigQueryConverterInteractor)
+
+    assert registry.stats()["tenants"] == 1
+    assert registry.get_converter("acme", BigQueryConverterInteractor) is converter
+
+
+def test_handler_converts_with_the_tenant_mappings(tenants_directory, monkeypatch):
+    monkeypatch.setattr(
+        tenant_registry, "tenant_registry",
+        TenantRegistry(source=DirectoryTenantSource(directory=tenants_directory)),
+    )
+
+    responses = [
+        hello({"body": {"sql_query": SQL_QUERY, "tenant_id": tenant_id}}, None)
+        for tenant_id in ["acme", None]
+    ]
+
+    assert [response["statusCode"] for response in responses] == [200, 200]
+    assert json.loads(responses[0]["body"]) == {
+        "updated_query": f"SELECT `acme_lead_id` FROM {LEADS}"
+    }
+    assert json.loads(responses[1]["body"]) == {"updated_query": f"SELECT `id` FROM {LEADS}"}
+    with pytest.raises(exceptions.UnknownTenant):
+        hello({"body": {"sql_query": SQL_QUERY, "tenant_id": "missing"}}, None)